@@ -0,0 +1,106 @@
+# API JSON de lectura: campos a elegir (?fields=), lotes por id (?ids=) y relaciones incrustadas (?embed=)
+from sqlalchemy import select
+from models import Bill, Client, Detail, Product
+from pagination import LIMITE_MAXIMO
+from valores import valor_json
+
+# Recurso -> modelo, relaciones muchos-a-uno que se pueden incrustar (por nombre:
+# los backref no existen hasta que se configuran los mappers), filtros por FK
+# de la URL, columnas de orden extra y roles que pueden leerlo (los de su listado)
+RECURSOS = {
+    "clients": {
+        "modelo": Client,
+        "relaciones": (),
+        "filtros": {},
+        "ordenes": {},
+        "roles": ("Empleado", "Administrador", "Gerente"),
+    },
+    "products": {
+        "modelo": Product,
+        "relaciones": ("category",),
+        "filtros": {"category": Product.FK_category},
+        "ordenes": {},
+        "roles": ("Empleado", "Administrador", "Gerente"),
+    },
+    "bills": {
+        "modelo": Bill,
+        "relaciones": ("client", "payment_method"),
+        "filtros": {"client": Bill.FK_client, "payment_method": Bill.FK_paymentMethod},
+        "ordenes": {"total": Bill.total},
+        "roles": ("Empleado", "Administrador", "Gerente"),
+    },
+    "details": {
+        "modelo": Detail,
+        "relaciones": ("bill", "product"),
+        "filtros": {"bill": Detail.FK_bill, "product": Detail.FK_producto},
+        "ordenes": {},
+        "roles": ("Administrador", "Gerente"),
+    },
+}
+
+# Máximo de ids por petición con ?ids=
+MAX_IDS = LIMITE_MAXIMO
+
+
+def _lista(valor):
+    return [parte.strip() for parte in (valor or "").split(",") if parte.strip()]
+
+
+def _campos(tabla, pedidos, nombre):
+    """Columnas pedidas de `tabla` (todas si no se indica ninguna), siempre con la clave primaria."""
+    pk = [columna.name for columna in tabla.primary_key]
+    if not pedidos:
+        return [columna.name for columna in tabla.c]
+    desconocidos = [campo for campo in pedidos if campo not in tabla.c]
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos en {nombre}: {', '.join(desconocidos)}")
+    return list(dict.fromkeys([*pk, *pedidos]))
+
+
+class Consulta:
+    """SELECT de Core con las columnas pedidas del recurso y de sus relaciones incrustadas.
+
+    Las relaciones se unen con LEFT OUTER JOIN en la misma consulta y sus
+    columnas se etiquetan como "<relación>.<campo>". `extra` son columnas que
+    hacen falta para paginar pero no se devuelven.
+    """
+
+    def __init__(self, recurso, args):
+        config = RECURSOS[recurso]
+        self.modelo = modelo = config["modelo"]
+        self.pk = modelo.__mapper__.primary_key[0]
+        tabla = modelo.__table__
+        self.campos = _campos(tabla, _lista(args.get("fields")), recurso)
+
+        self.incrustadas = {}
+        for nombre in _lista(args.get("embed")):
+            if nombre not in config["relaciones"]:
+                raise ValueError(f"No se puede incrustar '{nombre}' en {recurso}")
+            destino = getattr(modelo, nombre).property.mapper.local_table
+            self.incrustadas[nombre] = _campos(destino, _lista(args.get(f"fields[{nombre}]")), nombre)
+
+        orden = config["ordenes"].get(args.get("sort"))
+        if args.get("sort") == "createdAt":
+            orden = modelo.createdAt
+        extra = [orden.key] if orden is not None and orden.key not in self.campos else []
+
+        stmt = select(*[tabla.c[campo] for campo in [*self.campos, *extra]]).select_from(modelo)
+        for nombre, campos in self.incrustadas.items():
+            atributo = getattr(modelo, nombre)
+            destino = atributo.property.mapper.local_table
+            stmt = stmt.outerjoin(atributo).add_columns(
+                *[destino.c[campo].label(f"{nombre}.{campo}") for campo in campos]
+            )
+        self.stmt = stmt
+
+    def serializar(self, fila):
+        """Diccionario de una fila del resultado, sin pasar por objetos del ORM."""
+        datos = fila._mapping
+        objeto = {campo: valor_json(datos[campo]) for campo in self.campos}
+        for nombre, campos in self.incrustadas.items():
+            relacionado = {campo: valor_json(datos[f"{nombre}.{campo}"]) for campo in campos}
+            # Sin fila relacionada (LEFT JOIN) todas las columnas vienen a NULL
+            objeto[nombre] = relacionado if any(v is not None for v in relacionado.values()) else None
+        return objeto
+
+
@@ -0,0 +1,403 @@
+# Banco de pruebas de carga: datos sintéticos y usuarios simultáneos por rol
+import json
+import random
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, func, insert, select, text, update
+from sqlalchemy.engine import Engine
+from models import db, Bill, Category, Client, Detail, PaymentMethod, Product, User
+from models.models import Role
+from reference_data import CATALOGOS, invalidar
+from sales_summary import reconstruir
+from bill_totals import reconciliar
+from changes import registrar
+from bulk_import import volcar
+
+ROLES = ("Administrador", "Gerente", "Empleado")
+DIAS_HISTORIA = 365
+PERCENTILES = (50, 95, 99)
+
+
+def _usuario(rol):
+    return f"bench_{rol.lower()}"
+
+
+############# Datos sintéticos #############
+
+def _siguiente_id(conexion, columna):
+    return (conexion.execute(select(func.max(columna))).scalar() or 0) + 1
+
+
+def _ajustar_secuencias(conexion, columnas):
+    # Los ids se insertan explícitamente: las secuencias de PostgreSQL deben avanzar
+    if conexion.dialect.name != "postgresql":
+        return
+    for columna in columnas:
+        tabla = columna.table.name
+        conexion.execute(
+            text(f"SELECT setval(pg_get_serial_sequence(:tabla, :columna), "
+                 f"(SELECT COALESCE(MAX(\"{columna.name}\"), 1) FROM \"{tabla}\"))"),
+            {"tabla": f'"{tabla}"', "columna": columna.name},
+        )
+
+
+def sembrar(clientes, productos, facturas, detalles, categorias=50, metodos=5, semilla=1):
+    """Añade un conjunto de datos sintético a la base de datos configurada.
+
+    Todas las tablas se cargan con sentencias por lotes (COPY en PostgreSQL)
+    en una sola transacción. Los ids se calculan a partir del máximo actual,
+    así que se puede sembrar varias veces sobre la misma base de datos.
+    Devuelve las filas insertadas por tabla.
+    """
+    azar = random.Random(semilla)
+    hoy = date.today()
+    dia = lambda: hoy - timedelta(days=azar.randrange(DIAS_HISTORIA))
+    conexion = db.session.connection()
+
+    inicio_categoria = _siguiente_id(conexion, Category.PK_category)
+    inicio_metodo = _siguiente_id(conexion, PaymentMethod.PK_paymentMethod)
+    inicio_cliente = _siguiente_id(conexion, Client.PK_client)
+    inicio_producto = _siguiente_id(conexion, Product.PK_product)
+    inicio_factura = _siguiente_id(conexion, Bill.PK_bill)
+    inicio_detalle = _siguiente_id(conexion, Detail.PK_detail)
+    ids_categorias = range(inicio_categoria, inicio_categoria + categorias)
+    ids_metodos = range(inicio_metodo, inicio_metodo + metodos)
+    ids_clientes = range(inicio_cliente, inicio_cliente + clientes)
+    ids_productos = range(inicio_producto, inicio_producto + productos)
+    ids_facturas = range(inicio_factura, inicio_factura + facturas)
+
+    volcar(conexion, Category.__table__,
+            ["PK_category", "cathegoryName", "description", "createdAt", "updatedAt", "state"],
+            ((i, f"Categoria {i}", "Sintética", hoy, hoy, True) for i in ids_categorias))
+    volcar(conexion, PaymentMethod.__table__,
+            ["PK_paymentMethod", "name", "anotherDetails", "createdAt", "updatedAt", "state"],
+            ((i, f"Metodo {i}", "Sintético", hoy, hoy, True) for i in ids_metodos))
+    volcar(conexion, Client.__table__,
+            ["PK_client", "firstName", "lastName", "address", "birthDate", "phoneNumber", "email",
+             "createdAt", "updatedAt", "state"],
+            ((i, f"Nombre{i}", f"Apellido{i}", f"Calle {i}", "1990-01-01", 600000000 + i,
+              f"c{i}@bench.test", d, d, azar.random() > 0.05) for i in ids_clientes for d in [dia()]))
+    precios = {i: azar.randint(1, 500) for i in ids_productos}
+    volcar(conexion, Product.__table__,
+            ["PK_product", "FK_category", "name", "price", "stock", "createdAt", "updatedAt", "state"],
+            ((i, azar.choice(ids_categorias), f"Producto {i}", precios[i], 1000000, d, d,
+              azar.random() > 0.05) for i in ids_productos for d in [dia()]))
+
+    fechas = {}
+
+    def filas_facturas():
+        for i in ids_facturas:
+            fechas[i] = d = dia()
+            yield (i, azar.choice(ids_clientes), azar.choice(ids_metodos), d, d, d, True)
+
+    volcar(conexion, Bill.__table__,
+            ["PK_bill", "FK_client", "FK_paymentMethod", "date", "createdAt", "updatedAt", "state"],
+            filas_facturas())
+
+    def filas_detalles():
+        for i in range(inicio_detalle, inicio_detalle + detalles):
+            factura, producto = azar.choice(ids_facturas), azar.choice(ids_productos)
+            yield (i, factura, producto, azar.randint(1, 5), precios[producto],
+                   fechas[factura], fechas[factura], True)
+
+    if facturas:
+        volcar(conexion, Detail.__table__,
+                ["PK_detail", "FK_bill", "FK_producto", "quantity", "unitPrice", "createdAt", "updatedAt", "state"],
+                filas_detalles())
+        # Totales guardados de las facturas nuevas
+        reconciliar(conexion)
+    # Los catálogos nuevos entran en el registro de cambios de los terminales
+    for entidad, pk, inicio in (("categories", Category.PK_category, inicio_categoria),
+                                ("payment_methods", PaymentMethod.PK_paymentMethod, inicio_metodo),
+                                ("clients", Client.PK_client, inicio_cliente),
+                                ("products", Product.PK_product, inicio_producto)):
+        registrar(conexion, entidad, select(pk).where(pk >= inicio))
+    _ajustar_secuencias(conexion, [Category.PK_category, PaymentMethod.PK_paymentMethod, Client.PK_client,
+                                   Product.PK_product, Bill.PK_bill, Detail.PK_detail])
+    db.session.commit()
+
+    # Las cargas Core no pasan por los eventos del ORM: totales, resumen y cachés a mano
+    reconstruir()
+    invalidar(*CATALOGOS)
+    return {
+        "categorias": categorias, "metodos": metodos, "clientes": clientes,
+        "productos": productos, "facturas": facturas, "detalles": detalles if facturas else 0,
+    }
+
+
+############# Carga concurrente #############
+
+def _comprobar_permitido():
+    if not current_app.config["BENCH_ENABLED"]:
+        raise click.ClickException(
+            "Los comandos de benchmark no están permitidos con esta configuración "
+            "(use config.DevelopmentConfig o BENCH_ENABLED=1)"
+        )
+
+
+def crear_usuarios(clave):
+    """Crea (o reactiva) un usuario bench_<rol> por rol con la contraseña `clave`, y los roles que falten."""
+    conexion = db.session.connection()
+    hoy = date.today()
+    roles = dict(conexion.execute(select(Role.roleName, Role.PK_Role)).all())
+    for rol in ROLES:
+        if rol not in roles:
+            roles[rol] = conexion.execute(
+                insert(Role.__table__).values(roleName=rol, createdAt=hoy, updatedAt=hoy, state=True)
+                .returning(Role.__table__.c.PK_Role)
+            ).scalar_one()
+        # Uno que quedó de una ejecución interrumpida recibe la contraseña nueva
+        existe = conexion.execute(
+            update(User.__table__).where(User.userName == _usuario(rol)).values(password=clave, state=True)
+        ).rowcount
+        if not existe:
+            conexion.execute(insert(User.__table__).values(
+                name="Bench", lastName=rol, FK_Role=roles[rol], userName=_usuario(rol),
+                password=clave, createdAt=hoy, updatedAt=hoy, state=True,
+            ))
+    db.session.commit()
+
+
+def borrar_usuarios():
+    db.session.execute(delete(User.__table__).where(User.userName.in_([_usuario(rol) for rol in ROLES])))
+    db.session.commit()
+
+
+class _Consultas(threading.local):
+    activo = False
+    total = 0
+
+
+_consultas = _Consultas()
+
+
+def _contar_consulta(conn, cursor, statement, parameters, context, executemany):
+    # El cliente de pruebas atiende la petición en el hilo que la lanza
+    if _consultas.activo:
+        _consultas.total += 1
+
+
+class Datos:
+    """Ids existentes para construir URLs y formularios."""
+
+    def __init__(self):
+        ids = lambda columna: db.session.execute(select(columna).where(columna.table.c.state == True)).scalars().all()
+        self.clientes = ids(Client.PK_client)
+        self.productos = ids(Product.PK_product)
+        self.metodos = ids(PaymentMethod.PK_paymentMethod)
+        self.max_factura = db.session.execute(select(func.max(Bill.PK_bill))).scalar() or 1
+        self.max_detalle = db.session.execute(select(func.max(Detail.PK_detail))).scalar() or 1
+        if not (self.clientes and self.productos and self.metodos):
+            raise click.ClickException("Faltan datos: ejecuta antes 'flask seed-bench'")
+
+
+# (nombre, roles, método, función(azar, datos) -> (url, datos del formulario o JSON))
+ESCENARIOS = (
+    ("index", ROLES, "GET", lambda az, d: ("/", None)),
+    ("index_product", ROLES, "GET", lambda az, d: ("/products", None)),
+    ("index_client", ROLES, "GET", lambda az, d: ("/clients", None)),
+    ("index_bills", ROLES, "GET", lambda az, d: ("/bills", None)),
+    ("index_bills_pagina", ROLES, "GET",
+     lambda az, d: (f"/bills?before={az.randint(1, d.max_factura)}", None)),
+    ("bill", ROLES, "GET", lambda az, d: (f"/bill/{az.randint(1, d.max_factura)}", None)),
+    ("index_details", ("Administrador", "Gerente"), "GET", lambda az, d: ("/details", None)),
+    ("index_details_pagina", ("Administrador", "Gerente"), "GET",
+     lambda az, d: (f"/details?before={az.randint(1, d.max_detalle)}", None)),
+    ("index_category", ("Administrador", "Gerente"), "GET", lambda az, d: ("/categories", None)),
+    ("add_bill_form", ("Administrador", "Gerente"), "GET", lambda az, d: ("/add_bill", None)),
+    ("add_bill", ("Administrador", "Gerente"), "POST",
+     lambda az, d: ("/add_bill", {"FK_client": az.choice(d.clientes), "FK_paymentMethod": az.choice(d.metodos)})),
+    ("checkout", ("Administrador", "Gerente"), "JSON",
+     lambda az, d: ("/checkout", {"FK_client": az.choice(d.clientes), "FK_paymentMethod": az.choice(d.metodos),
+                                  "lines": [{"product": p, "quantity": az.randint(1, 3)}
+                                            for p in az.sample(d.productos, min(3, len(d.productos)))]})),
+)
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not valores:
+        return 0.0
+    return valores[max(0, min(len(valores) - 1, -(-len(valores) * p // 100) - 1))]
+
+
+def _peticion(cliente, metodo, url, datos):
+    _consultas.total = 0
+    _consultas.activo = True
+    inicio = time.perf_counter()
+    try:
+        if metodo == "GET":
+            respuesta = cliente.get(url)
+        elif metodo == "JSON":
+            respuesta = cliente.post(url, json=datos)
+        else:
+            respuesta = cliente.post(url, data=datos)
+        respuesta.close()
+        codigo = respuesta.status_code
+    except Exception:
+        codigo = 599
+    finally:
+        _consultas.activo = False
+    return time.perf_counter() - inicio, _consultas.total, codigo
+
+
+def ejecutar(app, usuarios_por_rol, peticiones, clave, roles=ROLES, semilla=1):
+    """Lanza usuarios simultáneos con el cliente de pruebas y mide cada escenario.
+
+    Cada usuario virtual inicia sesión con bench_<rol> (contraseña `clave`,
+    ver crear_usuarios) y luego recorre, al
+    azar, los escenarios permitidos para su rol. Devuelve {escenario:
+    [(segundos, consultas, código), ...]} incluyendo el login.
+    """
+    with app.app_context():
+        datos = Datos()
+    medidas = {}
+    lock = threading.Lock()
+
+    def usuario(numero, rol):
+        azar = random.Random(semilla * 1000 + numero)
+        escenarios = [e for e in ESCENARIOS if rol in e[1]]
+        propias = {}
+        cliente = app.test_client()
+        propias.setdefault("login", []).append(
+            _peticion(cliente, "POST", "/login", {"username": _usuario(rol), "password": clave})
+        )
+        for _ in range(peticiones):
+            nombre, _roles, metodo, construir = azar.choice(escenarios)
+            url, cuerpo = construir(azar, datos)
+            propias.setdefault(nombre, []).append(_peticion(cliente, metodo, url, cuerpo))
+        with lock:
+            for nombre, valores in propias.items():
+                medidas.setdefault(nombre, []).extend(valores)
+
+    trabajos = [rol for rol in roles for _ in range(usuarios_por_rol)]
+    event.listen(Engine, "before_cursor_execute", _contar_consulta)
+    try:
+        with ThreadPoolExecutor(max_workers=len(trabajos)) as pool:
+            list(pool.map(usuario, range(len(trabajos)), trabajos))
+    finally:
+        event.remove(Engine, "before_cursor_execute", _contar_consulta)
+    return medidas
+
+
+def resumir(medidas):
+    resumen = {}
+    for nombre, valores in sorted(medidas.items()):
+        tiempos = sorted(v[0] for v in valores)
+        consultas = [v[1] for v in valores]
+        resumen[nombre] = {
+            "peticiones": len(valores),
+            "errores": sum(1 for v in valores if v[2] >= 400),
+            **{f"p{p}_ms": round(percentil(tiempos, p) * 1000, 2) for p in PERCENTILES},
+            "consultas_media": round(sum(consultas) / len(consultas), 2),
+            "consultas_max": max(consultas),
+        }
+    return resumen
+
+
+def comparar(actual, base, tolerancia):
+    """Escenarios cuyo p95 o consultas por petición empeoran más que `tolerancia` (0.2 = 20 %)."""
+    regresiones = []
+    for nombre, datos in actual.items():
+        anterior = base.get(nombre)
+        if not anterior or not anterior["p95_ms"]:
+            continue
+        if datos["p95_ms"] > anterior["p95_ms"] * (1 + tolerancia):
+            regresiones.append((nombre, anterior["p95_ms"], datos["p95_ms"]))
+        elif datos["consultas_media"] > anterior["consultas_media"] * (1 + tolerancia):
+            regresiones.append((nombre + " (consultas)", anterior["consultas_media"], datos["consultas_media"]))
+    return regresiones
+
+
+def _conteos():
+    return {
+        nombre: db.session.execute(select(func.count()).select_from(modelo)).scalar()
+        for nombre, modelo in (("clientes", Client), ("productos", Product), ("facturas", Bill), ("detalles", Detail))
+    }
+
+
+@click.command("seed-bench")
+@click.option("--clients", default=10000, show_default=True)
+@click.option("--products", default=5000, show_default=True)
+@click.option("--bills", default=100000, show_default=True)
+@click.option("--details", default=1000000, show_default=True)
+@click.option("--seed", default=1, show_default=True, help="Semilla del generador aleatorio.")
+@click.option("--yes", is_flag=True, help="No pedir confirmación.")
+@with_appcontext
+def comando_seed_bench(clients, products, bills, details, seed, yes):
+    """Añade datos sintéticos a la base de datos configurada."""
+    _comprobar_permitido()
+    if not yes:
+        click.confirm(f"Se escribirán datos sintéticos en {db.engine.url!r}. ¿Continuar?", abort=True)
+    inicio = time.perf_counter()
+    filas = sembrar(clients, products, bills, details, semilla=seed)
+    click.echo(f"Datos sintéticos cargados en {time.perf_counter() - inicio:.1f} s: "
+               + ", ".join(f"{n}={v}" for n, v in filas.items()))
+
+
+@click.command("bench")
+@click.option("--users", default=4, show_default=True, help="Usuarios simultáneos por rol.")
+@click.option("--requests", "peticiones", default=50, show_default=True, help="Peticiones por usuario.")
+@click.option("--role", "roles", multiple=True, type=click.Choice(ROLES), help="Roles a simular (todos por defecto).")
+@click.option("--seed", default=1, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), help="Guarda los resultados en JSON.")
+@click.option("--compare", "base", type=click.File("r"), help="JSON de una ejecución anterior para comparar.")
+@click.option("--tolerance", default=0.2, show_default=True, help="Empeoramiento de p95 tolerado (0.2 = 20 %).")
+@with_appcontext
+def comando_bench(users, peticiones, roles, seed, output, base, tolerance):
+    """Carga concurrente sobre las rutas principales con usuarios de cada rol.
+
+    Crea para la ejecución los usuarios bench_<rol> con una contraseña
+    aleatoria y los borra al terminar. Las escrituras (add_bill, checkout)
+    quedan en la base de datos.
+    """
+    _comprobar_permitido()
+    app = current_app._get_current_object()
+    clave = secrets.token_urlsafe(16)
+    crear_usuarios(clave)
+    try:
+        inicio = time.perf_counter()
+        medidas = ejecutar(app, users, peticiones, clave, roles or ROLES, seed)
+        segundos = time.perf_counter() - inicio
+    finally:
+        borrar_usuarios()
+    resumen = resumir(medidas)
+    total = sum(d["peticiones"] for d in resumen.values())
+
+    click.echo(f"{'escenario':<22}{'n':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'consultas':>11}")
+    for nombre, d in resumen.items():
+        click.echo(f"{nombre:<22}{d['peticiones']:>6}{d['errores']:>5}{d['p50_ms']:>9}{d['p95_ms']:>9}"
+                   f"{d['p99_ms']:>9}{d['consultas_media']:>11}")
+    click.echo(f"{total} peticiones en {segundos:.1f} s ({total / segundos:.1f} peticiones/s)")
+
+    resultado = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "motor": db.engine.dialect.name,
+        "parametros": {"usuarios_por_rol": users, "peticiones": peticiones,
+                       "roles": list(roles or ROLES), "semilla": seed},
+        "datos": _conteos(),
+        "escenarios": resumen,
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        click.echo(f"Resultados guardados en {output}")
+    if base:
+        regresiones = comparar(resumen, json.load(base)["escenarios"], tolerance)
+        for nombre, antes, ahora in regresiones:
+            click.echo(f"  regresión en {nombre}: {antes} -> {ahora}", err=True)
+        if regresiones:
+            raise click.ClickException(f"{len(regresiones)} escenarios empeoran respecto a la base")
+        click.echo("Sin regresiones respecto a la base")
+
+
+def init_app(app):
+    app.config.setdefault("BENCH_ENABLED", False)
+    app.cli.add_command(comando_seed_bench)
+    app.cli.add_command(comando_bench)
@@ -0,0 +1,175 @@
+# Totales de las facturas (subtotal, total, número de líneas) guardados en tbBills
+from collections import defaultdict
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, event, func, inspect, or_, select, text, update
+from sqlalchemy.orm import Session
+from models import db, Bill, Detail, Product
+from migrations import anadir_columnas, migracion
+from fragment_cache import marcar_filas
+from valores import valores_flush
+
+
+def _linea(factura, cantidad, precio):
+    return int(factura), int(cantidad or 0) * int(precio or 0)
+
+
+def _antes_de_flush(session, flush_context, instances):
+    """Copia el precio actual del producto en los detalles nuevos o que cambian de producto."""
+    sin_precio = [d for d in session.new if isinstance(d, Detail) and d.unitPrice is None]
+    for detalle in session.dirty:
+        if isinstance(detalle, Detail):
+            estado = inspect(detalle).attrs
+            if estado.FK_producto.history.has_changes() and not estado.unitPrice.history.has_changes():
+                sin_precio.append(detalle)
+    if not sin_precio:
+        return
+    with session.no_autoflush:
+        precios = dict(session.execute(
+            select(Product.PK_product, Product.price)
+            .where(Product.PK_product.in_({int(d.FK_producto) for d in sin_precio}))
+        ).all())
+    for detalle in sin_precio:
+        detalle.unitPrice = precios.get(int(detalle.FK_producto), 0)
+
+
+def _despues_de_flush(session, flush_context):
+    """Suma a cada factura la diferencia de importe y de líneas de sus detalles escritos.
+
+    Es un UPDATE relativo (total = total + delta) dentro de la misma
+    transacción: dos ventas a la vez sobre la misma factura no se pisan.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for detalle in session.new:
+        if isinstance(detalle, Detail):
+            factura, importe = _linea(detalle.FK_bill, detalle.quantity, detalle.unitPrice)
+            deltas[factura][0] += importe
+            deltas[factura][1] += 1
+    for detalle in session.deleted:
+        if isinstance(detalle, Detail):
+            factura, importe = _linea(*(valores_flush(detalle, a)[0] for a in ("FK_bill", "quantity", "unitPrice")))
+            deltas[factura][0] -= importe
+            deltas[factura][1] -= 1
+    for detalle in session.dirty:
+        if isinstance(detalle, Detail) and session.is_modified(detalle):
+            valores = [valores_flush(detalle, a) for a in ("FK_bill", "quantity", "unitPrice")]
+            antes = _linea(*(v[0] for v in valores))
+            ahora = _linea(*(v[1] for v in valores))
+            if antes != ahora:
+                deltas[antes[0]][0] -= antes[1]
+                deltas[antes[0]][1] -= 1
+                deltas[ahora[0]][0] += ahora[1]
+                deltas[ahora[0]][1] += 1
+    borradas = {f.PK_bill for f in session.deleted if isinstance(f, Bill)}
+    filas = [
+        {"b_id": factura, "b_importe": importe, "b_lineas": lineas}
+        for factura, (importe, lineas) in deltas.items()
+        if (importe or lineas) and factura not in borradas
+    ]
+    if not filas:
+        return
+    tabla = Bill.__table__
+    session.connection().execute(
+        update(tabla).where(tabla.c.PK_bill == bindparam("b_id")).values(
+            subtotal=tabla.c.subtotal + bindparam("b_importe"),
+            total=tabla.c.total + bindparam("b_importe"),
+            lineCount=tabla.c.lineCount + bindparam("b_lineas"),
+        ),
+        filas,
+    )
+    ids = [fila["b_id"] for fila in filas]
+    session.info.setdefault("facturas_recalculadas", set()).update(ids)
+    marcar_filas(session, tabla.name, *ids)
+
+
+def _despues_de_flush_postexec(session, flush_context):
+    # Las facturas cargadas en la sesión vuelven a leer sus totales de la base de datos
+    for id in session.info.pop("facturas_recalculadas", ()):
+        factura = session.identity_map.get((Bill, (id,), None))
+        if factura is not None:
+            session.expire(factura, ["subtotal", "total", "lineCount"])
+
+
+############# Conciliación #############
+
+def _esperados():
+    """Subconsultas correlacionadas con el importe y las líneas reales de cada factura."""
+    importe = (
+        select(func.coalesce(func.sum(Detail.quantity * Detail.unitPrice), 0))
+        .where(Detail.FK_bill == Bill.PK_bill).scalar_subquery()
+    )
+    lineas = select(func.count()).where(Detail.FK_bill == Bill.PK_bill).scalar_subquery()
+    return importe, lineas
+
+
+def reconciliar(conexion, corregir=True, limite=20):
+    """Compara los totales guardados con los calculados desde tbDetails.
+
+    Antes rellena el precio de los detalles cargados sin él (cargas masivas).
+    Devuelve (facturas descuadradas, primeras `limite` como (id, guardado,
+    calculado)); con `corregir` las actualiza en la misma transacción.
+    """
+    detalles = Detail.__table__
+    precio_actual = select(Product.price).where(Product.PK_product == detalles.c.FK_producto).scalar_subquery()
+    if corregir:
+        conexion.execute(update(detalles).where(detalles.c.unitPrice.is_(None)).values(unitPrice=precio_actual))
+    importe, lineas = _esperados()
+    descuadre = or_(Bill.total != importe, Bill.subtotal != importe, Bill.lineCount != lineas)
+    cuantas = conexion.execute(select(func.count()).select_from(Bill).where(descuadre)).scalar()
+    ejemplos = [
+        (fila.PK_bill, (fila.total, fila.lineCount), (fila.importe, fila.lineas))
+        for fila in conexion.execute(
+            select(Bill.PK_bill, Bill.total, Bill.lineCount, importe.label("importe"), lineas.label("lineas"))
+            .where(descuadre).order_by(Bill.PK_bill).limit(limite)
+        )
+    ]
+    if corregir and cuantas:
+        tabla = Bill.__table__
+        conexion.execute(
+            update(tabla).where(descuadre).values(subtotal=importe, total=importe, lineCount=lineas)
+        )
+    return cuantas, ejemplos
+
+
+@migracion(5, "Cantidad y precio en los detalles y totales guardados en las facturas")
+def _totales(conexion):
+    anadir_columnas(conexion, "tbDetails", {
+        "quantity": "INTEGER NOT NULL DEFAULT 1",
+        "unitPrice": "INTEGER",
+    })
+    anadir_columnas(conexion, "tbBills", {
+        "subtotal": "INTEGER NOT NULL DEFAULT 0",
+        "total": "INTEGER NOT NULL DEFAULT 0",
+        "lineCount": "INTEGER NOT NULL DEFAULT 0",
+    })
+    conexion.execute(text('CREATE INDEX IF NOT EXISTS "ix_tbBills_total" ON "tbBills" ("total", "PK_bill")'))
+    # Los detalles existentes eran una unidad al precio actual del producto
+    reconciliar(conexion)
+
+
+@click.command("reconcile-bill-totals")
+@click.option("--dry-run", is_flag=True, help="Solo informa de las facturas descuadradas.")
+@with_appcontext
+def comando_reconciliar(dry_run):
+    """Recalcula subtotal, total y número de líneas de las facturas desde tbDetails."""
+    cuantas, ejemplos = reconciliar(db.session.connection(), corregir=not dry_run)
+    for id, guardado, calculado in ejemplos:
+        click.echo(f"  factura {id}: guardado total={guardado[0]} líneas={guardado[1]}, "
+                   f"calculado total={calculado[0]} líneas={calculado[1]}")
+    if dry_run:
+        db.session.rollback()
+        click.echo(f"{cuantas} facturas descuadradas")
+    else:
+        db.session.commit()
+        click.echo(f"{cuantas} facturas corregidas")
+
+
+def init_app(app):
+    for nombre, funcion in (
+        ("before_flush", _antes_de_flush),
+        ("after_flush", _despues_de_flush),
+        ("after_flush_postexec", _despues_de_flush_postexec),
+    ):
+        if not event.contains(Session, nombre, funcion):
+            event.listen(Session, nombre, funcion)
+    app.cli.add_command(comando_reconciliar)
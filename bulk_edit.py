@@ -0,0 +1,97 @@
+# Ediciones masivas de productos y clientes: una sola sentencia UPDATE por operación
+from datetime import date
+from sqlalchemy import Integer, Numeric, cast, func, select, update
+from models import db, Client, Product
+from changes import registrar
+
+# Máximo de ids aceptados en una lista explícita
+MAX_IDS = 10000
+# Límite del multiplicador de precios, para no aplicar por error un ×100
+FACTOR_MAXIMO = 10
+
+# Entidad -> (modelo, filtros admitidos {parámetro: columna})
+ENTIDADES = {
+    "products": (Product, {"category": Product.FK_category}),
+    "clients": (Client, {}),
+}
+
+
+def leer_ids(valor, maximo=MAX_IDS):
+    """Ids sin repetir de una lista JSON o de un texto separado por comas."""
+    if valor is None:
+        return []
+    partes = valor if isinstance(valor, (list, tuple)) else str(valor).split(",")
+    ids = []
+    for parte in partes:
+        if not str(parte).strip():
+            continue
+        try:
+            ids.append(int(parte))
+        except (TypeError, ValueError):
+            raise ValueError(f"'{parte}' no es un id válido")
+    if len(ids) > maximo:
+        raise ValueError(f"No se pueden indicar más de {maximo} ids")
+    return list(dict.fromkeys(ids))
+
+
+def _condiciones(entidad, ids, filtros):
+    modelo, admitidos = ENTIDADES[entidad]
+    condiciones = []
+    if ids:
+        condiciones.append(modelo.__mapper__.primary_key[0].in_(ids))
+    for nombre, valor in (filtros or {}).items():
+        if nombre not in admitidos:
+            raise ValueError(f"Filtro no admitido: {nombre}")
+        if valor is None or str(valor).strip() == "":
+            continue
+        try:
+            condiciones.append(admitidos[nombre] == int(valor))
+        except (TypeError, ValueError):
+            raise ValueError(f"{nombre} debe ser un número entero")
+    if not condiciones:
+        raise ValueError("Indique los ids o un filtro: no se edita la tabla entera")
+    return condiciones
+
+
+def _aplicar(entidad, condiciones, valores, simular):
+    """Cuenta (`simular`) o actualiza en una transacción las filas que cumplen `condiciones`.
+
+    Devuelve el número de filas. El UPDATE pasa por la sesión, así que las
+    cachés de catálogos y de fragmentos se invalidan al hacer commit.
+    """
+    modelo, _ = ENTIDADES[entidad]
+    if simular:
+        return db.session.execute(select(func.count()).select_from(modelo).where(*condiciones)).scalar()
+    try:
+        # Antes del UPDATE: después algunas condiciones (el estado) ya no se cumplen
+        registrar(db.session.connection(), entidad, select(modelo.__mapper__.primary_key[0]).where(*condiciones))
+        filas = db.session.execute(
+            update(modelo).where(*condiciones).values(**valores, updatedAt=date.today())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return filas
+
+
+def cambiar_precios(factor, ids=None, filtros=None, simular=False):
+    """Multiplica por `factor` el precio de los productos elegidos, redondeando a entero."""
+    try:
+        factor = float(factor)
+    except (TypeError, ValueError):
+        raise ValueError("factor debe ser un número")
+    if not 0 < factor <= FACTOR_MAXIMO:
+        raise ValueError(f"factor debe ser mayor que 0 y como mucho {FACTOR_MAXIMO}")
+    condiciones = _condiciones("products", ids, filtros)
+    # Redondeo en numeric: 10 × 1.15 da 11.5 (no 11.4999… en coma flotante) y sube a 12
+    precio = cast(func.round(cast(Product.price * factor, Numeric(14, 4))), Integer)
+    return _aplicar("products", condiciones, {"price": precio}, simular)
+
+
+def cambiar_estado(entidad, activo, ids=None, filtros=None, simular=False):
+    """Activa o desactiva (borrado lógico) las filas elegidas que no estén ya así."""
+    modelo, _ = ENTIDADES[entidad]
+    condiciones = _condiciones(entidad, ids, filtros) + [modelo.state.is_distinct_from(activo)]
+    return _aplicar(entidad, condiciones, {"state": activo}, simular)
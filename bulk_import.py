@@ -0,0 +1,285 @@
+# Importación masiva de productos y clientes desde CSV
+import csv
+import io
+from datetime import date, datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Column, Integer, MetaData, Table, delete, exists, func, insert, literal, select, update
+from models import db, Client, Product
+from reference_data import invalidar, referencias
+from fragment_cache import invalidar_tablas
+from changes import registrar
+from inventory import movimientos, movimiento
+
+# Filas válidas que se envían juntas a la tabla de carga
+TAMANO_LOTE = 5000
+# Máximo de filas rechazadas que se guardan con su motivo en el informe
+MAX_RECHAZOS = 1000
+
+
+def _texto(maximo, requerido=True):
+    def validar(valor):
+        valor = (valor or "").strip()
+        if not valor:
+            if requerido:
+                raise ValueError("vacío")
+            return None
+        if len(valor) > maximo:
+            raise ValueError(f"más de {maximo} caracteres")
+        return valor
+    return validar
+
+
+def _entero(requerido=True, minimo=None):
+    def validar(valor):
+        valor = (valor or "").strip()
+        if not valor:
+            if requerido:
+                raise ValueError("vacío")
+            return None
+        try:
+            numero = int(valor)
+        except ValueError:
+            raise ValueError(f"'{valor}' no es un número entero")
+        if minimo is not None and numero < minimo:
+            raise ValueError(f"menor que {minimo}")
+        return numero
+    return validar
+
+
+# Entidad -> modelo, columna por la que se hace el upsert y validador de cada columna del CSV
+IMPORTACIONES = {
+    "products": {
+        "modelo": Product,
+        "clave": "name",
+        "campos": {
+            "name": _texto(30),
+            "price": _entero(minimo=0),
+            "stock": _entero(minimo=0),
+            "FK_category": _entero(),
+        },
+    },
+    "clients": {
+        "modelo": Client,
+        "clave": "email",
+        "campos": {
+            "firstName": _texto(15),
+            "lastName": _texto(15),
+            "address": _texto(50, requerido=False),
+            "birthDate": _texto(30, requerido=False),
+            "phoneNumber": _entero(requerido=False),
+            "email": _texto(30),
+        },
+    },
+}
+
+
+class Informe:
+    """Resultado de una importación."""
+
+    def __init__(self):
+        self.total = 0
+        self.insertados = 0
+        self.actualizados = 0
+        self.rechazados = 0
+        self.errores = []
+
+    def rechazar(self, linea, motivo):
+        self.rechazados += 1
+        if len(self.errores) < MAX_RECHAZOS:
+            self.errores.append((linea, motivo))
+
+    def como_dict(self):
+        return {
+            "total": self.total,
+            "inserted": self.insertados,
+            "updated": self.actualizados,
+            "rejected": self.rechazados,
+            "errors": [{"line": linea, "reason": motivo} for linea, motivo in self.errores],
+        }
+
+
+def validar_filas(archivo, entidad, informe):
+    """Lee el CSV en streaming y genera las filas válidas como tuplas (línea, valores...).
+
+    Las filas inválidas o con la clave repetida dentro del archivo se anotan
+    en el informe sin detener la importación.
+    """
+    config = IMPORTACIONES[entidad]
+    campos = config["campos"]
+    clave = config["clave"]
+    categorias = {id for id, _ in referencias("categories")} if entidad == "products" else None
+    vistos = set()
+
+    lector = csv.DictReader(archivo)
+    faltan = [campo for campo in campos if campo not in (lector.fieldnames or [])]
+    if faltan:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(faltan)}")
+
+    for linea, fila in enumerate(lector, start=2):
+        informe.total += 1
+        valores = {}
+        try:
+            for campo, validar in campos.items():
+                valores[campo] = validar(fila.get(campo))
+        except ValueError as error:
+            informe.rechazar(linea, f"{campo}: {error}")
+            continue
+        if categorias is not None and valores["FK_category"] not in categorias:
+            informe.rechazar(linea, f"FK_category: la categoría {valores['FK_category']} no existe")
+            continue
+        if valores[clave] in vistos:
+            informe.rechazar(linea, f"{clave}: '{valores[clave]}' repetido en el archivo")
+            continue
+        vistos.add(valores[clave])
+        yield (linea, *(valores[campo] for campo in campos))
+
+
+def _tabla_carga(entidad):
+    config = IMPORTACIONES[entidad]
+    tabla = config["modelo"].__table__
+    return Table(
+        f"stg_import_{entidad}",
+        MetaData(),
+        Column("linea", Integer),
+        *[Column(campo, tabla.c[campo].type) for campo in config["campos"]],
+        prefixes=["TEMPORARY"],
+    )
+
+
+def _copiar(conexion, tabla, columnas, filas):
+    # PostgreSQL: COPY ... FROM STDIN, mucho más rápido que los INSERT
+    quote = conexion.dialect.identifier_preparer.quote
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(filas)
+    buffer.seek(0)
+    cursor = conexion.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {quote(tabla.name)} ({', '.join(quote(c) for c in columnas)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _insertar(conexion, tabla, columnas, filas):
+    # Otros motores: INSERT por lotes con executemany
+    conexion.execute(insert(tabla), [dict(zip(columnas, fila)) for fila in filas])
+
+
+def volcar(conexion, tabla, columnas, filas, tamano=TAMANO_LOTE):
+    """Carga `filas` (tuplas en el orden de `columnas`) en `tabla` por lotes de `tamano`.
+
+    Usa COPY en PostgreSQL y executemany en otros motores; `filas` puede ser
+    un generador, solo hay un lote en memoria a la vez.
+    """
+    escribir = _copiar if conexion.dialect.name == "postgresql" else _insertar
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            escribir(conexion, tabla, columnas, lote)
+            lote = []
+    if lote:
+        escribir(conexion, tabla, columnas, lote)
+
+
+def importar_csv(archivo, entidad):
+    """Importa un CSV de productos o clientes en una sola transacción.
+
+    Las filas válidas se cargan por lotes en una tabla temporal (con COPY en
+    PostgreSQL) y desde ahí se actualizan las existentes y se insertan las
+    nuevas con dos sentencias, emparejando por `email` o `name`. Las filas
+    cuya clave coincide con varios registros se rechazan: no se sabe cuál
+    actualizar. Los cambios de stock de los productos quedan en el libro de
+    movimientos, como los de inventory.
+    """
+    config = IMPORTACIONES[entidad]
+    tabla = config["modelo"].__table__
+    campos = list(config["campos"])
+    clave = config["clave"]
+    informe = Informe()
+
+    conexion = db.session.connection()
+    carga = _tabla_carga(entidad)
+    try:
+        # Por si quedó una tabla de carga de un intento anterior en esta conexión
+        carga.drop(conexion, checkfirst=True)
+        carga.create(conexion)
+        volcar(conexion, carga, [columna.name for columna in carga.columns],
+               validar_filas(archivo, entidad, informe))
+
+        # Claves que ya están repetidas en la tabla: la fila no se importa
+        repetidas = (
+            select(tabla.c[clave]).where(tabla.c[clave].in_(select(carga.c[clave])))
+            .group_by(tabla.c[clave]).having(func.count() > 1)
+        )
+        for linea, valor in conexion.execute(
+            select(carga.c.linea, carga.c[clave]).where(carga.c[clave].in_(repetidas)).order_by(carga.c.linea)
+        ):
+            informe.rechazar(linea, f"{clave}: '{valor}' coincide con varios registros")
+        conexion.execute(delete(carga).where(carga.c[clave].in_(repetidas)))
+
+        hoy = date.today()
+        pk, = tabla.primary_key
+        libro = "stock" in campos
+        if libro:
+            # Se bloquean los productos antes de leer su stock, como hace descontar()
+            conexion.execute(select(pk).where(tabla.c[clave].in_(select(carga.c[clave]))).with_for_update())
+            conexion.execute(insert(movimientos).from_select(
+                ["FK_product", "quantity", "stockAfter", "reason", "createdAt"],
+                select(pk, carga.c.stock - tabla.c.stock, carga.c.stock,
+                       literal("importacion"), literal(datetime.now()))
+                .where(tabla.c[clave] == carga.c[clave], tabla.c.stock != carga.c.stock),
+            ))
+        informe.actualizados = conexion.execute(
+            update(tabla)
+            .where(tabla.c[clave] == carga.c[clave])
+            .values({**{campo: carga.c[campo] for campo in campos if campo != clave}, "updatedAt": hoy})
+        ).rowcount
+        nuevos = conexion.execute(
+            insert(tabla).from_select(
+                [*campos, "createdAt", "updatedAt", "state"],
+                select(*[carga.c[campo] for campo in campos], literal(hoy), literal(hoy), literal(True))
+                .where(~exists().where(tabla.c[clave] == carga.c[clave])),
+            ).returning(pk, *([tabla.c.stock] if libro else []))
+        ).all()
+        informe.insertados = len(nuevos)
+        if libro and nuevos:
+            conexion.execute(insert(movimientos), [
+                movimiento(id, stock, stock, "alta", None) for id, stock in nuevos
+            ])
+        # Filas insertadas o actualizadas, para la sincronización de los terminales
+        registrar(conexion, entidad, select(pk).where(tabla.c[clave].in_(select(carga.c[clave]))))
+        carga.drop(conexion)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Las sentencias Core no pasan por los eventos del ORM
+    invalidar(f"search_{entidad}")
+    invalidar_tablas(tabla.name)
+    return informe
+
+
+@click.command("import-csv")
+@click.argument("entidad", type=click.Choice(sorted(IMPORTACIONES)))
+@click.argument("archivo", type=click.File("r", encoding="utf-8-sig"))
+@with_appcontext
+def comando_import_csv(entidad, archivo):
+    """Importa productos o clientes desde un archivo CSV."""
+    try:
+        informe = importar_csv(archivo, entidad)
+    except ValueError as error:
+        raise click.UsageError(str(error))
+    click.echo(
+        f"{informe.total} filas: {informe.insertados} insertadas, "
+        f"{informe.actualizados} actualizadas, {informe.rechazados} rechazadas"
+    )
+    for linea, motivo in informe.errores:
+        click.echo(f"  línea {linea}: {motivo}", err=True)
+
+
+def init_app(app):
+    app.cli.add_command(comando_import_csv)
@@ -0,0 +1,202 @@
+# Registro de cambios de los catálogos y lectura incremental ("cambios desde") para los terminales
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, exists, func, insert, inspect, literal, select, text, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from models import db, Category, Change, Client, PaymentMethod, Product
+from migrations import anadir_columnas, migracion
+from valores import valor_json
+
+cambios = Change.__table__
+
+# Entidad sincronizable -> (modelo, roles que pueden leerla: los mismos que su listado)
+ENTIDADES = {
+    "products": (Product, ("Empleado", "Administrador", "Gerente")),
+    "clients": (Client, ("Empleado", "Administrador", "Gerente")),
+    "payment_methods": (PaymentMethod, ("Empleado", "Administrador", "Gerente")),
+    "categories": (Category, ("Administrador", "Gerente")),
+}
+
+
+def _pk(modelo):
+    return modelo.__mapper__.primary_key[0]
+
+
+def _entidad_de(modelo):
+    for nombre, (clase, _) in ENTIDADES.items():
+        if issubclass(modelo, clase):
+            return nombre
+    return None
+
+
+def registrar(conexion, entidad, ids, borrado=False):
+    """Apunta cambios de filas escritas sin el ORM (sentencias Core, cargas masivas).
+
+    `ids` es una lista de ids o un select de una sola columna que los
+    devuelve. Se inserta en la transacción de `conexion`.
+    """
+    ahora = datetime.now()
+    if isinstance(ids, Select):
+        columna = list(ids.subquery().c)[0]
+        conexion.execute(insert(cambios).from_select(
+            ["entity", "FK_row", "deleted", "createdAt"],
+            select(literal(entidad), columna, literal(borrado), literal(ahora)),
+        ))
+    elif ids:
+        conexion.execute(insert(cambios), [
+            {"entity": entidad, "FK_row": id, "deleted": borrado, "createdAt": ahora} for id in ids
+        ])
+
+
+def _despues_de_flush(session, flush_context):
+    """Una entrada por fila de catálogo insertada, modificada o borrada en el flush."""
+    filas = []
+    ahora = datetime.now()
+    for objetos, borrado, modificados in (
+        (session.new, False, False), (session.dirty, False, True), (session.deleted, True, False),
+    ):
+        for obj in objetos:
+            entidad = _entidad_de(type(obj))
+            if entidad is None or (modificados and not session.is_modified(obj)):
+                continue
+            id = inspect(obj).mapper.primary_key_from_instance(obj)[0]
+            filas.append({"entity": entidad, "FK_row": id, "deleted": borrado, "createdAt": ahora})
+    if filas:
+        session.connection().execute(insert(cambios), filas)
+
+
+############# Secuencia #############
+
+def numerar(conexion):
+    """Da su `seq` a las entradas ya confirmadas que aún no lo tienen y devuelve cuántas.
+
+    El id (PK_change) se toma en el flush, así que una transacción lenta
+    puede confirmar un id menor que otro que los terminales ya han leído. El
+    seq, en cambio, solo se asigna a entradas visibles (confirmadas) y de una
+    numeración cada vez (bloqueo en PostgreSQL; SQLite ya serializa las
+    escrituras): lo que se confirma tarde recibe un seq mayor que todo lo
+    leído, y ningún terminal lo deja atrás.
+    """
+    if conexion.dialect.name == "postgresql":
+        conexion.execute(select(func.pg_advisory_xact_lock(func.hashtext("tbChanges.seq"))))
+    ultimo = select(func.coalesce(func.max(cambios.c.seq), 0)).scalar_subquery()
+    nuevos = select(
+        cambios.c.PK_change,
+        (ultimo + func.row_number().over(order_by=cambios.c.PK_change)).label("seq"),
+    ).where(cambios.c.seq.is_(None)).subquery()
+    return conexion.execute(
+        update(cambios).where(cambios.c.PK_change == nuevos.c.PK_change).values(seq=nuevos.c.seq)
+    ).rowcount
+
+
+############# Lectura #############
+
+
+
+def leer(entidad, desde=0, limite=None):
+    """Cambios de `entidad` posteriores a la secuencia `desde`, en orden de secuencia.
+
+    Cada fila cambiada aparece una vez con su estado actual (`data`), o como
+    lápida (`deleted`) si ya no existe. `next` es el `desde` de la siguiente
+    petición y `more` indica que quedan cambios; con desde=0 se recibe el
+    catálogo completo. Antes de leer se numeran los cambios confirmados desde
+    la última lectura, en su propia transacción de la primaria.
+    """
+    modelo, _ = ENTIDADES[entidad]
+    config = current_app.config
+    limite = max(1, min(limite or config["CHANGES_PAGE_SIZE"], config["CHANGES_MAX_PAGE_SIZE"]))
+    with db.engine.begin() as conexion:
+        numerar(conexion)
+    entradas = db.session.execute(
+        select(cambios.c.seq, cambios.c.FK_row, cambios.c.deleted)
+        .where(cambios.c.entity == entidad, cambios.c.seq > desde)
+        .order_by(cambios.c.seq)
+        .limit(limite + 1)
+    ).all()
+    mas = len(entradas) > limite
+    entradas = entradas[:limite]
+
+    # Una fila cambiada varias veces en el lote se envía una sola vez, con su último cambio
+    ultimas = {fila: (seq, borrado) for seq, fila, borrado in entradas}
+    pk = _pk(modelo)
+    vivas = {}
+    ids = [fila for fila, (_, borrado) in ultimas.items() if not borrado]
+    if ids:
+        for fila in db.session.execute(select(*modelo.__table__.c).where(pk.in_(ids))).mappings():
+            vivas[fila[pk.key]] = {columna: valor_json(valor) for columna, valor in fila.items()}
+
+    salida = []
+    for fila, (seq, _) in sorted(ultimas.items(), key=lambda entrada: entrada[1][0]):
+        datos = vivas.get(fila)
+        # Sin datos: borrada en este cambio o en uno posterior que llegará después
+        salida.append({"seq": seq, "id": fila, "data": datos} if datos else {"seq": seq, "id": fila, "deleted": True})
+    return {
+        "entity": entidad,
+        "since": desde,
+        "next": entradas[-1].seq if entradas else desde,
+        "more": mas,
+        "changes": salida,
+    }
+
+
+############# Mantenimiento #############
+
+def compactar(conexion):
+    """Borra las entradas que tienen otra posterior de la misma fila y devuelve cuántas.
+
+    Un terminal con un `desde` anterior recibe igualmente el último cambio de
+    cada fila, así que no pierde nada; las lápidas se conservan. Solo se
+    comparan entradas ya numeradas.
+    """
+    posterior = cambios.alias("posterior")
+    return conexion.execute(
+        delete(cambios).where(exists().where(
+            posterior.c.entity == cambios.c.entity,
+            posterior.c.FK_row == cambios.c.FK_row,
+            posterior.c.seq > cambios.c.seq,
+        ))
+    ).rowcount
+
+
+@migracion(6, "Registro de cambios para la sincronización incremental")
+def _tabla_cambios(conexion):
+    cambios.create(conexion, checkfirst=True)
+    # Las filas existentes entran como primer cambio: desde=0 es la carga completa
+    for entidad, (modelo, _) in ENTIDADES.items():
+        pk = _pk(modelo)
+        registrar(conexion, entidad, select(pk).where(
+            ~exists().where(cambios.c.entity == entidad, cambios.c.FK_row == pk)
+        ))
+
+
+@migracion(7, "Secuencia de lectura de los cambios asignada después del commit")
+def _secuencia_cambios(conexion):
+    anadir_columnas(conexion, "tbChanges", {"seq": "BIGINT"})
+    conexion.execute(text('CREATE INDEX IF NOT EXISTS "ix_tbChanges_seq" ON "tbChanges" ("entity", "seq")'))
+    conexion.execute(text(
+        'CREATE INDEX IF NOT EXISTS "ix_tbChanges_sin_seq" ON "tbChanges" ("PK_change") WHERE seq IS NULL'
+    ))
+    # Los terminales guardaban el PK_change como `since`: las entradas existentes conservan ese número
+    conexion.execute(update(cambios).where(cambios.c.seq.is_(None)).values(seq=cambios.c.PK_change))
+
+
+@click.command("changes-compact")
+@with_appcontext
+def comando_compactar():
+    """Borra del registro de cambios las entradas ya superadas por otras posteriores."""
+    conexion = db.session.connection()
+    numerar(conexion)
+    borradas = compactar(conexion)
+    db.session.commit()
+    click.echo(f"{borradas} entradas borradas")
+
+
+def init_app(app):
+    app.config.setdefault("CHANGES_PAGE_SIZE", 500)
+    app.config.setdefault("CHANGES_MAX_PAGE_SIZE", 5000)
+    if not event.contains(Session, "after_flush", _despues_de_flush):
+        event.listen(Session, "after_flush", _despues_de_flush)
+    app.cli.add_command(comando_compactar)
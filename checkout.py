@@ -0,0 +1,99 @@
+# Creación atómica de una factura con todas sus líneas
+from collections import Counter
+from datetime import date
+from sqlalchemy import func, select
+from models import db, Bill, Client, Detail, PaymentMethod, Product
+from inventory import descontar
+
+# Máximo de unidades por factura aceptadas en una sola petición
+MAX_UNIDADES = 1000
+
+
+def leer_lineas(productos, cantidades):
+    """Convierte las listas del formulario (product[], quantity[]) en líneas."""
+    lineas = []
+    for producto, cantidad in zip(productos, cantidades):
+        if str(producto).strip():
+            lineas.append({"product": producto, "quantity": cantidad or 1})
+    return lineas
+
+
+def _entero(valor, campo):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} debe ser un número entero")
+
+
+def crear_factura(FK_client, FK_paymentMethod, lineas):
+    """Crea la factura y sus detalles en una sola transacción y devuelve su id.
+
+    `lineas` es una lista de {"product": id, "quantity": n}. Cada producto se
+    guarda como un detalle con su cantidad (el precio lo copia bill_totals),
+    y todos se insertan juntos en el mismo flush (un INSERT de varias filas),
+    con un único commit al final. El stock de
+    todos los productos se descuenta en la misma transacción; si falta stock
+    de alguno se lanza StockInsuficiente y no se guarda nada.
+    """
+    FK_client = _entero(FK_client, "FK_client")
+    FK_paymentMethod = _entero(FK_paymentMethod, "FK_paymentMethod")
+    if lineas is None:
+        lineas = []
+    if not isinstance(lineas, list):
+        raise ValueError("lines debe ser una lista")
+    # Unidades por producto; los límites se comprueban antes de acumular nada
+    cantidades = Counter()
+    total = 0
+    for linea in lineas:
+        if not isinstance(linea, dict):
+            raise ValueError("Cada línea debe ser un objeto con product y quantity")
+        producto = _entero(linea.get("product"), "product")
+        cantidad = _entero(linea.get("quantity", 1), "quantity")
+        if cantidad < 1:
+            raise ValueError("quantity debe ser mayor que cero")
+        total += cantidad
+        if total > MAX_UNIDADES:
+            raise ValueError(f"La factura no puede tener más de {MAX_UNIDADES} unidades")
+        cantidades[producto] += cantidad
+    if not cantidades:
+        raise ValueError("La factura debe tener al menos una línea")
+
+    # Una sola consulta valida cliente, método de pago y productos
+    productos = set(cantidades)
+    cliente, metodo, encontrados = db.session.execute(
+        select(
+            select(func.count()).where(Client.PK_client == FK_client).scalar_subquery(),
+            select(func.count()).where(PaymentMethod.PK_paymentMethod == FK_paymentMethod).scalar_subquery(),
+            select(func.count()).where(Product.PK_product.in_(productos)).scalar_subquery(),
+        )
+    ).one()
+    if not cliente:
+        raise ValueError(f"El cliente {FK_client} no existe")
+    if not metodo:
+        raise ValueError(f"El método de pago {FK_paymentMethod} no existe")
+    if encontrados != len(productos):
+        raise ValueError("Alguno de los productos no existe")
+
+    hoy = date.today()
+    try:
+        bill = Bill(
+            FK_client=FK_client,
+            FK_paymentMethod=FK_paymentMethod,
+            date=hoy,
+            createdAt=hoy,
+            updatedAt=hoy,
+            state=True,
+        )
+        bill.details = [
+            Detail(FK_producto=producto, quantity=cantidad, createdAt=hoy, updatedAt=hoy, state=True)
+            for producto, cantidad in cantidades.items()
+        ]
+        db.session.add(bill)
+        db.session.flush()
+        id = bill.PK_bill
+        descontar(cantidades, FK_bill=id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return id
@@ -0,0 +1,66 @@
+# Compresión Brotli / gzip de las respuestas HTML, JSON y CSV
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional: sin él solo se usa gzip
+    brotli = None
+
+TIPOS_COMPRIMIBLES = {
+    "text/html",
+    "text/csv",
+    "text/plain",
+    "application/json",
+    "application/x-ndjson",
+}
+
+
+def _codificacion_aceptada():
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas["br"]:
+        return "br"
+    if aceptadas["gzip"]:
+        return "gzip"
+    return None
+
+
+def comprimir(respuesta, app):
+    """Comprime el cuerpo si el cliente lo acepta y supera COMPRESS_MIN_SIZE.
+
+    Las respuestas en streaming (exportaciones) y los archivos enviados con
+    send_file (PDF, ZIP) se dejan tal cual.
+    """
+    if (
+        respuesta.status_code != 200
+        or respuesta.direct_passthrough
+        or respuesta.is_streamed
+        or respuesta.mimetype not in TIPOS_COMPRIMIBLES
+        or "Content-Encoding" in respuesta.headers
+    ):
+        return respuesta
+    respuesta.vary.add("Accept-Encoding")
+    codificacion = _codificacion_aceptada()
+    if codificacion is None:
+        return respuesta
+    datos = respuesta.get_data()
+    if len(datos) < app.config["COMPRESS_MIN_SIZE"]:
+        return respuesta
+    if codificacion == "br":
+        datos = brotli.compress(datos, quality=app.config["COMPRESS_BROTLI_QUALITY"])
+    else:
+        datos = gzip.compress(datos, compresslevel=app.config["COMPRESS_GZIP_LEVEL"])
+    respuesta.set_data(datos)
+    respuesta.headers["Content-Encoding"] = codificacion
+    # Un ETag fuerte identifica los bytes exactos: deja de valer al comprimir
+    etag, debil = respuesta.get_etag()
+    if etag and not debil:
+        respuesta.set_etag(etag, weak=True)
+    return respuesta
+
+
+def init_app(app):
+    app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+    app.config.setdefault("COMPRESS_BROTLI_QUALITY", 4)
+    app.config.setdefault("COMPRESS_GZIP_LEVEL", 6)
+    app.after_request(lambda respuesta: comprimir(respuesta, app))
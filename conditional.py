@@ -0,0 +1,121 @@
+# GET condicional (ETag / Last-Modified) para listados y facturas sin renderizar la página
+import hashlib
+import os
+from datetime import datetime, time as hora
+from functools import wraps
+from flask import current_app, make_response, request, session
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers
+from models import db, Bill, Client, Detail, PaymentMethod, Product
+from pagination import consulta_pagina
+
+
+def _columnas(*modelos):
+    return [columna for modelo in modelos for columna in modelo.__table__.c]
+
+
+def _modelo_de(relacion):
+    return relacion.property.mapper.class_
+
+
+def listado(modelo, pk, filtros=None, relaciones=(), ordenes=None):
+    """Sentencias que identifican la página pedida de un listado paginado.
+
+    Son las mismas filas que mostrará la página (con una de más), más las
+    filas de las relaciones que se pintan (`relaciones` son nombres de
+    atributo, p. ej. 'category' para la categoría del producto),
+    leídas con Core: una consulta con LIMIT, sin ORM ni plantilla.
+    """
+    def consultas(**_):
+        # Por nombre: los backref no existen hasta que se configuran los mappers
+        atributos = [getattr(modelo, nombre) for nombre in relaciones]
+        stmt = select(*_columnas(modelo, *[_modelo_de(a) for a in atributos])).select_from(modelo)
+        for atributo in atributos:
+            stmt = stmt.outerjoin(atributo)
+        return [consulta_pagina(stmt, modelo, pk, filtros, ordenes)]
+    return consultas
+
+
+def factura(id):
+    """Sentencias de la página de una factura: cabecera, cliente, método de pago y líneas."""
+    return [
+        select(*_columnas(Bill, Client, PaymentMethod)).select_from(Bill)
+        .outerjoin(Bill.client).outerjoin(Bill.payment_method).where(Bill.PK_bill == id),
+        select(*_columnas(Detail, Product)).select_from(Detail)
+        .outerjoin(Detail.product).where(Detail.FK_bill == id).order_by(Detail.PK_detail),
+    ]
+
+
+def _validadores(sentencias):
+    """(ETag, Last-Modified) de las filas devueltas por `sentencias`.
+
+    updatedAt es una fecha sin hora, así que max(updatedAt) y el número de
+    filas no distinguen dos ediciones del mismo día; el ETag incluye además
+    un resumen del contenido de las filas.
+    """
+    resumen = hashlib.sha1(current_app.extensions["conditional"].encode())
+    # La página cambia según el usuario (menú por rol, saludo) y la URL
+    resumen.update(repr((session.get("user_role"), session.get("user_name"), request.full_path)).encode())
+    ultima = None
+    filas_totales = 0
+    for stmt in sentencias:
+        filas = db.session.execute(stmt).all()
+        filas_totales += len(filas)
+        for fila in filas:
+            resumen.update(repr(tuple(fila)).encode())
+            fecha = fila._mapping.get("updatedAt")
+            if fecha is not None and (ultima is None or fecha > ultima):
+                ultima = fecha
+    resumen.update(str(filas_totales).encode())
+    if ultima is not None and not isinstance(ultima, datetime):
+        ultima = datetime.combine(ultima, hora.min)
+    return resumen.hexdigest(), ultima
+
+
+def condicional(consultas):
+    """Decorador: responde 304 Not Modified si el contenido no ha cambiado.
+
+    `consultas(**argumentos de la ruta)` devuelve las sentencias cuyas filas
+    determinan lo que se pinta. Si el If-None-Match del navegador coincide con
+    el ETag calculado, no se ejecuta la vista. Solo se usa el ETag: la fecha
+    de Last-Modified no tiene hora y no basta para decidir.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if request.method != "GET" or not current_app.config["CONDITIONAL_GET"]:
+                return vista(*args, **kwargs)
+            etag, ultima = _validadores(consultas(**kwargs))
+            if request.if_none_match.contains_weak(etag):
+                respuesta = current_app.response_class(status=304)
+            else:
+                respuesta = make_response(vista(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+            respuesta.set_etag(etag, weak=True)
+            if ultima is not None:
+                respuesta.last_modified = ultima
+            # Que el navegador guarde la página pero la revalide siempre
+            respuesta.headers["Cache-Control"] = "private, no-cache"
+            respuesta.vary.add("Cookie")
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def _version_plantillas(app):
+    # Un despliegue con plantillas nuevas cambia todos los ETag
+    ultima = 0
+    for raiz, _, archivos in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for archivo in archivos:
+            ultima = max(ultima, os.path.getmtime(os.path.join(raiz, archivo)))
+    return str(ultima)
+
+
+def init_app(app):
+    app.config.setdefault("CONDITIONAL_GET", True)
+    # Los backref (Product.category, Bill.client...) que usan `listado` y la API
+    # solo existen tras configurar los mappers; sin esto, la primera petición de
+    # un worker a /products fallaría si ninguna consulta del ORM los ha configurado
+    configure_mappers()
+    app.extensions["conditional"] = _version_plantillas(app)
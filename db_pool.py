@@ -0,0 +1,90 @@
+# Pool de conexiones instrumentado: conexiones en uso, espera al pedir una conexión y desbordes
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from models import db
+
+# Esperas más largas que esto cuentan como "espera lenta"
+ESPERA_LENTA = 0.010
+
+
+class EstadisticasPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pedidas = 0
+        self.desbordes = 0
+        self.agotado = 0
+        self.esperas_lentas = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+
+    def registrar(self, espera, desborde=False, agotado=False):
+        with self._lock:
+            self.pedidas += 1
+            self.espera_total += espera
+            self.espera_maxima = max(self.espera_maxima, espera)
+            if espera > ESPERA_LENTA:
+                self.esperas_lentas += 1
+            if desborde:
+                self.desbordes += 1
+            if agotado:
+                self.agotado += 1
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide cuánto se espera para obtener una conexión."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estadisticas = EstadisticasPool()
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        desborde_antes = self.overflow()
+        try:
+            conexion = super()._do_get()
+        except exc.TimeoutError:
+            self.estadisticas.registrar(time.perf_counter() - inicio, agotado=True)
+            raise
+        self.estadisticas.registrar(
+            time.perf_counter() - inicio, desborde=self.overflow() > max(desborde_antes, 0)
+        )
+        return conexion
+
+
+def estado_pools():
+    """Estado actual de los pools de cada motor configurado (requiere contexto de aplicación)."""
+    estado = {}
+    for bind, engine in db.engines.items():
+        pool = engine.pool
+        datos = {"clase": type(pool).__name__, "estado": pool.status()}
+        if isinstance(pool, QueuePool):
+            datos.update(
+                tamano=pool.size(),
+                en_uso=pool.checkedout(),
+                libres=pool.checkedin(),
+                desborde=max(pool.overflow(), 0),
+            )
+        estadisticas = getattr(pool, "estadisticas", None)
+        if estadisticas:
+            datos.update(
+                pedidas=estadisticas.pedidas,
+                desbordes=estadisticas.desbordes,
+                agotado=estadisticas.agotado,
+                esperas_lentas=estadisticas.esperas_lentas,
+                espera_total_s=round(estadisticas.espera_total, 6),
+                espera_maxima_s=round(estadisticas.espera_maxima, 6),
+            )
+        estado[bind or "default"] = datos
+    return estado
+
+
+def init_app(app):
+    """Usa PoolMedido en los motores con pool de cola. Llamar antes de db.init_app."""
+    backend = make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name()
+    opciones = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    if backend != "sqlite":
+        opciones.setdefault("poolclass", PoolMedido)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = opciones
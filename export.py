@@ -0,0 +1,96 @@
+# Exportación en streaming (CSV / NDJSON) de facturas y detalles de venta
+import csv
+import io
+import json
+from datetime import date
+from sqlalchemy import select
+from models import db, Bill, Client, Detail, PaymentMethod, Product
+from pagination import aplicar_filtros
+
+# Filas que se piden al cursor del servidor en cada viaje
+TAMANO_LOTE = 1000
+
+FORMATOS = {
+    # Flask añade "; charset=utf-8" a los tipos text/*
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def consulta_facturas():
+    return (
+        select(
+            Bill.PK_bill, Bill.date, Bill.createdAt, Bill.state,
+            Bill.lineCount, Bill.subtotal, Bill.total,
+            Client.PK_client, Client.firstName, Client.lastName, Client.email,
+            PaymentMethod.name.label('paymentMethod'),
+        )
+        .join(Client, Bill.FK_client == Client.PK_client)
+        .join(PaymentMethod, Bill.FK_paymentMethod == PaymentMethod.PK_paymentMethod)
+        .order_by(Bill.PK_bill)
+    )
+
+
+def consulta_detalles():
+    return (
+        select(
+            Detail.PK_detail, Detail.createdAt, Detail.state, Detail.quantity, Detail.unitPrice,
+            Bill.PK_bill, Bill.date,
+            Client.PK_client, Client.firstName, Client.lastName,
+            Product.PK_product, Product.name.label('productName'), Product.price,
+            PaymentMethod.name.label('paymentMethod'),
+        )
+        .join(Bill, Detail.FK_bill == Bill.PK_bill)
+        .join(Product, Detail.FK_producto == Product.PK_product)
+        .join(Client, Bill.FK_client == Client.PK_client)
+        .join(PaymentMethod, Bill.FK_paymentMethod == PaymentMethod.PK_paymentMethod)
+        .order_by(Detail.PK_detail)
+    )
+
+
+# Entidad exportable -> (modelo cuyo createdAt/state se filtra, consulta, filtros por FK)
+EXPORTACIONES = {
+    'bills': (Bill, consulta_facturas, {'client': Bill.FK_client, 'payment_method': Bill.FK_paymentMethod}),
+    'details': (Detail, consulta_detalles, {'bill': Detail.FK_bill, 'product': Detail.FK_producto}),
+}
+
+
+def consulta_exportacion(entidad):
+    """Consulta de la entidad con los filtros de la petición (desde/hasta, state, FK)."""
+    modelo, consulta, filtros = EXPORTACIONES[entidad]
+    return aplicar_filtros(consulta(), modelo, filtros)
+
+
+def _valor_json(valor):
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def generar_filas(stmt, formato):
+    """Genera el contenido por lotes leyendo con un cursor del servidor (yield_per).
+
+    Solo hay un lote en memoria a la vez, así que el consumo es constante
+    sea cual sea el número de filas exportadas.
+    """
+    result = db.session.execute(stmt.execution_options(yield_per=TAMANO_LOTE))
+    try:
+        columnas = list(result.keys())
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        if formato == 'csv':
+            escritor.writerow(columnas)
+            yield buffer.getvalue()
+
+        for lote in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            if formato == 'csv':
+                escritor.writerows(lote)
+            else:
+                for fila in lote:
+                    buffer.write(json.dumps(dict(zip(columnas, fila)), default=_valor_json))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+    finally:
+        result.close()
@@ -0,0 +1,287 @@
+# Caché de fragmentos de plantillas: {% cache 'fila', producto, producto.category %}...{% endcache %}
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+############# Backends #############
+
+class MemoriaLRU:
+    """Fragmentos en memoria del proceso, LRU con expiración.
+
+    Cada worker tiene la suya y no se entera de las invalidaciones de los
+    demás; no sirve fragmentos viejos porque la clave incluye los valores de
+    las filas que acaba de leer (ver `_parte`).
+    """
+
+    def __init__(self, tamano=5000, ttl=300):
+        self.tamano = tamano
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._por_etiqueta = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] <= time.monotonic():
+                self._quitar(clave)
+                return None
+            self._datos.move_to_end(clave)
+            return entrada[1]
+
+    def guardar(self, clave, valor, etiquetas):
+        with self._lock:
+            self._quitar(clave)
+            self._datos[clave] = (time.monotonic() + self.ttl, valor, etiquetas)
+            for etiqueta in etiquetas:
+                self._por_etiqueta.setdefault(etiqueta, set()).add(clave)
+            while len(self._datos) > self.tamano:
+                self._quitar(next(iter(self._datos)))
+
+    def _quitar(self, clave):
+        entrada = self._datos.pop(clave, None)
+        if entrada:
+            for etiqueta in entrada[2]:
+                claves = self._por_etiqueta.get(etiqueta)
+                if claves is not None:
+                    claves.discard(clave)
+                    if not claves:
+                        del self._por_etiqueta[etiqueta]
+
+    def invalidar(self, etiquetas):
+        with self._lock:
+            for etiqueta in etiquetas:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+
+    def invalidar_tablas(self, tablas):
+        with self._lock:
+            for etiqueta in [e for e in self._por_etiqueta if e[0] in tablas]:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+
+
+class SistemaArchivos:
+    """Fragmentos en archivos, compartidos por todos los workers de la máquina.
+
+    <directorio>/f/<clave>.html guarda el fragmento y
+    <directorio>/e/<tabla>/<pk>/<clave> marca qué fragmentos usan cada fila.
+    """
+
+    def __init__(self, directorio, ttl=300):
+        self.directorio = directorio
+        self.ttl = ttl
+
+    def _fragmento(self, clave):
+        return os.path.join(self.directorio, "f", clave + ".html")
+
+    def _etiqueta(self, etiqueta):
+        tabla, pk = etiqueta
+        return os.path.join(self.directorio, "e", tabla, "-".join(str(v) for v in pk))
+
+    def obtener(self, clave):
+        ruta = self._fragmento(clave)
+        try:
+            if os.path.getmtime(ruta) + self.ttl <= time.time():
+                os.remove(ruta)
+                return None
+            with open(ruta, encoding="utf-8") as archivo:
+                return archivo.read()
+        except OSError:
+            return None
+
+    def guardar(self, clave, valor, etiquetas):
+        ruta = self._fragmento(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        for etiqueta in etiquetas:
+            directorio = self._etiqueta(etiqueta)
+            os.makedirs(directorio, exist_ok=True)
+            open(os.path.join(directorio, clave), "w").close()
+        # Escritura atómica: otro worker nunca lee un fragmento a medias
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            archivo.write(valor)
+        os.replace(temporal, ruta)
+
+    def _borrar_marcas(self, directorio):
+        try:
+            claves = os.listdir(directorio)
+        except OSError:
+            return
+        for clave in claves:
+            try:
+                os.remove(self._fragmento(clave))
+            except OSError:
+                pass
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    def invalidar(self, etiquetas):
+        for etiqueta in etiquetas:
+            self._borrar_marcas(self._etiqueta(etiqueta))
+
+    def invalidar_tablas(self, tablas):
+        for tabla in tablas:
+            raiz = os.path.join(self.directorio, "e", tabla)
+            try:
+                filas = os.listdir(raiz)
+            except OSError:
+                continue
+            for fila in filas:
+                self._borrar_marcas(os.path.join(raiz, fila))
+
+
+BACKENDS = {
+    "memory": lambda app: MemoriaLRU(app.config["FRAGMENT_CACHE_SIZE"], app.config["FRAGMENT_CACHE_TTL"]),
+    "filesystem": lambda app: SistemaArchivos(
+        app.config["FRAGMENT_CACHE_DIR"] or os.path.join(app.instance_path, "fragment_cache"),
+        app.config["FRAGMENT_CACHE_TTL"],
+    ),
+}
+
+
+############# Extensión de Jinja #############
+
+def _parte(valor):
+    """(parte de la clave, etiqueta o None) de un argumento de {% cache %}.
+
+    De un objeto del ORM entran en la clave todas sus columnas, no solo
+    updatedAt (una fecha sin hora): una fila escrita en otro worker cambia la
+    clave en cuanto esta petición la lee, aunque la invalidación no llegue.
+    """
+    estado = inspect(valor, raiseerr=False) if valor is not None else None
+    if estado is not None and getattr(estado, "mapper", None) is not None and estado.identity:
+        etiqueta = (estado.mapper.local_table.name, estado.identity)
+        version = tuple(getattr(valor, atributo.key) for atributo in estado.mapper.column_attrs)
+        return repr((etiqueta, version)), etiqueta
+    return repr(valor), None
+
+
+class CacheFragmentos(Extension):
+    """{% cache nombre, objeto, relacion, ... %} ... {% endcache %}
+
+    Los objetos del ORM entran en la clave con su tabla, clave primaria y
+    los valores de sus columnas, y el fragmento se invalida cuando alguno de
+    ellos se escribe.
+    Los demás argumentos (textos, números) solo forman parte de la clave.
+    """
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        partes = [nodes.Const(f"{parser.name}:{lineno}"), parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            partes.append(parser.parse_expression())
+        cuerpo = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_renderizar", [nodes.List(partes)]), [], [], cuerpo
+        ).set_lineno(lineno)
+
+    def _renderizar(self, partes, caller):
+        cache = current_app.extensions.get("fragment_cache") if has_app_context() else None
+        if cache is None:
+            return caller()
+        claves, etiquetas = zip(*(_parte(parte) for parte in partes))
+        clave = hashlib.sha1("|".join(claves).encode()).hexdigest()
+        html = cache.backend.obtener(clave)
+        if html is not None:
+            return Markup(html)
+        generacion = cache.generacion
+        html = caller()
+        # Si hubo una invalidación mientras se renderizaba, no se guarda
+        if generacion == cache.generacion:
+            cache.backend.guardar(clave, str(html), [e for e in etiquetas if e is not None])
+        return Markup(html)
+
+
+class CacheActiva:
+    def __init__(self, backend):
+        self.backend = backend
+        self.generacion = 0
+        self._lock = threading.Lock()
+
+    def invalidar(self, etiquetas=(), tablas=()):
+        with self._lock:
+            self.generacion += 1
+        if etiquetas:
+            self.backend.invalidar(etiquetas)
+        if tablas:
+            self.backend.invalidar_tablas(tablas)
+
+
+def invalidar_tablas(*tablas):
+    """Invalida todos los fragmentos de las tablas (p. ej. tras sentencias Core)."""
+    cache = current_app.extensions.get("fragment_cache")
+    if cache is not None:
+        cache.invalidar(tablas=set(tablas))
+
+
+############# Invalidación por eventos de SQLAlchemy #############
+
+def marcar_filas(session, tabla, *pks):
+    """Invalida al hacer commit los fragmentos de filas escritas sin el ORM."""
+    etiquetas = session.info.setdefault("fragmentos_modificados", set())
+    etiquetas.update((tabla, (pk,)) for pk in pks)
+
+
+def _despues_de_flush(session, flush_context):
+    etiquetas = session.info.setdefault("fragmentos_modificados", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        estado = inspect(obj)
+        if estado.identity:
+            etiquetas.add((estado.mapper.local_table.name, estado.identity))
+
+
+def _al_ejecutar(orm_execute_state):
+    # UPDATE/DELETE sin pasar por el flush (masivos o Core vía session.execute):
+    # no se sabe qué filas cambian, se invalida toda la tabla
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        tabla = getattr(orm_execute_state.statement, "table", None)
+        if tabla is not None and hasattr(tabla, "name"):
+            orm_execute_state.session.info.setdefault("fragmentos_tablas", set()).add(tabla.name)
+
+
+def _despues_de_commit(session):
+    etiquetas = session.info.pop("fragmentos_modificados", None)
+    tablas = session.info.pop("fragmentos_tablas", None)
+    if (etiquetas or tablas) and has_app_context():
+        cache = current_app.extensions.get("fragment_cache")
+        if cache is not None:
+            cache.invalidar(etiquetas or (), tablas or ())
+
+
+def _despues_de_rollback(session):
+    session.info.pop("fragmentos_modificados", None)
+    session.info.pop("fragmentos_tablas", None)
+
+
+def init_app(app):
+    app.config.setdefault("FRAGMENT_CACHE_BACKEND", "memory")
+    app.config.setdefault("FRAGMENT_CACHE_SIZE", 5000)
+    app.config.setdefault("FRAGMENT_CACHE_TTL", 300)
+    app.config.setdefault("FRAGMENT_CACHE_DIR", None)
+    app.jinja_env.add_extension(CacheFragmentos)
+    backend = app.config["FRAGMENT_CACHE_BACKEND"]
+    if backend:
+        # Un nombre de BACKENDS o un objeto con obtener/guardar/invalidar/invalidar_tablas
+        backend = BACKENDS[backend](app) if isinstance(backend, str) else backend
+        app.extensions["fragment_cache"] = CacheActiva(backend)
+    for nombre, funcion in (
+        ("after_flush", _despues_de_flush),
+        ("do_orm_execute", _al_ejecutar),
+        ("after_commit", _despues_de_commit),
+        ("after_rollback", _despues_de_rollback),
+    ):
+        if not event.contains(Session, nombre, funcion):
+            event.listen(Session, nombre, funcion)
@@ -0,0 +1,181 @@
+# Control de inventario: descuentos de stock sin condiciones de carrera y libro de movimientos
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select, update
+from models import db, Category, Product, StockMovement
+from reference_data import invalidar
+from changes import registrar
+
+productos = Product.__table__
+movimientos = StockMovement.__table__
+
+
+class StockInsuficiente(ValueError):
+    """No hay stock suficiente de un producto para la cantidad pedida."""
+
+    def __init__(self, producto, cantidad):
+        self.producto = producto
+        self.cantidad = cantidad
+        super().__init__(f"Stock insuficiente del producto {producto} para {cantidad} unidades")
+
+
+def _registrar(filas):
+    if filas:
+        db.session.execute(insert(movimientos), filas)
+        # El stock cambia con sentencias Core: el registro de cambios se apunta aquí
+        registrar(db.session.connection(), "products", sorted({fila["FK_product"] for fila in filas}))
+
+
+def movimiento(producto, cantidad, stock, motivo, FK_bill):
+    """Fila del libro de movimientos de stock (tbStockMovements)."""
+    return {
+        "FK_product": producto,
+        "FK_bill": FK_bill,
+        "quantity": cantidad,
+        "stockAfter": stock,
+        "reason": motivo,
+        "createdAt": datetime.now(),
+    }
+
+
+def descontar(cantidades, FK_bill=None, motivo="venta"):
+    """Descuenta el stock de varios productos dentro de la transacción actual.
+
+    `cantidades` es {producto: unidades}. Cada producto se descuenta con un
+    único UPDATE ... WHERE stock >= :cantidad RETURNING stock, así que dos
+    ventas simultáneas nunca pueden dejar el stock en negativo. Los productos
+    se recorren ordenados por id para que las transacciones bloqueen las filas
+    siempre en el mismo orden y no se interbloqueen. Si falta stock de alguno
+    se lanza StockInsuficiente y el llamador debe hacer rollback. No hace commit.
+    """
+    filas = []
+    for producto in sorted(cantidades):
+        cantidad = cantidades[producto]
+        stock = db.session.execute(
+            update(productos)
+            .where(productos.c.PK_product == producto, productos.c.stock >= cantidad)
+            .values(stock=productos.c.stock - cantidad)
+            .returning(productos.c.stock)
+        ).scalar()
+        if stock is None:
+            raise StockInsuficiente(producto, cantidad)
+        filas.append(movimiento(producto, -cantidad, stock, motivo, FK_bill))
+    _registrar(filas)
+
+
+def reponer(cantidades, FK_bill=None, motivo="devolucion"):
+    """Devuelve unidades al stock (p. ej. al borrar un detalle). No hace commit."""
+    filas = []
+    for producto in sorted(cantidades):
+        cantidad = cantidades[producto]
+        stock = db.session.execute(
+            update(productos)
+            .where(productos.c.PK_product == producto)
+            .values(stock=productos.c.stock + cantidad)
+            .returning(productos.c.stock)
+        ).scalar()
+        if stock is not None:
+            filas.append(movimiento(producto, cantidad, stock, motivo, FK_bill))
+    _registrar(filas)
+
+
+def ajustar(producto, stock, motivo="ajuste"):
+    """Fija el stock de un producto a mano y registra la diferencia. No hace commit."""
+    anterior = db.session.execute(
+        select(productos.c.stock).where(productos.c.PK_product == producto).with_for_update()
+    ).scalar_one()
+    if stock != anterior:
+        db.session.execute(
+            update(productos).where(productos.c.PK_product == producto).values(stock=stock)
+        )
+        _registrar([movimiento(producto, stock - anterior, stock, motivo, None)])
+
+
+def registrar_alta(producto, stock):
+    """Primer movimiento de un producto nuevo. No hace commit."""
+    _registrar([movimiento(producto, stock, stock, "alta", None)])
+
+
+@click.command("bench-inventory")
+@click.option("--workers", default=16, show_default=True, help="Ventas simultáneas.")
+@click.option("--checkouts", default=500, show_default=True, help="Ventas a intentar.")
+@click.option("--stock", default=300, show_default=True, help="Stock inicial del producto de prueba.")
+@click.option("--quantity", default=1, show_default=True, help="Unidades por venta.")
+@with_appcontext
+def comando_bench_inventory(workers, checkouts, stock, quantity):
+    """Vende en paralelo un producto de prueba y comprueba que no hay sobreventa.
+
+    Crea una categoría y un producto temporales en la base de datos
+    configurada y los elimina (junto a sus movimientos) al terminar.
+    """
+    app = current_app._get_current_object()
+    hoy = date.today()
+    categoria = Category(cathegoryName="bench-inventario", createdAt=hoy, updatedAt=hoy, state=True)
+    db.session.add(categoria)
+    db.session.flush()
+    producto = Product(name="bench-inventario", price=1, stock=stock, FK_category=categoria.PK_category,
+                       createdAt=hoy, updatedAt=hoy, state=True)
+    db.session.add(producto)
+    db.session.commit()
+    id_producto, id_categoria = producto.PK_product, categoria.PK_category
+
+    latencias = []
+    lock = threading.Lock()
+
+    def vender(_):
+        with app.app_context():
+            inicio = time.perf_counter()
+            try:
+                descontar({id_producto: quantity}, motivo="benchmark")
+                db.session.commit()
+                resultado = "vendida"
+            except StockInsuficiente:
+                db.session.rollback()
+                resultado = "sin_stock"
+            except Exception:
+                db.session.rollback()
+                resultado = "error"
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+            return resultado
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resultados = list(pool.map(vender, range(checkouts)))
+    segundos = time.perf_counter() - inicio
+
+    vendidas = resultados.count("vendida")
+    final = db.session.execute(select(productos.c.stock).where(productos.c.PK_product == id_producto)).scalar_one()
+    libro = db.session.execute(
+        select(func.coalesce(func.sum(movimientos.c.quantity), 0)).where(movimientos.c.FK_product == id_producto)
+    ).scalar_one()
+    correcto = final >= 0 and final == stock - vendidas * quantity and -libro == vendidas * quantity
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95) - 1] if latencias else 0
+    click.echo(
+        f"{checkouts} ventas con {workers} hilos en {segundos:.2f} s "
+        f"({checkouts / segundos:.1f} ventas/s, p95 {p95 * 1000:.1f} ms)\n"
+        f"vendidas={vendidas} sin_stock={resultados.count('sin_stock')} errores={resultados.count('error')} "
+        f"stock inicial={stock} final={final} libro={libro}"
+    )
+
+    db.session.execute(movimientos.delete().where(movimientos.c.FK_product == id_producto))
+    db.session.execute(productos.delete().where(productos.c.PK_product == id_producto))
+    db.session.execute(Category.__table__.delete().where(Category.__table__.c.PK_category == id_categoria))
+    registrar(db.session.connection(), "products", [id_producto], borrado=True)
+    registrar(db.session.connection(), "categories", [id_categoria], borrado=True)
+    db.session.commit()
+    invalidar("categories", "search_products")
+    if not correcto:
+        raise click.ClickException("Inconsistencia de stock: hubo sobreventa o actualizaciones perdidas")
+    click.echo("Sin sobreventa: el stock y el libro de movimientos cuadran")
+
+
+def init_app(app):
+    app.cli.add_command(comando_bench_inventory)
@@ -0,0 +1,338 @@
+# Facturas en PDF generadas con los datos reales y caché de PDFs en disco
+import hashlib
+import json
+import os
+import tempfile
+import time
+import unicodedata
+import zipfile
+import click
+from flask import abort, current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from models import db, Bill, Client, Detail, PaymentMethod, Product
+
+
+def datos_facturas(ids):
+    """Devuelve {PK_bill: datos} de las facturas `ids` con solo dos consultas.
+
+    Los datos son diccionarios simples (sin objetos ORM), así que se pueden
+    usar como clave de la caché o enviar a otro proceso para renderizar.
+    """
+    ids = list(ids)
+    cabeceras = db.session.execute(
+        select(
+            Bill.PK_bill, Bill.date, Bill.updatedAt,
+            Client.firstName, Client.lastName,
+            PaymentMethod.name.label('paymentMethod'),
+        )
+        .join(Client, Bill.FK_client == Client.PK_client)
+        .join(PaymentMethod, Bill.FK_paymentMethod == PaymentMethod.PK_paymentMethod)
+        .where(Bill.PK_bill.in_(ids))
+    )
+    facturas = {}
+    for fila in cabeceras:
+        facturas[fila.PK_bill] = {
+            "PK_bill": fila.PK_bill,
+            "client_name": f"{fila.firstName} {fila.lastName}",
+            "payment_method": fila.paymentMethod,
+            "date": fila.date.isoformat() if fila.date else "",
+            "updatedAt": fila.updatedAt.isoformat() if fila.updatedAt else "",
+            "details": [],
+        }
+
+    lineas = db.session.execute(
+        select(Detail.FK_bill, Product.name, Detail.quantity, Detail.unitPrice)
+        .join(Product, Detail.FK_producto == Product.PK_product)
+        .where(Detail.FK_bill.in_(ids))
+        .order_by(Detail.FK_bill, Detail.PK_detail)
+    )
+    for fila in lineas:
+        # Cantidad y precio guardados en el detalle al venderse
+        facturas[fila.FK_bill]["details"].append(
+            {"product_name": fila.name, "quantity": fila.quantity, "unit_price": float(fila.unitPrice or 0)}
+        )
+    return facturas
+
+
+def clave_factura(datos):
+    """Clave de contenido: id y updatedAt de la factura más el resumen de sus datos."""
+    contenido = json.dumps(datos, sort_keys=True, default=str).encode("utf-8")
+    return f"{datos['PK_bill']}-{datos['updatedAt']}-{hashlib.sha256(contenido).hexdigest()[:32]}"
+
+
+# Signos tipográficos y letras sin descomposición de Unicode que no existen en latin-1
+_EQUIVALENTES = str.maketrans({
+    "‘": "'", "’": "'", "‚": ",", "“": '"', "”": '"', "„": '"',
+    "–": "-", "—": "-", "‐": "-", "−": "-", "…": "...", "€": "EUR", "•": "-",
+    "Ł": "L", "ł": "l", "Đ": "D", "đ": "d", "Œ": "OE", "œ": "oe",
+})
+
+
+def texto_pdf(valor):
+    """`valor` como texto que las fuentes estándar de fpdf (latin-1) pueden escribir.
+
+    Se sustituyen los signos tipográficos por su equivalente, a las letras
+    fuera de latin-1 se les quitan los acentos (ő -> o) y lo que aún no se
+    puede escribir queda como "?".
+    """
+    texto = str(valor).translate(_EQUIVALENTES)
+    try:
+        texto.encode("latin-1")
+        return texto
+    except UnicodeEncodeError:
+        pass
+    letras = []
+    for letra in texto:
+        try:
+            letra.encode("latin-1")
+        except UnicodeEncodeError:
+            letra = "".join(c for c in unicodedata.normalize("NFKD", letra) if not unicodedata.combining(c))
+        letras.append(letra)
+    return "".join(letras).encode("latin-1", "replace").decode("latin-1")
+
+
+def render_factura(datos):
+    """Genera el PDF de una factura y devuelve sus bytes."""
+    # fpdf se importa al generar el primer PDF, no al arrancar cada worker
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    # Título
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(200, 10, txt=f"Factura N° {datos['PK_bill']}", ln=True, align="C")
+
+    # Información del cliente y factura
+    pdf.set_font("Arial", size=12)
+    pdf.ln(10)
+    pdf.cell(100, 10, txt=texto_pdf(f"Cliente: {datos['client_name']}"))
+    pdf.ln(8)
+    pdf.cell(100, 10, txt=texto_pdf(f"Método de Pago: {datos['payment_method']}"))
+    pdf.ln(8)
+    pdf.cell(100, 10, txt=f"Fecha: {datos['date']}")
+
+    # Calcular el total de la factura
+    total_factura = sum(item["quantity"] * item["unit_price"] for item in datos["details"])
+    pdf.ln(8)
+    pdf.cell(100, 10, txt=f"Total: {total_factura:.2f} Bs")
+
+    # Detalles de la factura
+    pdf.ln(15)
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.cell(70, 10, txt="Producto", border=1, align="C")
+    pdf.cell(30, 10, txt="Cantidad", border=1, align="C")
+    pdf.cell(40, 10, txt="Precio Unitario", border=1, align="C")
+    pdf.cell(50, 10, txt="Total", border=1, align="C")
+    pdf.ln(10)
+
+    pdf.set_font("Arial", size=12)
+    for item in datos["details"]:
+        total_item = item["quantity"] * item["unit_price"]
+        pdf.cell(70, 10, txt=texto_pdf(item["product_name"]), border=1)
+        pdf.cell(30, 10, txt=str(item["quantity"]), border=1, align="C")
+        pdf.cell(40, 10, txt=f"{item['unit_price']:.2f} Bs", border=1, align="C")
+        pdf.cell(50, 10, txt=f"{total_item:.2f} Bs", border=1, align="C")
+        pdf.ln(10)
+
+    return pdf.output(dest="S").encode("latin1")
+
+
+class CachePDF:
+    """PDFs ya generados guardados en un directorio, con límite de tamaño total.
+
+    Al superar `max_bytes` se borran primero los archivos usados hace más
+    tiempo (cada acierto actualiza la fecha de modificación del archivo).
+    """
+
+    def __init__(self, directorio, max_bytes):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+
+    def ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pdf")
+
+    def obtener(self, clave):
+        ruta = self.ruta(clave)
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        return ruta
+
+    def guardar(self, clave, contenido, recortar=True):
+        os.makedirs(self.directorio, exist_ok=True)
+        # Se escribe en un temporal y se renombra para no servir PDFs a medias
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        with os.fdopen(fd, "wb") as archivo:
+            archivo.write(contenido)
+        ruta = self.ruta(clave)
+        os.replace(temporal, ruta)
+        if recortar:
+            self.recortar()
+        return ruta
+
+    def recortar(self):
+        archivos = []
+        total = 0
+        for entrada in os.scandir(self.directorio):
+            if entrada.is_file() and entrada.name.endswith(".pdf"):
+                estado = entrada.stat()
+                archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+                total += estado.st_size
+        for _, tamano, ruta in sorted(archivos):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
+
+
+def pdf_factura(id):
+    """Ruta en disco del PDF de la factura `id`, generándolo solo si no está en caché."""
+    datos = datos_facturas([id]).get(id)
+    if datos is None:
+        abort(404)
+    cache = current_app.extensions["pdf_cache"]
+    clave = clave_factura(datos)
+    return cache.obtener(clave) or cache.guardar(clave, render_factura(datos))
+
+
+def ids_facturas(desde=None, hasta=None, ids=None):
+    """Ids de las facturas a generar en lote, por rango de createdAt y/o lista de ids."""
+    consulta = select(Bill.PK_bill).order_by(Bill.PK_bill)
+    if desde:
+        consulta = consulta.where(Bill.createdAt >= desde)
+    if hasta:
+        consulta = consulta.where(Bill.createdAt <= hasta)
+    if ids:
+        consulta = consulta.where(Bill.PK_bill.in_(ids))
+    return db.session.scalars(consulta).all()
+
+
+def _render_lote(lote):
+    # Se ejecuta en los procesos del pool: solo recibe y devuelve datos simples
+    return [(datos["PK_bill"], clave_factura(datos), render_factura(datos)) for datos in lote]
+
+
+def _trozos(valores, tamano):
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
+class _SalidaLote:
+    """Escribe los PDFs del lote en un ZIP (destino *.zip) o en un directorio."""
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.zip = None
+        if destino.endswith(".zip"):
+            self.zip = zipfile.ZipFile(destino, "w", zipfile.ZIP_STORED)
+        else:
+            os.makedirs(destino, exist_ok=True)
+
+    def escribir(self, id, contenido):
+        nombre = f"factura_{id}.pdf"
+        if self.zip is not None:
+            self.zip.writestr(nombre, contenido)
+        else:
+            with open(os.path.join(self.destino, nombre), "wb") as archivo:
+                archivo.write(contenido)
+
+    def cerrar(self):
+        if self.zip is not None:
+            self.zip.close()
+
+
+def generar_lote(ids, destino, workers=None):
+    """Genera los PDFs de `ids` repartiendo el renderizado en un pool de procesos.
+
+    Los datos se leen de la base de datos una vez por trozo de facturas, se
+    reutilizan los PDFs que ya están en la caché y el resto se renderiza en
+    paralelo. Devuelve estadísticas con el rendimiento en facturas/segundo.
+    """
+    inicio = time.perf_counter()
+    cache = current_app.extensions["pdf_cache"]
+    workers = workers or current_app.config["PDF_BATCH_WORKERS"] or os.cpu_count()
+    tamano = current_app.config["PDF_BATCH_CHUNK"]
+    salida = _SalidaLote(destino)
+    total = renderizadas = 0
+
+    def recoger(futuros):
+        nonlocal total, renderizadas
+        for futuro in futuros:
+            for id, clave, contenido in futuro.result():
+                cache.guardar(clave, contenido, recortar=False)
+                salida.escribir(id, contenido)
+                total += 1
+                renderizadas += 1
+
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pendientes = set()
+            for trozo in _trozos(list(ids), tamano):
+                faltan = []
+                for datos in datos_facturas(trozo).values():
+                    ruta = cache.obtener(clave_factura(datos))
+                    if ruta:
+                        with open(ruta, "rb") as archivo:
+                            salida.escribir(datos["PK_bill"], archivo.read())
+                        total += 1
+                    else:
+                        faltan.append(datos)
+                if faltan:
+                    pendientes.add(pool.submit(_render_lote, faltan))
+                # Se limita el trabajo en vuelo para no acumular PDFs en memoria
+                if len(pendientes) >= workers * 2:
+                    hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    recoger(hechos)
+            recoger(pendientes)
+    finally:
+        salida.cerrar()
+        cache.recortar()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "bills": total,
+        "rendered": renderizadas,
+        "cached": total - renderizadas,
+        "workers": workers,
+        "seconds": round(segundos, 3),
+        "bills_per_second": round(total / segundos, 1) if segundos else 0.0,
+    }
+
+
+@click.command("pdf-batch")
+@click.option("--desde", type=click.DateTime(formats=["%Y-%m-%d"]), help="Fecha inicial (createdAt).")
+@click.option("--hasta", type=click.DateTime(formats=["%Y-%m-%d"]), help="Fecha final (createdAt).")
+@click.option("--ids", default="", help="Lista de ids separados por comas.")
+@click.option("--workers", type=int, default=None, help="Procesos del pool (por defecto, uno por CPU).")
+@click.option("--output", "destino", default="facturas.zip", show_default=True,
+              help="Archivo .zip o directorio de salida.")
+@with_appcontext
+def comando_pdf_batch(desde, hasta, ids, workers, destino):
+    """Genera en lote los PDFs de las facturas indicadas."""
+    lista = [int(id) for id in ids.split(",") if id.strip()]
+    seleccion = ids_facturas(desde and desde.date(), hasta and hasta.date(), lista)
+    stats = generar_lote(seleccion, destino, workers=workers)
+    click.echo(
+        f"{stats['bills']} facturas ({stats['rendered']} generadas, {stats['cached']} en caché) "
+        f"en {stats['seconds']} s con {stats['workers']} procesos: "
+        f"{stats['bills_per_second']} facturas/s -> {destino}"
+    )
+
+
+def init_app(app):
+    app.config.setdefault("PDF_CACHE_DIR", os.path.join(app.instance_path, "pdf_cache"))
+    app.config.setdefault("PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+    app.extensions["pdf_cache"] = CachePDF(
+        app.config["PDF_CACHE_DIR"], app.config["PDF_CACHE_MAX_BYTES"]
+    )
+    app.config.setdefault("PDF_BATCH_WORKERS", None)
+    app.config.setdefault("PDF_BATCH_CHUNK", 100)
+    app.config.setdefault("PDF_BATCH_MAX_BILLS", 5000)
+    app.cli.add_command(comando_pdf_batch)
@@ -0,0 +1,372 @@
+# Cola de trabajos en segundo plano (exportaciones, PDFs, importaciones) en la base de datos
+import json
+import os
+import shutil
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import ScriptInfo, with_appcontext
+from sqlalchemy import and_, delete, func, or_, select, true, update
+from sqlalchemy.orm import aliased
+from werkzeug.exceptions import HTTPException
+from models import db, Job
+from migrations import migracion
+
+PENDIENTE, EN_CURSO, TERMINADO, FALLIDO = "pendiente", "en_curso", "terminado", "fallido"
+
+
+class ErrorPermanente(Exception):
+    """Fallo que no se arregla reintentando (datos inválidos, factura inexistente...)."""
+
+
+############# Tareas #############
+
+def _exportar(job, params, directorio):
+    from export import EXPORTACIONES, FORMATOS, consulta_exportacion, generar_filas
+    entidad, formato = params.get("entidad"), params.get("formato", "csv")
+    if entidad not in EXPORTACIONES or formato not in FORMATOS:
+        raise ErrorPermanente(f"Exportación no válida: {entidad}.{formato}")
+    ruta = os.path.join(directorio, f"{job.PK_job}.{formato}")
+    # Los filtros (desde, hasta, state, FK) se leen de la URL como en /export
+    with current_app.test_request_context(query_string=params.get("filtros") or {}):
+        with open(ruta, "w", encoding="utf-8", newline="") as archivo:
+            for trozo in generar_filas(consulta_exportacion(entidad), formato):
+                archivo.write(trozo)
+    return ruta, f"{entidad}.{formato}", FORMATOS[formato], None
+
+
+def _pdf_factura(job, params, directorio):
+    from invoices import pdf_factura
+    ruta = os.path.join(directorio, f"{job.PK_job}.pdf")
+    shutil.copyfile(pdf_factura(int(params["id"])), ruta)
+    return ruta, f"factura_{params['id']}.pdf", "application/pdf", None
+
+
+def _pdf_lote(job, params, directorio):
+    from bulk_edit import leer_ids
+    from invoices import generar_lote, ids_facturas
+    from pagination import leer_fecha
+    # Los ids llegan como lista JSON o como texto "12,13" (formulario)
+    seleccion = ids_facturas(leer_fecha(params.get("desde")), leer_fecha(params.get("hasta")),
+                             leer_ids(params.get("ids")))
+    if not seleccion:
+        raise ErrorPermanente("No hay facturas que generar")
+    if len(seleccion) > current_app.config["PDF_BATCH_MAX_BILLS"]:
+        raise ErrorPermanente(f"Más de {current_app.config['PDF_BATCH_MAX_BILLS']} facturas en el lote")
+    ruta = os.path.join(directorio, f"{job.PK_job}.zip")
+    stats = generar_lote(seleccion, ruta, workers=current_app.config["JOBS_PDF_WORKERS"])
+    return ruta, "facturas.zip", "application/zip", stats
+
+
+def _importar(job, params, directorio):
+    from bulk_import import IMPORTACIONES, importar_csv
+    entidad = params.get("entidad")
+    if entidad not in IMPORTACIONES:
+        raise ErrorPermanente(f"Importación no válida: {entidad}")
+    with open(params["archivo"], encoding="utf-8-sig") as archivo:
+        informe = importar_csv(archivo, entidad)
+    os.remove(params["archivo"])
+    return None, None, None, informe.como_dict()
+
+
+# Tipo de trabajo -> (función, roles que pueden encolarlo)
+TAREAS = {
+    "export": (_exportar, ("Administrador", "Gerente")),
+    "bill_pdf": (_pdf_factura, ("Administrador", "Gerente")),
+    "pdf_batch": (_pdf_lote, ("Administrador", "Gerente")),
+    "import_csv": (_importar, ("Administrador", "Gerente")),
+}
+
+
+############# Encolar y consultar #############
+
+def directorio_trabajos():
+    directorio = current_app.config["JOBS_DIR"] or os.path.join(current_app.instance_path, "jobs")
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def pendientes_de(FK_user):
+    return db.session.execute(
+        select(func.count()).where(Job.FK_user == FK_user, Job.state.in_((PENDIENTE, EN_CURSO)))
+    ).scalar()
+
+
+def encolar(kind, params, FK_user=None, max_intentos=None):
+    """Guarda un trabajo pendiente y devuelve su id. Hace commit."""
+    if kind not in TAREAS:
+        raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+    job = Job(
+        kind=kind,
+        params=json.dumps(params or {}),
+        state=PENDIENTE,
+        FK_user=FK_user,
+        attempts=0,
+        maxAttempts=max_intentos or current_app.config["JOBS_MAX_ATTEMPTS"],
+        runAfter=datetime.now(),
+        createdAt=datetime.now(),
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.PK_job
+
+
+def como_dict(job):
+    return {
+        "PK_job": job.PK_job,
+        "kind": job.kind,
+        "state": job.state,
+        "attempts": job.attempts,
+        "maxAttempts": job.maxAttempts,
+        "createdAt": job.createdAt.isoformat() if job.createdAt else None,
+        "startedAt": job.startedAt.isoformat() if job.startedAt else None,
+        "finishedAt": job.finishedAt.isoformat() if job.finishedAt else None,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "download": bool(job.state == TERMINADO and job.resultPath),
+    }
+
+
+############# Ejecución #############
+
+def _limites_llenos(ahora):
+    """Tipos de trabajo que ya tienen tantos en curso como permite JOBS_CONCURRENCY.
+
+    Solo sirve para no elegir candidatos que no se podrán tomar: el límite lo
+    garantiza la condición del UPDATE de `reclamar`.
+    """
+    limites = current_app.config["JOBS_CONCURRENCY"]
+    en_curso = db.session.execute(
+        select(Job.kind, func.count())
+        .where(Job.state == EN_CURSO, Job.lockedUntil > ahora)
+        .group_by(Job.kind)
+    ).all()
+    return [kind for kind, cuantos in en_curso if cuantos >= limites.get(kind, float("inf"))]
+
+
+def _hay_hueco(kind, ahora):
+    """Condición "quedan menos en curso de `kind` que su límite", para el UPDATE que lo reclama."""
+    limite = current_app.config["JOBS_CONCURRENCY"].get(kind)
+    if limite is None:
+        return true()
+    otro = aliased(Job)
+    en_curso = select(func.count()).select_from(otro).where(
+        otro.kind == kind, otro.state == EN_CURSO, otro.lockedUntil > ahora
+    ).scalar_subquery()
+    return en_curso < limite
+
+
+def reclamar(trabajador):
+    """Toma el siguiente trabajo disponible para `trabajador`, o None.
+
+    Disponibles son los pendientes cuyo runAfter ya pasó y los que estaban en
+    curso con la concesión (lockedUntil) vencida porque su trabajador murió.
+    El UPDATE condicional garantiza que dos trabajadores no toman el mismo, y
+    cuenta en la misma sentencia los que ya están en curso de ese tipo. En
+    PostgreSQL dos UPDATE simultáneos no ven la fila que el otro acaba de
+    tomar, así que antes se toma un bloqueo por tipo hasta el commit (SQLite
+    ya serializa las escrituras).
+    """
+    ahora = datetime.now()
+    disponible = and_(
+        or_(
+            and_(Job.state == PENDIENTE, Job.runAfter <= ahora),
+            and_(Job.state == EN_CURSO, Job.lockedUntil <= ahora),
+        ),
+        Job.attempts < Job.maxAttempts,
+    )
+    llenos = _limites_llenos(ahora)
+    candidatos = db.session.execute(
+        select(Job.PK_job, Job.kind).where(disponible, Job.kind.notin_(llenos)).order_by(Job.PK_job).limit(5)
+    ).all()
+    for id, kind in candidatos:
+        if kind in current_app.config["JOBS_CONCURRENCY"] and db.session.connection().dialect.name == "postgresql":
+            db.session.execute(select(func.pg_advisory_xact_lock(func.hashtext("jobs:" + kind))))
+        tomado = db.session.execute(
+            update(Job).where(Job.PK_job == id, disponible, _hay_hueco(kind, ahora)).values(
+                state=EN_CURSO,
+                worker=trabajador,
+                attempts=Job.attempts + 1,
+                startedAt=ahora,
+                lockedUntil=ahora + timedelta(seconds=current_app.config["JOBS_LEASE_SECONDS"]),
+            )
+        ).rowcount
+        db.session.commit()
+        if tomado:
+            return db.session.get(Job, id, populate_existing=True)
+    return None
+
+
+def _abandonados():
+    # En curso con la concesión vencida y sin intentos: el trabajador murió en el último
+    db.session.execute(
+        update(Job)
+        .where(Job.state == EN_CURSO, Job.lockedUntil <= datetime.now(), Job.attempts >= Job.maxAttempts)
+        .values(state=FALLIDO, finishedAt=datetime.now(), error="El trabajador se detuvo sin terminar")
+    )
+    db.session.commit()
+
+
+def _renovar_concesion(app, id, parar):
+    # Mientras el trabajo corre, se alarga su concesión para que nadie lo reclame
+    intervalo = app.config["JOBS_LEASE_SECONDS"] / 3
+    while not parar.wait(intervalo):
+        with app.app_context():
+            db.session.execute(update(Job).where(Job.PK_job == id, Job.state == EN_CURSO).values(
+                lockedUntil=datetime.now() + timedelta(seconds=app.config["JOBS_LEASE_SECONDS"])
+            ))
+            db.session.commit()
+
+
+def ejecutar(job):
+    """Ejecuta un trabajo ya reclamado y guarda su resultado o su error."""
+    app = current_app._get_current_object()
+    funcion, _ = TAREAS[job.kind]
+    parar = threading.Event()
+    latido = threading.Thread(target=_renovar_concesion, args=(app, job.PK_job, parar), daemon=True)
+    latido.start()
+    try:
+        ruta, nombre, mimetype, resultado = funcion(job, json.loads(job.params), directorio_trabajos())
+    except Exception as error:
+        db.session.rollback()
+        permanente = isinstance(error, (ErrorPermanente, ValueError, LookupError, HTTPException))
+        valores = {"error": f"{type(error).__name__}: {error}", "lockedUntil": None, "worker": None}
+        if permanente or job.attempts >= job.maxAttempts:
+            valores.update(state=FALLIDO, finishedAt=datetime.now())
+        else:
+            # Reintento con espera exponencial
+            espera = app.config["JOBS_RETRY_DELAY"] * 2 ** (job.attempts - 1)
+            valores.update(state=PENDIENTE, runAfter=datetime.now() + timedelta(seconds=espera))
+        app.logger.warning("Trabajo %s (%s) falló en el intento %s: %s",
+                           job.PK_job, job.kind, job.attempts, error)
+    else:
+        valores = {
+            "state": TERMINADO, "finishedAt": datetime.now(), "lockedUntil": None, "error": None,
+            "resultPath": ruta, "resultName": nombre, "mimetype": mimetype,
+            "result": json.dumps(resultado) if resultado is not None else None,
+        }
+    finally:
+        parar.set()
+        latido.join()
+    db.session.execute(update(Job).where(Job.PK_job == job.PK_job).values(**valores))
+    db.session.commit()
+    return valores["state"]
+
+
+def procesar(trabajador, espera=1.0, parar=None, hasta_vaciar=False):
+    """Bucle de un trabajador: reclama y ejecuta trabajos hasta que se le pida parar."""
+    hechos = 0
+    while parar is None or not parar.is_set():
+        _abandonados()
+        job = reclamar(trabajador)
+        if job is None:
+            if hasta_vaciar:
+                break
+            if parar is not None:
+                parar.wait(espera)
+            else:
+                time.sleep(espera)
+            continue
+        ejecutar(job)
+        hechos += 1
+        db.session.remove()
+    return hechos
+
+
+def purgar():
+    """Borra los trabajos terminados o fallidos más antiguos que JOBS_RESULT_TTL y sus archivos."""
+    limite = datetime.now() - timedelta(seconds=current_app.config["JOBS_RESULT_TTL"])
+    viejos = db.session.execute(
+        select(Job.PK_job, Job.resultPath, Job.params)
+        .where(Job.state.in_((TERMINADO, FALLIDO)), Job.finishedAt < limite)
+    ).all()
+    for _, ruta, params in viejos:
+        # El resultado y, si quedó, el CSV subido de una importación fallida
+        for archivo in (ruta, json.loads(params or "{}").get("archivo")):
+            if archivo:
+                try:
+                    os.remove(archivo)
+                except OSError:
+                    pass
+    if viejos:
+        db.session.execute(delete(Job).where(Job.PK_job.in_([id for id, _, _ in viejos])))
+        db.session.commit()
+    return len(viejos)
+
+
+def _proceso_trabajador(ruta_app, numero, espera, parar):
+    # Cada proceso carga su propia aplicación (--app / FLASK_APP) y su pool de conexiones
+    # Ctrl+C lo gestiona el proceso principal, que avisa con `parar`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    app = ScriptInfo(app_import_path=ruta_app).load_app()
+    with app.app_context():
+        procesar(f"{socket.gethostname()}:{os.getpid()}:{numero}", espera, parar)
+
+
+@migracion(4, "Tabla de trabajos en segundo plano")
+def _tabla_trabajos(conexion):
+    Job.__table__.create(conexion, checkfirst=True)
+
+
+@click.command("jobs-worker")
+@click.option("--processes", type=int, help="Procesos trabajadores (por defecto JOBS_WORKERS).")
+@click.option("--poll", default=1.0, show_default=True, help="Segundos entre consultas con la cola vacía.")
+@click.option("--once", is_flag=True, help="Procesa la cola en este proceso hasta vaciarla y termina.")
+@with_appcontext
+def comando_worker(processes, poll, once):
+    """Arranca los procesos que ejecutan los trabajos en segundo plano."""
+    if once:
+        hechos = procesar(f"{socket.gethostname()}:{os.getpid()}", poll, hasta_vaciar=True)
+        click.echo(f"{hechos} trabajos procesados")
+        return
+    import multiprocessing
+    procesos = processes or current_app.config["JOBS_WORKERS"]
+    ruta_app = click.get_current_context().find_object(ScriptInfo).app_import_path
+    parar = multiprocessing.Event()
+    # No son daemon: las tareas de PDF crean a su vez su propio pool de procesos
+    hijos = [
+        multiprocessing.Process(target=_proceso_trabajador, args=(ruta_app, n, poll, parar))
+        for n in range(procesos)
+    ]
+    for hijo in hijos:
+        hijo.start()
+    click.echo(f"{procesos} trabajadores en marcha (Ctrl+C para parar)")
+    ultima_purga = 0
+    try:
+        while any(hijo.is_alive() for hijo in hijos):
+            if time.monotonic() - ultima_purga > 3600:
+                purgar()
+                db.session.remove()
+                ultima_purga = time.monotonic()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        click.echo("Parando: se termina el trabajo en curso de cada proceso")
+    finally:
+        parar.set()
+        for hijo in hijos:
+            hijo.join()
+
+
+@click.command("jobs-purge")
+@with_appcontext
+def comando_purge():
+    """Borra los trabajos antiguos y sus archivos de resultado."""
+    click.echo(f"{purgar()} trabajos borrados")
+
+
+def init_app(app):
+    app.config.setdefault("JOBS_DIR", None)
+    app.config.setdefault("JOBS_WORKERS", 2)
+    app.config.setdefault("JOBS_CONCURRENCY", {"pdf_batch": 1, "import_csv": 1, "export": 2})
+    app.config.setdefault("JOBS_MAX_ATTEMPTS", 3)
+    app.config.setdefault("JOBS_RETRY_DELAY", 30)
+    app.config.setdefault("JOBS_LEASE_SECONDS", 300)
+    app.config.setdefault("JOBS_RESULT_TTL", 24 * 3600)
+    app.config.setdefault("JOBS_MAX_PENDING_PER_USER", 5)
+    app.config.setdefault("JOBS_PDF_WORKERS", 1)
+    app.cli.add_command(comando_worker)
+    app.cli.add_command(comando_purge)
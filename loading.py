@@ -0,0 +1,52 @@
+# Estrategias de carga de relaciones por vista y control de cargas perezosas (N+1)
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+ESTRATEGIAS = {
+    'joined': joinedload,
+    'selectin': selectinload,
+}
+
+
+def cargar(query, vista, *relaciones, por_defecto='joined'):
+    """Aplica a `relaciones` la estrategia de carga configurada para `vista`.
+
+    La estrategia se toma de EAGER_LOADING[vista] ('joined', 'selectin' o
+    'lazy'); si la vista no está configurada se usa `por_defecto`.
+    """
+    estrategia = current_app.config['EAGER_LOADING'].get(vista, por_defecto)
+    opcion = ESTRATEGIAS.get(estrategia)
+    if opcion is None:
+        return query
+    return query.options(*[opcion(relacion) for relacion in relaciones])
+
+
+def _contar_carga_perezosa(orm_execute_state):
+    # Solo las cargas perezosas tienen lazy_loaded_from; joined/selectin no
+    if not orm_execute_state.is_select or not has_request_context():
+        return
+    if orm_execute_state.lazy_loaded_from is None:
+        return
+    g.cargas_perezosas = g.get('cargas_perezosas', 0) + 1
+
+
+def _revisar_cargas_perezosas(response):
+    cargas = g.get('cargas_perezosas', 0)
+    if current_app.debug:
+        response.headers['X-Lazy-Loads'] = str(cargas)
+    limite = current_app.config['LAZY_LOAD_LIMIT']
+    if current_app.debug and cargas > limite:
+        current_app.logger.warning(
+            "%s emitió %d cargas perezosas (límite %d): posible N+1",
+            request.endpoint, cargas, limite,
+        )
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('EAGER_LOADING', {})
+    app.config.setdefault('LAZY_LOAD_LIMIT', 5)
+    if not event.contains(Session, 'do_orm_execute', _contar_carga_perezosa):
+        event.listen(Session, 'do_orm_execute', _contar_carga_perezosa)
+    app.after_request(_revisar_cargas_perezosas)
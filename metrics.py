@@ -0,0 +1,218 @@
+# Métricas por petición (SQL, plantillas y tiempo total) en formato de texto de Prometheus
+import threading
+import time
+from flask import before_render_template, current_app, g, has_request_context, request, \
+    request_finished, request_started, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from db_pool import estado_pools
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Sentencias más lentas que se guardan por petición para el log de peticiones lentas
+MAX_SQL_LENTO = 3
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(etiquetas, extra=None):
+    pares = list(etiquetas) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + "}"
+
+
+class Histograma:
+    """Histograma de Prometheus con una serie por combinación de etiquetas."""
+
+    def __init__(self, nombre, ayuda, buckets, etiquetas=("endpoint",)):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self.etiquetas = etiquetas
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {clave: (list(cuentas), suma, total) for clave, (cuentas, suma, total) in self._series.items()}
+        for valores, (cuentas, suma, total) in sorted(series.items()):
+            etiquetas = list(zip(self.etiquetas, valores))
+            for limite, cuenta in zip(self.buckets, cuentas):
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(etiquetas, ('le', limite))} {cuenta}")
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(etiquetas, ('le', '+Inf'))} {total}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(etiquetas)} {suma}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(etiquetas)} {total}")
+        return lineas
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *etiquetas):
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + 1
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            valores = dict(self._valores)
+        for clave, valor in sorted(valores.items()):
+            lineas.append(f"{self.nombre}{_etiquetas(zip(self.etiquetas, clave))} {valor}")
+        return lineas
+
+
+class Metricas:
+    """Métricas de un proceso. Con varios workers cada uno expone las suyas."""
+
+    def __init__(self):
+        self.duracion = Histograma(
+            "app_request_duration_seconds", "Tiempo total de la petición.", BUCKETS_SEGUNDOS)
+        self.tiempo_bd = Histograma(
+            "app_request_db_seconds", "Tiempo en la base de datos por petición.", BUCKETS_SEGUNDOS)
+        self.consultas = Histograma(
+            "app_request_queries", "Sentencias SQL por petición.", BUCKETS_CONSULTAS)
+        self.plantillas = Histograma(
+            "app_template_render_seconds", "Tiempo renderizando plantillas por petición.", BUCKETS_SEGUNDOS)
+        self.peticiones = Contador(
+            "app_requests_total", "Peticiones atendidas.", ("endpoint", "method", "status"))
+
+    def exponer(self):
+        lineas = []
+        for metrica in (self.peticiones, self.duracion, self.tiempo_bd, self.consultas, self.plantillas):
+            lineas.extend(metrica.exponer())
+        lineas.extend(_metricas_pool())
+        return "\n".join(lineas) + "\n"
+
+
+def _metricas_pool():
+    gauges = (
+        ("app_db_pool_checked_out", "gauge", "Conexiones en uso.", "en_uso"),
+        ("app_db_pool_overflow", "gauge", "Conexiones abiertas por encima de pool_size.", "desborde"),
+        ("app_db_pool_checkouts_total", "counter", "Conexiones pedidas al pool.", "pedidas"),
+        ("app_db_pool_overflow_events_total", "counter", "Conexiones creadas por desborde.", "desbordes"),
+        ("app_db_pool_timeouts_total", "counter", "Esperas de conexión que agotaron pool_timeout.", "agotado"),
+        ("app_db_pool_wait_seconds_total", "counter", "Tiempo total esperando conexión.", "espera_total_s"),
+    )
+    estado = estado_pools()
+    lineas = []
+    for nombre, tipo, ayuda, clave in gauges:
+        valores = [(bind, datos[clave]) for bind, datos in estado.items() if clave in datos]
+        if valores:
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            lineas += [f"{nombre}{_etiquetas([('bind', bind)])} {valor}" for bind, valor in valores]
+    return lineas
+
+
+def _datos_peticion():
+    if not has_request_context():
+        return None
+    return g.get("metricas")
+
+
+def _antes_de_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_sql", []).append(time.perf_counter())
+
+
+def _despues_de_sql(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("inicio_sql")
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    datos = _datos_peticion()
+    if datos is None:
+        return
+    datos["consultas"] += 1
+    datos["tiempo_bd"] += duracion
+    if current_app.config["SLOW_REQUEST_SECONDS"] is not None:
+        lentas = datos["sql_lento"]
+        lentas.append((duracion, statement))
+        lentas.sort(key=lambda par: par[0], reverse=True)
+        del lentas[MAX_SQL_LENTO:]
+
+
+def _error_sql(contexto):
+    inicios = contexto.connection.info.get("inicio_sql") if contexto.connection is not None else None
+    if inicios:
+        inicios.pop()
+
+
+def _inicio_peticion(sender, **extra):
+    g.metricas = {
+        "inicio": time.perf_counter(),
+        "consultas": 0,
+        "tiempo_bd": 0.0,
+        "plantillas": 0.0,
+        "sql_lento": [],
+    }
+
+
+def _antes_de_plantilla(sender, template, context, **extra):
+    datos = _datos_peticion()
+    if datos is not None:
+        datos.setdefault("inicio_plantilla", []).append(time.perf_counter())
+
+
+def _plantilla_renderizada(sender, template, context, **extra):
+    datos = _datos_peticion()
+    if datos and datos.get("inicio_plantilla"):
+        datos["plantillas"] += time.perf_counter() - datos["inicio_plantilla"].pop()
+
+
+def _fin_peticion(sender, response, **extra):
+    datos = _datos_peticion()
+    if datos is None:
+        return
+    duracion = time.perf_counter() - datos["inicio"]
+    endpoint = request.endpoint or "desconocido"
+    metricas = sender.extensions["metrics"]
+    metricas.peticiones.incrementar(endpoint, request.method, str(response.status_code))
+    metricas.duracion.observar(duracion, endpoint)
+    metricas.tiempo_bd.observar(datos["tiempo_bd"], endpoint)
+    metricas.consultas.observar(datos["consultas"], endpoint)
+    metricas.plantillas.observar(datos["plantillas"], endpoint)
+
+    limite = sender.config["SLOW_REQUEST_SECONDS"]
+    if limite is not None and duracion >= limite:
+        sentencias = "\n".join(f"  [{segundos * 1000:.1f} ms] {sql}" for segundos, sql in datos["sql_lento"])
+        sender.logger.warning(
+            "Petición lenta %s %s (%s): %.3f s, %d consultas, %.3f s en BD, %.3f s en plantillas\n%s",
+            request.method, request.path, endpoint, duracion, datos["consultas"],
+            datos["tiempo_bd"], datos["plantillas"], sentencias,
+        )
+
+
+def init_app(app):
+    app.config.setdefault("SLOW_REQUEST_SECONDS", None)
+    app.config.setdefault("METRICS_TOKEN", None)
+    app.extensions["metrics"] = Metricas()
+    for nombre, funcion in (
+        ("before_cursor_execute", _antes_de_sql),
+        ("after_cursor_execute", _despues_de_sql),
+        ("handle_error", _error_sql),
+    ):
+        if not event.contains(Engine, nombre, funcion):
+            event.listen(Engine, nombre, funcion)
+    request_started.connect(_inicio_peticion, app)
+    request_finished.connect(_fin_peticion, app)
+    before_render_template.connect(_antes_de_plantilla, app)
+    template_rendered.connect(_plantilla_renderizada, app)
@@ -0,0 +1,253 @@
+# Migraciones versionadas del esquema y comprobación de planes de consulta
+import json
+from datetime import date, datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, inspect, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from models import db, Bill, Detail, Product, SchemaVersion, StockMovement
+
+# (versión, descripción, función(conexion)) en orden de aplicación
+MIGRACIONES = []
+
+
+def migracion(version, descripcion):
+    def registrar(funcion):
+        MIGRACIONES.append((version, descripcion, funcion))
+        MIGRACIONES.sort(key=lambda m: m[0])
+        return funcion
+    return registrar
+
+
+def _crear_indices(conexion, *sentencias):
+    # IF NOT EXISTS: las bases creadas con init-db ya tienen los índices de los modelos
+    for sentencia in sentencias:
+        conexion.execute(text(sentencia))
+
+
+def anadir_columnas(conexion, tabla, columnas):
+    """ALTER TABLE ... ADD COLUMN de las columnas {nombre: definición SQL} que falten.
+
+    Las bases creadas con init-db ya tienen las columnas de los modelos.
+    """
+    existentes = {columna["name"] for columna in inspect(conexion).get_columns(tabla)}
+    for nombre, definicion in columnas.items():
+        if nombre not in existentes:
+            conexion.execute(text(f'ALTER TABLE "{tabla}" ADD COLUMN "{nombre}" {definicion}'))
+
+
+@migracion(1, "Índices de claves foráneas")
+def _indices_claves_foraneas(conexion):
+    _crear_indices(
+        conexion,
+        'CREATE INDEX IF NOT EXISTS "ix_tbDetails_FK_bill" ON "tbDetails" ("FK_bill")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbDetails_FK_producto" ON "tbDetails" ("FK_producto")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbBills_FK_client" ON "tbBills" ("FK_client")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbBills_FK_paymentMethod" ON "tbBills" ("FK_paymentMethod")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbProducts_FK_category" ON "tbProducts" ("FK_category")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbStockMovements_FK_product" ON "tbStockMovements" ("FK_product", "PK_movement")',
+    )
+
+
+@migracion(2, "Índices de createdAt para filtros de fecha y paginación, parciales sobre state = TRUE")
+def _indices_fechas(conexion):
+    _crear_indices(
+        conexion,
+        'CREATE INDEX IF NOT EXISTS "ix_tbClients_createdAt" ON "tbClients" ("createdAt", "PK_client")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbBills_createdAt" ON "tbBills" ("createdAt", "PK_bill")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbProducts_createdAt" ON "tbProducts" ("createdAt", "PK_product")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbDetails_createdAt" ON "tbDetails" ("createdAt", "PK_detail")',
+        'CREATE INDEX IF NOT EXISTS "ix_tbBills_createdAt_activas" ON "tbBills" ("createdAt", "PK_bill") '
+        'WHERE state = TRUE',
+        'CREATE INDEX IF NOT EXISTS "ix_tbDetails_createdAt_activos" ON "tbDetails" ("createdAt", "PK_detail") '
+        'WHERE state = TRUE',
+        'CREATE INDEX IF NOT EXISTS "ix_tbProducts_FK_category_activos" ON "tbProducts" ("FK_category") '
+        'WHERE state = TRUE',
+    )
+
+
+def version_actual(conexion):
+    SchemaVersion.__table__.create(conexion, checkfirst=True)
+    return conexion.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def pendientes(conexion):
+    actual = version_actual(conexion)
+    return [m for m in MIGRACIONES if m[0] > actual]
+
+
+def aplicar(hasta=None):
+    """Aplica en orden las migraciones pendientes, cada una en su propia transacción.
+
+    Devuelve las versiones aplicadas. Si una falla se deshace solo esa y las
+    anteriores quedan registradas.
+    """
+    aplicadas = []
+    with db.engine.connect() as conexion:
+        por_aplicar = pendientes(conexion)
+        conexion.commit()
+        for version, descripcion, funcion in por_aplicar:
+            if hasta is not None and version > hasta:
+                break
+            with conexion.begin():
+                funcion(conexion)
+                conexion.execute(insert(SchemaVersion.__table__).values(
+                    version=version, description=descripcion, appliedAt=datetime.now()
+                ))
+            aplicadas.append(version)
+    return aplicadas
+
+
+############# EXPLAIN de las consultas clave #############
+
+class Explicar(Executable, ClauseElement):
+    """EXPLAIN de una sentencia, con los parámetros enlazados como en la consulta real."""
+    inherit_cache = False
+
+    def __init__(self, stmt):
+        self.stmt = stmt
+
+
+@compiles(Explicar)
+def _compilar_explicar(elemento, compiler, **kw):
+    if compiler.dialect.name == "postgresql":
+        return "EXPLAIN (FORMAT JSON) " + compiler.process(elemento.stmt, **kw)
+    return "EXPLAIN QUERY PLAN " + compiler.process(elemento.stmt, **kw)
+
+
+def _valores(conexion):
+    maximo = lambda columna: conexion.execute(select(func.max(columna))).scalar() or 1
+    return {
+        "factura": maximo(Detail.FK_bill),
+        "producto": maximo(Detail.FK_producto),
+        "cliente": maximo(Bill.FK_client),
+        "categoria": maximo(Product.FK_category),
+        "detalle": maximo(Detail.PK_detail),
+        "desde": date.today() - timedelta(days=30),
+    }
+
+
+# Consultas que hace la aplicación y que deben resolverse con índices
+CONSULTAS_CLAVE = {
+    "detalles_de_factura": lambda v: select(Detail).where(Detail.FK_bill == v["factura"]),
+    "detalles_de_producto": lambda v: select(Detail).where(Detail.FK_producto == v["producto"]),
+    "facturas_de_cliente": lambda v: select(Bill).where(Bill.FK_client == v["cliente"]),
+    "productos_activos_de_categoria": lambda v: select(Product).where(
+        Product.FK_category == v["categoria"], Product.state == True),
+    "facturas_por_fecha": lambda v: select(Bill).where(Bill.createdAt >= v["desde"])
+        .order_by(Bill.createdAt.desc(), Bill.PK_bill.desc()).limit(50),
+    "facturas_activas_por_fecha": lambda v: select(Bill).where(Bill.createdAt >= v["desde"], Bill.state == True)
+        .order_by(Bill.createdAt.desc(), Bill.PK_bill.desc()).limit(50),
+    "detalles_por_fecha": lambda v: select(Detail).where(Detail.createdAt >= v["desde"])
+        .order_by(Detail.createdAt.desc(), Detail.PK_detail.desc()).limit(50),
+    "pagina_de_detalles": lambda v: select(Detail).where(Detail.PK_detail < v["detalle"])
+        .order_by(Detail.PK_detail.desc()).limit(50),
+    "facturas_por_total": lambda v: select(Bill).order_by(Bill.total.desc(), Bill.PK_bill.desc()).limit(50),
+    "movimientos_de_producto": lambda v: select(StockMovement).where(StockMovement.FK_product == v["producto"])
+        .order_by(StockMovement.PK_movement.desc()).limit(50),
+}
+
+
+def _recorridos_pg(plan):
+    """Tablas recorridas con Seq Scan en un plan JSON de PostgreSQL."""
+    tablas = []
+    if plan.get("Node Type") == "Seq Scan":
+        tablas.append(plan["Relation Name"])
+    for hijo in plan.get("Plans", []):
+        tablas.extend(_recorridos_pg(hijo))
+    return tablas
+
+
+def _recorridos_sqlite(filas):
+    # "SCAN tabla" sin "USING ... INDEX" es un recorrido completo
+    tablas = []
+    for fila in filas:
+        detalle = fila[-1]
+        if detalle.startswith("SCAN ") and "USING" not in detalle:
+            tablas.append(detalle.split()[1])
+    return tablas
+
+
+def _filas_tabla(conexion, tabla):
+    if conexion.dialect.name == "postgresql":
+        # Estimación del planificador (requiere ANALYZE); evita un COUNT(*) sobre tablas grandes
+        return conexion.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:tabla)"), {"tabla": f'"{tabla}"'}
+        ).scalar() or 0
+    return conexion.execute(text(f'SELECT COUNT(*) FROM "{tabla}"')).scalar()
+
+
+def explicar(min_filas):
+    """Ejecuta EXPLAIN sobre CONSULTAS_CLAVE.
+
+    Devuelve [(nombre, plan en texto, tablas grandes recorridas enteras)].
+    """
+    resultados = []
+    with db.engine.connect() as conexion:
+        valores = _valores(conexion)
+        for nombre, construir in CONSULTAS_CLAVE.items():
+            filas = conexion.execute(Explicar(construir(valores))).all()
+            if conexion.dialect.name == "postgresql":
+                plan = filas[0][0]
+                plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+                recorridas = _recorridos_pg(plan)
+                texto = json.dumps(plan, indent=1)
+            else:
+                recorridas = _recorridos_sqlite(filas)
+                texto = "\n".join(fila[-1] for fila in filas)
+            grandes = [t for t in dict.fromkeys(recorridas) if _filas_tabla(conexion, t) >= min_filas]
+            resultados.append((nombre, texto, grandes))
+    return resultados
+
+
+@click.command("db-upgrade")
+@click.option("--to", "hasta", type=int, help="Última versión a aplicar.")
+@with_appcontext
+def comando_upgrade(hasta):
+    """Aplica las migraciones pendientes."""
+    aplicadas = aplicar(hasta)
+    if aplicadas:
+        click.echo("Migraciones aplicadas: " + ", ".join(str(v) for v in aplicadas))
+    else:
+        click.echo("El esquema ya está al día")
+
+
+@click.command("db-status")
+@with_appcontext
+def comando_status():
+    """Muestra la versión del esquema y las migraciones pendientes."""
+    with db.engine.connect() as conexion:
+        actual = version_actual(conexion)
+        conexion.commit()
+    click.echo(f"Versión actual: {actual}")
+    for version, descripcion, _ in MIGRACIONES:
+        click.echo(f"  {'✓' if version <= actual else ' '} {version:03d} {descripcion}")
+
+
+@click.command("explain-queries")
+@click.option("--min-rows", type=int, help="Filas a partir de las que una tabla se considera grande.")
+@click.option("--verbose", is_flag=True, help="Muestra el plan de cada consulta.")
+@with_appcontext
+def comando_explain(min_rows, verbose):
+    """Ejecuta EXPLAIN sobre las consultas clave y falla si alguna recorre entera una tabla grande."""
+    min_filas = min_rows if min_rows is not None else current_app.config["EXPLAIN_MIN_ROWS"]
+    fallos = 0
+    for nombre, plan, grandes in explicar(min_filas):
+        if grandes:
+            fallos += 1
+            click.echo(f"✗ {nombre}: recorrido secuencial de {', '.join(grandes)}")
+        else:
+            click.echo(f"✓ {nombre}")
+        if verbose or grandes:
+            click.echo("    " + plan.replace("\n", "\n    "))
+    if fallos:
+        raise click.ClickException(f"{fallos} consultas recorren tablas de más de {min_filas} filas")
+
+
+def init_app(app):
+    app.config.setdefault("EXPLAIN_MIN_ROWS", 10000)
+    app.cli.add_command(comando_upgrade)
+    app.cli.add_command(comando_status)
+    app.cli.add_command(comando_explain)
@@ -4,4 +4,4 @@ db = SQLAlchemy()
 
 
 
-from .models import db, Client, Product, Category, Detail, Bill,PaymentMethod,User
+from .models import db, Client, Product, Category, Detail, Bill,PaymentMethod,User,SalesSummary,StockMovement,SchemaVersion,Job,Change
@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from replicas import SesionEnrutada
 
-db = SQLAlchemy()
+# La sesión manda las lecturas de los GET a las réplicas (ver replicas.py)
+db = SQLAlchemy(session_options={"class_": SesionEnrutada})
 
 # Modelo para roles
 class Role(db.Model):
@@ -30,6 +32,9 @@ class User(db.Model):
 # Modelo para clientes
 class Client(db.Model):
     __tablename__ = "tbClients"
+    __table_args__ = (
+        db.Index("ix_tbClients_createdAt", "createdAt", "PK_client"),
+    )
     PK_client = db.Column(db.Integer, primary_key=True)
     firstName = db.Column(db.String(15), nullable=False)
     lastName = db.Column(db.String(15), nullable=False)
@@ -58,6 +63,14 @@ class PaymentMethod(db.Model):
 # Modelo para facturas
 class Bill(db.Model):
     __tablename__ = "tbBills"
+    __table_args__ = (
+        db.Index("ix_tbBills_FK_client", "FK_client"),
+        db.Index("ix_tbBills_FK_paymentMethod", "FK_paymentMethod"),
+        db.Index("ix_tbBills_createdAt", "createdAt", "PK_bill"),
+        db.Index("ix_tbBills_createdAt_activas", "createdAt", "PK_bill",
+                 postgresql_where=db.text("state = TRUE"), sqlite_where=db.text("state = TRUE")),
+        db.Index("ix_tbBills_total", "total", "PK_bill"),
+    )
     PK_bill = db.Column(db.Integer, primary_key=True)
     FK_client = db.Column(db.Integer, db.ForeignKey("tbClients.PK_client"), nullable=False)
     FK_paymentMethod = db.Column(db.Integer, db.ForeignKey("tbPaymentMethods.PK_paymentMethod"), nullable=False)
@@ -65,6 +78,10 @@ class Bill(db.Model):
     createdAt = db.Column(db.Date, nullable=False)
     updatedAt = db.Column(db.Date)
     state = db.Column(db.Boolean, default=True)
+    # Totales guardados: los mantiene bill_totals.py al escribir detalles (sin impuestos, total = subtotal)
+    subtotal = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    lineCount = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     details = db.relationship('Detail', backref='bill', lazy=True)  # Relación con Detail
 
 
@@ -83,6 +100,12 @@ class Category(db.Model):
 # Modelo para productos
 class Product(db.Model):
     __tablename__ = "tbProducts"
+    __table_args__ = (
+        db.Index("ix_tbProducts_FK_category", "FK_category"),
+        db.Index("ix_tbProducts_createdAt", "createdAt", "PK_product"),
+        db.Index("ix_tbProducts_FK_category_activos", "FK_category",
+                 postgresql_where=db.text("state = TRUE"), sqlite_where=db.text("state = TRUE")),
+    )
     PK_product = db.Column(db.Integer, primary_key=True)
     FK_category = db.Column(db.Integer, db.ForeignKey("tbCategories.PK_category"), nullable=False)
     name = db.Column(db.String(30), nullable=False)
@@ -97,9 +120,105 @@ class Product(db.Model):
 # Modelo para detalles
 class Detail(db.Model):
     __tablename__ = "tbDetails"
+    __table_args__ = (
+        db.Index("ix_tbDetails_FK_bill", "FK_bill"),
+        db.Index("ix_tbDetails_FK_producto", "FK_producto"),
+        db.Index("ix_tbDetails_createdAt", "createdAt", "PK_detail"),
+        db.Index("ix_tbDetails_createdAt_activos", "createdAt", "PK_detail",
+                 postgresql_where=db.text("state = TRUE"), sqlite_where=db.text("state = TRUE")),
+    )
     PK_detail = db.Column(db.Integer, primary_key=True)
     FK_bill = db.Column(db.Integer, db.ForeignKey("tbBills.PK_bill"), nullable=False)
     FK_producto = db.Column(db.Integer, db.ForeignKey("tbProducts.PK_product"), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Precio del producto en el momento de la venta (lo copia bill_totals.py si no se indica)
+    unitPrice = db.Column(db.Integer)
     createdAt = db.Column(db.Date, nullable=False)
     updatedAt = db.Column(db.Date)
     state = db.Column(db.Boolean, default=True)
+
+    @property
+    def total(self):
+        return (self.quantity or 0) * (self.unitPrice or 0)
+
+
+# Resumen de ventas por día × producto × método de pago (ver sales_summary.py).
+# Es un dato derivado: sin claves foráneas para no bloquear borrados.
+class SalesSummary(db.Model):
+    __tablename__ = "tbSalesSummary"
+    day = db.Column(db.Date, primary_key=True)
+    FK_product = db.Column(db.Integer, primary_key=True)
+    FK_paymentMethod = db.Column(db.Integer, primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+
+# Movimientos de stock de productos (ver inventory.py). Las cantidades son
+# negativas para salidas y positivas para entradas.
+class StockMovement(db.Model):
+    __tablename__ = "tbStockMovements"
+    __table_args__ = (
+        db.Index("ix_tbStockMovements_FK_product", "FK_product", "PK_movement"),
+    )
+    PK_movement = db.Column(db.Integer, primary_key=True)
+    FK_product = db.Column(db.Integer, nullable=False)
+    FK_bill = db.Column(db.Integer)
+    quantity = db.Column(db.Integer, nullable=False)
+    stockAfter = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)
+    createdAt = db.Column(db.DateTime, nullable=False)
+
+
+# Versiones del esquema aplicadas (ver migrations.py)
+class SchemaVersion(db.Model):
+    __tablename__ = "tbSchemaVersion"
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(100), nullable=False)
+    appliedAt = db.Column(db.DateTime, nullable=False)
+
+
+# Trabajos en segundo plano (ver jobs.py). params y result son JSON en texto.
+class Job(db.Model):
+    __tablename__ = "tbJobs"
+    __table_args__ = (
+        db.Index("ix_tbJobs_state", "state", "runAfter", "PK_job"),
+        db.Index("ix_tbJobs_FK_user", "FK_user", "PK_job"),
+    )
+    PK_job = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    params = db.Column(db.Text, nullable=False, default="{}")
+    state = db.Column(db.String(12), nullable=False, default="pendiente")
+    FK_user = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    maxAttempts = db.Column(db.Integer, nullable=False, default=3)
+    runAfter = db.Column(db.DateTime, nullable=False)
+    lockedUntil = db.Column(db.DateTime)
+    worker = db.Column(db.String(60))
+    resultPath = db.Column(db.String(255))
+    resultName = db.Column(db.String(100))
+    mimetype = db.Column(db.String(60))
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    createdAt = db.Column(db.DateTime, nullable=False)
+    startedAt = db.Column(db.DateTime)
+    finishedAt = db.Column(db.DateTime)
+
+
+# Registro de cambios de los catálogos para la sincronización incremental
+# (ver changes.py). PK_change es la secuencia; deleted marca los borrados.
+class Change(db.Model):
+    __tablename__ = "tbChanges"
+    __table_args__ = (
+        db.Index("ix_tbChanges_entity", "entity", "PK_change"),
+        db.Index("ix_tbChanges_row", "entity", "FK_row", "PK_change"),
+        db.Index("ix_tbChanges_seq", "entity", "seq"),
+        db.Index("ix_tbChanges_sin_seq", "PK_change",
+                 postgresql_where=db.text("seq IS NULL"), sqlite_where=db.text("seq IS NULL")),
+    )
+    PK_change = db.Column(db.Integer, primary_key=True)
+    # Orden de lectura: se asigna después del commit (ver changes.numerar)
+    seq = db.Column(db.BigInteger)
+    entity = db.Column(db.String(20), nullable=False)
+    FK_row = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    createdAt = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,189 @@
+# Paginación por clave (keyset) y filtros comunes para las rutas index_*
+from datetime import date
+from flask import request, url_for
+from sqlalchemy import Select, and_, or_
+from models import db
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
+
+class Pagina:
+    """Resultado de una consulta paginada: filas y cursores de navegación."""
+
+    def __init__(self, items, limite, orden, direccion, siguiente=None, anterior=None):
+        self.items = items
+        self.limite = limite
+        self.orden = orden
+        self.direccion = direccion
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def _url(self, **cursor):
+        # Conserva los filtros actuales y reemplaza solo el cursor
+        args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+        args.update(cursor)
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    def url_siguiente(self):
+        return self._url(after=self.siguiente) if self.siguiente else None
+
+    def url_anterior(self):
+        return self._url(before=self.anterior) if self.anterior else None
+
+
+def leer_fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def leer_entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def aplicar_filtros(query, modelo, filtros=None):
+    """Filtra por rango de createdAt (desde/hasta), state y las FK de `filtros`.
+
+    `filtros` es un diccionario {parámetro de la URL: columna}.
+    """
+    args = request.args
+    desde = leer_fecha(args.get('desde'))
+    hasta = leer_fecha(args.get('hasta'))
+    if desde:
+        query = query.filter(modelo.createdAt >= desde)
+    if hasta:
+        query = query.filter(modelo.createdAt <= hasta)
+
+    estado = args.get('state')
+    if estado in ('1', 'true'):
+        query = query.filter(modelo.state.is_(True))
+    elif estado in ('0', 'false'):
+        query = query.filter(modelo.state.is_(False))
+
+    for nombre, columna in (filtros or {}).items():
+        valor = leer_entero(args.get(nombre))
+        if valor is not None:
+            query = query.filter(columna == valor)
+    return query
+
+
+def _condicion_seek(columnas, valores, mayor):
+    # (a, b) > (x, y)  ==>  a > x OR (a = x AND b > y)
+    condicion = None
+    for columna, valor in reversed(list(zip(columnas, valores))):
+        comparacion = columna > valor if mayor else columna < valor
+        if condicion is None:
+            condicion = comparacion
+        else:
+            condicion = or_(comparacion, and_(columna == valor, condicion))
+    return condicion
+
+
+def _codificar_cursor(fila, orden, pk):
+    id_fila = getattr(fila, pk.key)
+    if orden == 'id':
+        return str(id_fila)
+    valor = getattr(fila, orden)
+    return f"{valor.isoformat() if isinstance(valor, date) else valor}_{id_fila}"
+
+
+def _leer_valor(valor, columna):
+    tipo = columna.type.python_type
+    if tipo is date:
+        return leer_fecha(valor)
+    try:
+        return tipo(valor)
+    except (TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def _decodificar_cursor(cursor, orden, columna=None):
+    if not cursor:
+        return None
+    if orden != 'id':
+        valor, _, id_fila = cursor.rpartition('_')
+        valor, id_fila = _leer_valor(valor, columna), leer_entero(id_fila)
+        return (valor, id_fila) if valor is not None and id_fila is not None else None
+    id_fila = leer_entero(cursor)
+    return (id_fila,) if id_fila is not None else None
+
+
+def _preparar(query, modelo, pk, filtros, ordenes=None):
+    """Filtros, cursor, orden y LIMIT de la página pedida en la URL."""
+    query = aplicar_filtros(query, modelo, filtros)
+    args = request.args
+
+    limite = leer_entero(args.get('limit')) or LIMITE_POR_DEFECTO
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+    ordenes = {'createdAt': modelo.createdAt, **(ordenes or {})}
+    orden = args.get('sort') if args.get('sort') in ordenes else 'id'
+    direccion = 'desc' if args.get('dir') == 'desc' else 'asc'
+    ascendente = direccion == 'asc'
+    columna = ordenes.get(orden)
+    columnas = [columna, pk] if columna is not None else [pk]
+
+    despues = _decodificar_cursor(args.get('after'), orden, columna)
+    antes = None if despues else _decodificar_cursor(args.get('before'), orden, columna)
+    hacia_atras = antes is not None
+
+    if despues:
+        query = query.filter(_condicion_seek(columnas, despues, mayor=ascendente))
+    elif antes:
+        query = query.filter(_condicion_seek(columnas, antes, mayor=not ascendente))
+
+    # Hacia atrás se recorre en orden inverso y luego se da la vuelta
+    if ascendente != hacia_atras:
+        query = query.order_by(*[c.asc() for c in columnas])
+    else:
+        query = query.order_by(*[c.desc() for c in columnas])
+
+    return query.limit(limite + 1), limite, orden, direccion, despues, hacia_atras
+
+
+def consulta_pagina(query, modelo, pk, filtros=None, ordenes=None):
+    """La consulta (sin ejecutar) de la página pedida, con una fila de más.
+
+    Sirve también para sentencias Core (select(...)), por ejemplo para
+    calcular validadores de caché sin cargar ni renderizar la página.
+    """
+    return _preparar(query, modelo, pk, filtros, ordenes)[0]
+
+
+def paginar(query, modelo, pk, filtros=None, ordenes=None):
+    """Aplica filtros y devuelve una `Pagina` usando paginación por clave.
+
+    Se ordena por la clave primaria (?sort=id), por (createdAt, pk)
+    (?sort=createdAt) o por (columna, pk) para las columnas de `ordenes`
+    ({parámetro de la URL: columna}, p. ej. ?sort=total), y se navega con
+    los cursores ?after= / ?before=. Cada página es una única consulta con
+    LIMIT y sin OFFSET ni COUNT, por lo que su coste no depende del tamaño
+    de la tabla. `query` puede ser una consulta del ORM o un select(...) de
+    Core, cuyas filas se devuelven como tuplas.
+    """
+    query, limite, orden, direccion, despues, hacia_atras = _preparar(query, modelo, pk, filtros, ordenes)
+    filas = db.session.execute(query).all() if isinstance(query, Select) else query.all()
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    if hacia_atras:
+        filas.reverse()
+
+    siguiente = anterior = None
+    if filas:
+        primero = _codificar_cursor(filas[0], orden, pk)
+        ultimo = _codificar_cursor(filas[-1], orden, pk)
+        if hacia_atras:
+            anterior = primero if hay_mas else None
+            siguiente = ultimo
+        else:
+            siguiente = ultimo if hay_mas else None
+            anterior = primero if despues else None
+
+    return Pagina(filas, limite, orden, direccion, siguiente=siguiente, anterior=anterior)
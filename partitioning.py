@@ -0,0 +1,299 @@
+# Particionado mensual por createdAt de tbBills y tbDetails (solo PostgreSQL) y archivo de meses antiguos
+#
+# Con las tablas particionadas, las consultas que filtran por createdAt
+# (?desde=/?hasta= de los listados y exportaciones, PDFs por rango, resumen de
+# ventas) solo leen los meses del rango. La clave primaria pasa a ser
+# (id, createdAt), así que la clave foránea de tbDetails a tbBills desaparece
+# (la integridad la mantiene la aplicación) y una búsqueda solo por id
+# consulta el índice de cada partición.
+import gzip
+import os
+import re
+from datetime import date
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from sqlalchemy.schema import AddConstraint
+from models import db, Bill, Detail
+
+# En este orden: tbDetails deja de apuntar a tbBills cuando esta se convierte
+TABLAS = (Bill.__table__, Detail.__table__)
+COLUMNA = "createdAt"
+
+
+def _mes(fecha):
+    return date(fecha.year, fecha.month, 1)
+
+
+def _sumar_meses(mes, n):
+    indice = mes.year * 12 + mes.month - 1 + n
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _nombre(tabla, mes):
+    return f"{tabla}_p{mes.year}_{mes.month:02d}"
+
+
+def _q(conexion, nombre):
+    return conexion.dialect.identifier_preparer.quote(nombre)
+
+
+def _existe(conexion, nombre):
+    return conexion.execute(text("SELECT to_regclass(:nombre)"), {"nombre": f'"{nombre}"'}).scalar() is not None
+
+
+def _comprobar_postgresql(conexion):
+    if conexion.dialect.name != "postgresql":
+        raise click.ClickException("El particionado solo está disponible en PostgreSQL")
+
+
+def esta_particionada(conexion, tabla):
+    return bool(conexion.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla)"
+    ), {"tabla": f'"{tabla}"'}).scalar())
+
+
+def particiones(conexion, tabla):
+    """Meses con partición de `tabla`, ordenados: [(nombre, primer día del mes)]."""
+    nombres = conexion.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:tabla)"
+    ), {"tabla": f'"{tabla}"'}).scalars()
+    meses = []
+    for nombre in nombres:
+        encontrado = re.fullmatch(re.escape(tabla) + r"_p(\d{4})_(\d{2})", nombre)
+        if encontrado:
+            meses.append((nombre, date(int(encontrado[1]), int(encontrado[2]), 1)))
+    return sorted(meses, key=lambda particion: particion[1])
+
+
+def crear_particion(conexion, tabla, mes):
+    """Crea la partición del mes si no existe y devuelve si la ha creado.
+
+    Las filas de ese mes que hubieran caído en la partición por defecto
+    (p. ej. porque no se ejecutó partitions-maintain a tiempo) se mueven a la
+    nueva antes de enlazarla.
+    """
+    nombre = _nombre(tabla, mes)
+    if _existe(conexion, nombre):
+        return False
+    q = lambda n: _q(conexion, n)
+    desde, hasta = mes.isoformat(), _sumar_meses(mes, 1).isoformat()
+    conexion.execute(text(f"CREATE TABLE {q(nombre)} (LIKE {q(tabla)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    por_defecto = f"{tabla}_default"
+    if _existe(conexion, por_defecto):
+        conexion.execute(text(
+            f"WITH movidas AS (DELETE FROM {q(por_defecto)} WHERE {q(COLUMNA)} >= :desde AND {q(COLUMNA)} < :hasta "
+            f"RETURNING *) INSERT INTO {q(nombre)} SELECT * FROM movidas"
+        ), {"desde": mes, "hasta": _sumar_meses(mes, 1)})
+    conexion.execute(text(
+        f"ALTER TABLE {q(tabla)} ATTACH PARTITION {q(nombre)} FOR VALUES FROM ('{desde}') TO ('{hasta}')"
+    ))
+    return True
+
+
+def crear_futuras(conexion, meses_adelante):
+    """Crea las particiones del mes actual y de los `meses_adelante` siguientes."""
+    creadas = []
+    actual = _mes(date.today())
+    for tabla in TABLAS:
+        if not esta_particionada(conexion, tabla.name):
+            continue
+        for n in range(meses_adelante + 1):
+            mes = _sumar_meses(actual, n)
+            if crear_particion(conexion, tabla.name, mes):
+                creadas.append(_nombre(tabla.name, mes))
+    return creadas
+
+
+def convertir(conexion, tabla, meses_adelante):
+    """Convierte `tabla` en una tabla particionada por meses de createdAt.
+
+    Copia las filas a la tabla nueva en la transacción de `conexion`
+    (la tabla queda bloqueada mientras tanto) y vuelve a crear sus índices y
+    claves foráneas a partir del modelo, salvo las que apuntan a otra tabla
+    particionada, que PostgreSQL no admite.
+    """
+    q = lambda n: _q(conexion, n)
+    nombre = tabla.name
+    if esta_particionada(conexion, nombre):
+        return False
+    pk = [columna.name for columna in tabla.primary_key]
+    secuencias = [
+        (columna, conexion.execute(text("SELECT pg_get_serial_sequence(:tabla, :columna)"),
+                                   {"tabla": f'"{nombre}"', "columna": columna}).scalar())
+        for columna in pk
+    ]
+    antigua = f"{nombre}_sin_particionar"
+    conexion.execute(text(f"ALTER TABLE {q(nombre)} RENAME TO {q(antigua)}"))
+    conexion.execute(text(
+        f"CREATE TABLE {q(nombre)} (LIKE {q(antigua)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({q(COLUMNA)})"
+    ))
+    conexion.execute(text(f"CREATE TABLE {q(nombre + '_default')} PARTITION OF {q(nombre)} DEFAULT"))
+
+    primera = conexion.execute(text(f"SELECT min({q(COLUMNA)}) FROM {q(antigua)}")).scalar()
+    mes = _mes(primera or date.today())
+    ultimo = _sumar_meses(_mes(date.today()), meses_adelante)
+    while mes <= ultimo:
+        crear_particion(conexion, nombre, mes)
+        mes = _sumar_meses(mes, 1)
+    conexion.execute(text(f"INSERT INTO {q(nombre)} SELECT * FROM {q(antigua)}"))
+
+    # La secuencia del id pertenece a la tabla antigua: se pasa a la nueva antes de borrarla
+    for columna, secuencia in secuencias:
+        if secuencia:
+            conexion.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY {q(nombre)}.{q(columna)}"))
+    conexion.execute(text(f"DROP TABLE {q(antigua)} CASCADE"))
+
+    # Tras borrar la antigua, que tenía el mismo nombre de clave primaria.
+    # La clave de partición tiene que formar parte de la clave primaria.
+    conexion.execute(text(
+        f"ALTER TABLE {q(nombre)} ADD PRIMARY KEY ({', '.join(q(c) for c in [*pk, COLUMNA])})"
+    ))
+
+    for indice in tabla.indexes:
+        indice.create(conexion)
+    for clave in tabla.foreign_key_constraints:
+        if not esta_particionada(conexion, clave.referred_table.name):
+            conexion.execute(AddConstraint(clave))
+    return True
+
+
+def _separar(conexion, tabla, antes_de):
+    """Separa de `tabla` las particiones de los meses anteriores a `antes_de`: [(nombre, mes)]."""
+    separadas = []
+    for nombre, mes in particiones(conexion, tabla):
+        if mes >= _mes(antes_de):
+            break
+        conexion.execute(text(f"ALTER TABLE {_q(conexion, tabla)} DETACH PARTITION {_q(conexion, nombre)}"))
+        separadas.append((nombre, mes))
+    return separadas
+
+
+def _volcar(conexion, nombre, directorio):
+    # <directorio>/<partición>.csv.gz y se borra la tabla
+    ruta = os.path.join(directorio, f"{nombre}.csv.gz")
+    cursor = conexion.connection.dbapi_connection.cursor()
+    try:
+        with gzip.open(ruta, "wb") as archivo:
+            cursor.copy_expert(f"COPY {_q(conexion, nombre)} TO STDOUT WITH (FORMAT csv, HEADER)", archivo)
+    finally:
+        cursor.close()
+    conexion.execute(text(f"DROP TABLE {_q(conexion, nombre)}"))
+
+
+def archivar(conexion, antes_de, directorio=None):
+    """Separa los meses de facturas anteriores a `antes_de` junto con todos sus detalles.
+
+    Los detalles se archivan por el mes de su factura, no por su propio
+    createdAt: un detalle añadido en marzo a una factura de febrero se va
+    con el archivo de febrero (tbDetails_p<año>_02), y uno de una factura
+    que se queda vuelve a tbDetails (a la partición por defecto si su mes ya
+    no existe). Así ninguna factura activa pierde líneas y no quedan detalles
+    sin factura, y reconcile-bill-totals y rebuild-sales-summary siguen
+    cuadrando. Con `directorio`, cada partición se vuelca a
+    <directorio>/<partición>.csv.gz y se borra; sin él queda como tabla
+    suelta. Devuelve los nombres de las particiones separadas.
+    """
+    q = lambda n: _q(conexion, n)
+    facturas, detalles = (tabla.name for tabla in TABLAS)
+    if not (esta_particionada(conexion, facturas) and esta_particionada(conexion, detalles)):
+        raise click.ClickException("Ejecute antes partition-tables: las dos tablas deben estar particionadas")
+    meses_facturas = _separar(conexion, facturas, antes_de)
+    meses_detalles = _separar(conexion, detalles, antes_de)
+
+    # Detalles separados cuya factura sigue activa: vuelven a la tabla
+    for nombre, _ in meses_detalles:
+        conexion.execute(text(
+            f"WITH movidas AS (DELETE FROM {q(nombre)} d WHERE EXISTS (SELECT 1 FROM {q(facturas)} b "
+            f'WHERE b."PK_bill" = d."FK_bill") RETURNING *) INSERT INTO {q(detalles)} SELECT * FROM movidas'
+        ))
+    # Detalles activos de facturas separadas: al archivo del mes de su factura
+    separadas_detalles = {nombre for nombre, _ in meses_detalles}
+    for nombre, mes in meses_facturas:
+        destino = _nombre(detalles, mes)
+        if destino not in separadas_detalles:
+            conexion.execute(text(
+                f"CREATE TABLE {q(destino)} (LIKE {q(detalles)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            ))
+            meses_detalles.append((destino, mes))
+            separadas_detalles.add(destino)
+        conexion.execute(text(
+            f"WITH movidas AS (DELETE FROM {q(detalles)} d WHERE EXISTS (SELECT 1 FROM {q(nombre)} b "
+            f'WHERE b."PK_bill" = d."FK_bill") RETURNING *) INSERT INTO {q(destino)} SELECT * FROM movidas'
+        ))
+
+    separadas = [nombre for nombre, _ in meses_facturas + meses_detalles]
+    if directorio:
+        for nombre in separadas:
+            _volcar(conexion, nombre, directorio)
+    return separadas
+
+
+############# Comandos #############
+
+@click.command("partition-tables")
+@click.option("--months-ahead", type=int, help="Meses futuros a crear (por defecto PARTITION_MONTHS_AHEAD).")
+@with_appcontext
+def comando_particionar(months_ahead):
+    """Convierte tbBills y tbDetails en tablas particionadas por mes de createdAt."""
+    conexion = db.session.connection()
+    _comprobar_postgresql(conexion)
+    adelante = current_app.config["PARTITION_MONTHS_AHEAD"] if months_ahead is None else months_ahead
+    for tabla in TABLAS:
+        if convertir(conexion, tabla, adelante):
+            click.echo(f"{tabla.name}: {len(particiones(conexion, tabla.name))} particiones mensuales")
+        else:
+            click.echo(f"{tabla.name} ya estaba particionada")
+    db.session.commit()
+
+
+@click.command("partitions-maintain")
+@click.option("--months-ahead", type=int, help="Meses futuros a crear (por defecto PARTITION_MONTHS_AHEAD).")
+@with_appcontext
+def comando_mantener(months_ahead):
+    """Crea las particiones de los próximos meses. Pensado para ejecutarse a diario (cron)."""
+    conexion = db.session.connection()
+    _comprobar_postgresql(conexion)
+    adelante = current_app.config["PARTITION_MONTHS_AHEAD"] if months_ahead is None else months_ahead
+    creadas = crear_futuras(conexion, adelante)
+    db.session.commit()
+    click.echo("Particiones creadas: " + ", ".join(creadas) if creadas else "No faltaba ninguna partición")
+
+
+@click.command("partitions-archive")
+@click.option("--before", "antes_de", required=True, type=click.DateTime(formats=["%Y-%m", "%Y-%m-%d"]),
+              help="Se separan los meses anteriores a esta fecha.")
+@click.option("--dir", "directorio", type=click.Path(file_okay=False),
+              help="Vuelca cada mes a un .csv.gz y lo borra (por defecto PARTITION_ARCHIVE_DIR).")
+@click.option("--detach-only", is_flag=True, help="Solo separa las particiones, sin volcarlas ni borrarlas.")
+@with_appcontext
+def comando_archivar(antes_de, directorio, detach_only):
+    """Separa (y archiva) los meses antiguos de tbBills con los detalles de esas facturas.
+
+    Los totales del resumen de ventas ya calculados se conservan, pero
+    rebuild-sales-summary sobre un rango archivado lo dejaría vacío.
+    """
+    conexion = db.session.connection()
+    _comprobar_postgresql(conexion)
+    if not detach_only:
+        directorio = directorio or current_app.config["PARTITION_ARCHIVE_DIR"] \
+            or os.path.join(current_app.instance_path, "archivo")
+        os.makedirs(directorio, exist_ok=True)
+    separadas = archivar(conexion, antes_de.date(), None if detach_only else directorio)
+    db.session.commit()
+    if not separadas:
+        click.echo("No hay particiones anteriores a esa fecha")
+    elif detach_only:
+        click.echo("Particiones separadas: " + ", ".join(separadas))
+    else:
+        click.echo(f"{len(separadas)} particiones archivadas en {directorio}")
+
+
+def init_app(app):
+    app.config.setdefault("PARTITION_MONTHS_AHEAD", 3)
+    app.config.setdefault("PARTITION_ARCHIVE_DIR", None)
+    for comando in (comando_particionar, comando_mantener, comando_archivar):
+        app.cli.add_command(comando)
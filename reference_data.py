@@ -0,0 +1,124 @@
+# Caché en memoria de datos de referencia (listas desplegables de los formularios)
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Category, PaymentMethod
+
+
+class CacheReferencias:
+    """Caché LRU con expiración (TTL) de tuplas compactas (id, etiqueta).
+
+    Es local a cada proceso: las escrituras hechas en otro worker solo se
+    ven al expirar el TTL.
+    """
+
+    def __init__(self, ttl=300, tamano=32):
+        self.ttl = ttl
+        self.tamano = tamano
+        self._datos = OrderedDict()
+        self._generacion = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, nombre, cargar):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(nombre)
+            if entrada and entrada[0] > ahora:
+                self._datos.move_to_end(nombre)
+                return entrada[1]
+            generacion = self._generacion
+
+        valor = tuple(cargar())
+
+        with self._lock:
+            # Si hubo una invalidación mientras se cargaba, no se guarda
+            if generacion == self._generacion:
+                self._datos[nombre] = (ahora + self.ttl, valor)
+                self._datos.move_to_end(nombre)
+                while len(self._datos) > self.tamano:
+                    self._datos.popitem(last=False)
+        return valor
+
+    def invalidar(self, *nombres):
+        with self._lock:
+            self._generacion += 1
+            for nombre in nombres or list(self._datos):
+                self._datos.pop(nombre, None)
+
+
+def _metodos_pago():
+    return db.session.query(PaymentMethod.PK_paymentMethod, PaymentMethod.name).order_by(PaymentMethod.PK_paymentMethod)
+
+
+def _categorias():
+    return db.session.query(Category.PK_category, Category.cathegoryName).order_by(Category.PK_category)
+
+
+# Nombre de la lista -> (modelo que la invalida, función que la carga)
+CATALOGOS = {
+    'payment_methods': (PaymentMethod, _metodos_pago),
+    'categories': (Category, _categorias),
+}
+
+
+def referencias(nombre):
+    """Devuelve la lista de tuplas (id, etiqueta) del catálogo `nombre`."""
+    _, cargar = CATALOGOS[nombre]
+    return current_app.extensions['reference_data'].obtener(nombre, cargar)
+
+
+def invalidar(*nombres):
+    # También las listas que dependen del mismo modelo (p. ej. los índices de búsqueda)
+    modelos = {CATALOGOS[nombre][0] for nombre in nombres if nombre in CATALOGOS}
+    relacionadas = {nombre for nombre, (modelo, _) in CATALOGOS.items() if modelo in modelos}
+    current_app.extensions['reference_data'].invalidar(*nombres, *relacionadas)
+
+
+def _catalogos_de(modelo):
+    return {nombre for nombre, (clase, _) in CATALOGOS.items() if issubclass(modelo, clase)}
+
+
+def _marcar(session, nombres):
+    if nombres:
+        session.info.setdefault('referencias_modificadas', set()).update(nombres)
+
+
+def _despues_de_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        _marcar(session, _catalogos_de(type(obj)))
+
+
+def _al_ejecutar(orm_execute_state):
+    # UPDATE/DELETE masivos (query.update(), delete()) no pasan por el flush
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper:
+        _marcar(orm_execute_state.session, _catalogos_de(orm_execute_state.bind_mapper.class_))
+
+
+def _despues_de_commit(session):
+    nombres = session.info.pop('referencias_modificadas', None)
+    if nombres and has_app_context() and 'reference_data' in current_app.extensions:
+        invalidar(*nombres)
+
+
+def _despues_de_rollback(session):
+    session.info.pop('referencias_modificadas', None)
+
+
+def init_app(app):
+    app.config.setdefault('REFERENCE_CACHE_TTL', 300)
+    app.config.setdefault('REFERENCE_CACHE_SIZE', 32)
+    app.extensions['reference_data'] = CacheReferencias(
+        ttl=app.config['REFERENCE_CACHE_TTL'],
+        tamano=app.config['REFERENCE_CACHE_SIZE'],
+    )
+    for nombre, funcion in (
+        ('after_flush', _despues_de_flush),
+        ('do_orm_execute', _al_ejecutar),
+        ('after_commit', _despues_de_commit),
+        ('after_rollback', _despues_de_rollback),
+    ):
+        if not event.contains(Session, nombre, funcion):
+            event.listen(Session, nombre, funcion)
@@ -0,0 +1,138 @@
+# Réplicas de lectura: los GET leen de una réplica y las escrituras van a la primaria
+import itertools
+import threading
+import time
+from flask import current_app, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc
+from sqlalchemy.sql import CompoundSelect, Select, TextClause
+
+# Métodos que solo leen; el resto (POST...) siempre va a la primaria
+METODOS_LECTURA = {"GET", "HEAD"}
+
+
+def _es_lectura(clause):
+    if isinstance(clause, (Select, CompoundSelect)):
+        return True
+    return isinstance(clause, TextClause) and clause.text.lstrip().lower().startswith("select")
+
+
+class SesionEnrutada(Session):
+    """Sesión que manda las lecturas a la réplica elegida para la petición.
+
+    `info["replica"]` es el motor de la réplica (o None = primaria). El flush,
+    los INSERT/UPDATE/DELETE y las sentencias que no son SELECT van siempre a
+    la primaria, y tras la primera escritura el resto de la petición también.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get("replica")
+        if bind is None and replica is not None and not self._flushing and _es_lectura(clause):
+            return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _despues_de_flush(sesion, flush_context):
+    sesion.info.pop("replica", None)
+
+
+def _al_ejecutar(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info.pop("replica", None)
+
+
+event.listen(SesionEnrutada, "after_flush", _despues_de_flush)
+event.listen(SesionEnrutada, "do_orm_execute", _al_ejecutar)
+
+
+class Replicas:
+    """Reparto round-robin entre las réplicas sanas.
+
+    Una réplica que falla al conectar se salta durante REPLICA_RETRY_SECONDS;
+    si no queda ninguna, se lee de la primaria.
+    """
+
+    def __init__(self, binds, reintento):
+        self.binds = binds
+        self.reintento = reintento
+        self._turno = itertools.count()
+        self._caidas = {}
+        self._lock = threading.Lock()
+
+    def _candidatas(self):
+        # El turno se reparte solo entre las sanas para no cargar más a la vecina de una caída
+        ahora = time.monotonic()
+        sanas = [bind for bind in self.binds if self._caidas.get(bind, 0) <= ahora]
+        if not sanas:
+            return []
+        inicio = next(self._turno) % len(sanas)
+        return sanas[inicio:] + sanas[:inicio]
+
+    def elegir(self):
+        """Conecta la sesión a la siguiente réplica sana y devuelve su motor, o None."""
+        db = current_app.extensions["sqlalchemy"]
+        for bind in self._candidatas():
+            motor = db.engines[bind]
+            try:
+                # La conexión queda en la sesión y la usan las consultas de la petición
+                db.session.connection(bind_arguments={"bind": motor})
+            except exc.DBAPIError as error:
+                db.session.rollback()
+                with self._lock:
+                    self._caidas[bind] = time.monotonic() + self.reintento
+                current_app.logger.warning("Réplica %s no disponible, se salta %ss: %s",
+                                           bind, self.reintento, error.orig)
+                continue
+            return motor
+        return None
+
+    def estado(self):
+        ahora = time.monotonic()
+        return {bind: {"sana": self._caidas.get(bind, 0) <= ahora} for bind in self.binds}
+
+
+def _antes_de_peticion(app):
+    replicas = app.extensions["replicas"]
+    if (
+        request.method not in METODOS_LECTURA
+        or request.endpoint in app.config["REPLICA_EXCLUDED_ENDPOINTS"]
+        or request.blueprint in app.config["REPLICA_EXCLUDED_ENDPOINTS"]
+        # Read-your-writes: el navegador que acaba de escribir lee de la primaria
+        or session.get("primaria_hasta", 0) > time.time()
+    ):
+        return
+    motor = replicas.elegir()
+    if motor is not None:
+        app.extensions["sqlalchemy"].session.info["replica"] = motor
+
+
+def _despues_de_peticion(app, respuesta):
+    if request.method not in METODOS_LECTURA and respuesta.status_code < 400:
+        session["primaria_hasta"] = time.time() + app.config["REPLICA_READ_YOUR_WRITES_SECONDS"]
+    return respuesta
+
+
+def estado_replicas():
+    replicas = current_app.extensions.get("replicas")
+    return replicas.estado() if replicas else {}
+
+
+def init_app(app):
+    """Añade un bind por réplica. Llamar antes de db.init_app."""
+    app.config.setdefault("SQLALCHEMY_REPLICAS", [])
+    app.config.setdefault("REPLICA_RETRY_SECONDS", 30)
+    app.config.setdefault("REPLICA_READ_YOUR_WRITES_SECONDS", 5)
+    app.config.setdefault("REPLICA_EXCLUDED_ENDPOINTS", ("jobs",))
+    urls = app.config["SQLALCHEMY_REPLICAS"]
+    if not urls:
+        return
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    claves = []
+    for numero, url in enumerate(urls):
+        clave = f"replica_{numero}"
+        binds[clave] = url
+        claves.append(clave)
+    app.config["SQLALCHEMY_BINDS"] = binds
+    app.extensions["replicas"] = Replicas(claves, app.config["REPLICA_RETRY_SECONDS"])
+    app.before_request(lambda: _antes_de_peticion(app))
+    app.after_request(lambda respuesta: _despues_de_peticion(app, respuesta))
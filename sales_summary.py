@@ -0,0 +1,191 @@
+# Resumen de ventas (día × producto × método de pago) mantenido de forma incremental
+from collections import defaultdict
+from datetime import date, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import db, Bill, Detail, PaymentMethod, Product, SalesSummary
+from valores import valores_flush
+
+INSERT_CON_CONFLICTO = {
+    'postgresql': pg_insert,
+    'sqlite': sqlite_insert,
+}
+
+
+def _aplicar(conexion, deltas):
+    filas = [
+        {'day': dia, 'FK_product': producto, 'FK_paymentMethod': metodo, 'units': unidades, 'revenue': ingresos}
+        for (dia, producto, metodo), (unidades, ingresos) in deltas.items()
+        if unidades or ingresos
+    ]
+    if not filas:
+        return
+    tabla = SalesSummary.__table__
+    stmt = INSERT_CON_CONFLICTO[conexion.dialect.name](tabla)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.day, tabla.c.FK_product, tabla.c.FK_paymentMethod],
+        set_={'units': tabla.c.units + stmt.excluded.units, 'revenue': tabla.c.revenue + stmt.excluded.revenue},
+    )
+    # Todas las filas afectadas en un solo executemany
+    conexion.execute(stmt, filas)
+
+
+def _despues_de_flush(session, flush_context):
+    """Traduce los detalles y facturas escritos en este flush a deltas del resumen.
+
+    Se ejecuta dentro de la misma transacción que la escritura, así que el
+    resumen nunca queda a medias. Las restas usan los valores de la factura
+    anteriores al flush y las sumas los actuales.
+    """
+    detalles_nuevos = [o for o in session.new if isinstance(o, Detail)]
+    detalles_borrados = [o for o in session.deleted if isinstance(o, Detail)]
+    detalles_editados = [o for o in session.dirty if isinstance(o, Detail) and session.is_modified(o)]
+    facturas_editadas = [o for o in session.dirty if isinstance(o, Bill) and session.is_modified(o)]
+    facturas_borradas = [o for o in session.deleted if isinstance(o, Bill)]
+    if not (detalles_nuevos or detalles_borrados or detalles_editados or facturas_editadas or facturas_borradas):
+        return
+
+    # Líneas (unidades, importe, factura, producto, momento): las restas se
+    # ubican con los datos de la factura 'antes' del flush y las sumas con los
+    # de 'despues'. El importe usa el precio guardado en el detalle.
+    def linea(signo, factura, producto, cantidad, precio, momento):
+        cantidad = int(cantidad or 0)
+        return (signo * cantidad, signo * cantidad * int(precio or 0), int(factura), int(producto), momento)
+
+    campos = ('FK_bill', 'FK_producto', 'quantity', 'unitPrice')
+    lineas = []
+    for detalle in detalles_nuevos:
+        lineas.append(linea(1, *(getattr(detalle, c) for c in campos), 'despues'))
+    for detalle in detalles_borrados:
+        lineas.append(linea(-1, *(valores_flush(detalle, c)[0] for c in campos), 'antes'))
+    for detalle in detalles_editados:
+        valores = [valores_flush(detalle, c) for c in campos]
+        antes_detalle = [v[0] for v in valores]
+        ahora_detalle = [v[1] for v in valores]
+        if [int(v or 0) for v in antes_detalle] != [int(v or 0) for v in ahora_detalle]:
+            lineas.append(linea(-1, *antes_detalle, 'antes'))
+            lineas.append(linea(1, *ahora_detalle, 'despues'))
+
+    conexion = session.connection()
+    ids_facturas = {linea[2] for linea in lineas} | {f.PK_bill for f in facturas_editadas}
+    despues = {
+        fila.PK_bill: (fila.createdAt, fila.FK_paymentMethod)
+        for fila in conexion.execute(
+            select(Bill.PK_bill, Bill.createdAt, Bill.FK_paymentMethod).where(Bill.PK_bill.in_(ids_facturas))
+        )
+    }
+    antes = dict(despues)
+    for factura in facturas_editadas:
+        antes[factura.PK_bill] = (valores_flush(factura, 'createdAt')[0], int(valores_flush(factura, 'FK_paymentMethod')[0]))
+    for factura in facturas_borradas:
+        antes[factura.PK_bill] = (factura.createdAt, factura.FK_paymentMethod)
+
+    # Facturas que cambiaron de día o de método de pago: se mueven sus líneas
+    # que no se tocaron en este flush (esas ya están en `lineas`)
+    tocados = [d.PK_detail for d in (*detalles_nuevos, *detalles_editados)]
+    movidas = [f.PK_bill for f in (*facturas_editadas, *facturas_borradas)
+               if antes.get(f.PK_bill) != despues.get(f.PK_bill)]
+    if movidas:
+        for factura, producto, cantidad, importe in conexion.execute(
+            select(Detail.FK_bill, Detail.FK_producto, func.sum(Detail.quantity),
+                   func.sum(Detail.quantity * Detail.unitPrice))
+            .where(Detail.FK_bill.in_(movidas), Detail.PK_detail.notin_(tocados))
+            .group_by(Detail.FK_bill, Detail.FK_producto)
+        ):
+            lineas.append((-cantidad, -(importe or 0), factura, producto, 'antes'))
+            if factura in despues:
+                lineas.append((cantidad, importe or 0, factura, producto, 'despues'))
+
+    deltas = defaultdict(lambda: [0, 0])
+    for unidades, importe, factura, producto, momento in lineas:
+        dia_metodo = (despues if momento == 'despues' else antes).get(factura)
+        if dia_metodo is None:
+            continue
+        delta = deltas[(dia_metodo[0], producto, int(dia_metodo[1]))]
+        delta[0] += unidades
+        delta[1] += importe
+    _aplicar(conexion, deltas)
+
+
+def reconstruir(desde=None, hasta=None):
+    """Recalcula el resumen desde tbDetails (todo o solo el rango de días)."""
+    SalesSummary.__table__.create(db.engine, checkfirst=True)
+    tabla = SalesSummary.__table__
+    borrar = delete(tabla)
+    origen = (
+        select(
+            Bill.createdAt, Detail.FK_producto, Bill.FK_paymentMethod,
+            func.sum(Detail.quantity), func.sum(Detail.quantity * Detail.unitPrice),
+        )
+        .join(Bill, Detail.FK_bill == Bill.PK_bill)
+        .group_by(Bill.createdAt, Detail.FK_producto, Bill.FK_paymentMethod)
+    )
+    if desde:
+        borrar = borrar.where(tabla.c.day >= desde)
+        origen = origen.where(Bill.createdAt >= desde)
+    if hasta:
+        borrar = borrar.where(tabla.c.day <= hasta)
+        origen = origen.where(Bill.createdAt <= hasta)
+
+    db.session.execute(borrar)
+    filas = db.session.execute(
+        insert(tabla).from_select(['day', 'FK_product', 'FK_paymentMethod', 'units', 'revenue'], origen)
+    ).rowcount
+    db.session.commit()
+    return filas
+
+
+def panel(desde, hasta, top=10):
+    """Datos del panel de ventas leídos solo de tbSalesSummary."""
+    tabla = SalesSummary.__table__
+    en_rango = (tabla.c.day >= desde, tabla.c.day <= hasta)
+    por_dia = db.session.execute(
+        select(tabla.c.day, func.sum(tabla.c.units), func.sum(tabla.c.revenue))
+        .where(*en_rango).group_by(tabla.c.day).order_by(tabla.c.day)
+    ).all()
+    por_producto = db.session.execute(
+        select(Product.name, func.sum(tabla.c.units), func.sum(tabla.c.revenue))
+        .join(Product, tabla.c.FK_product == Product.PK_product)
+        .where(*en_rango).group_by(Product.PK_product, Product.name)
+        .order_by(func.sum(tabla.c.units).desc()).limit(top)
+    ).all()
+    por_metodo = db.session.execute(
+        select(PaymentMethod.name, func.sum(tabla.c.units), func.sum(tabla.c.revenue))
+        .join(PaymentMethod, tabla.c.FK_paymentMethod == PaymentMethod.PK_paymentMethod)
+        .where(*en_rango).group_by(PaymentMethod.PK_paymentMethod, PaymentMethod.name)
+        .order_by(func.sum(tabla.c.revenue).desc())
+    ).all()
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'por_dia': por_dia,
+        'por_producto': por_producto,
+        'por_metodo': por_metodo,
+        'unidades': sum(fila[1] or 0 for fila in por_dia),
+        'ingresos': sum(fila[2] or 0 for fila in por_dia),
+    }
+
+
+def rango_por_defecto(dias=30):
+    hoy = date.today()
+    return hoy - timedelta(days=dias - 1), hoy
+
+
+@click.command("rebuild-sales-summary")
+@click.option("--desde", type=click.DateTime(formats=["%Y-%m-%d"]), help="Primer día a recalcular.")
+@click.option("--hasta", type=click.DateTime(formats=["%Y-%m-%d"]), help="Último día a recalcular.")
+@with_appcontext
+def comando_rebuild(desde, hasta):
+    """Recalcula tbSalesSummary a partir de los detalles de venta."""
+    filas = reconstruir(desde and desde.date(), hasta and hasta.date())
+    click.echo(f"Resumen de ventas reconstruido: {filas} filas")
+
+
+def init_app(app):
+    if not event.contains(Session, 'after_flush', _despues_de_flush):
+        event.listen(Session, 'after_flush', _despues_de_flush)
+    app.cli.add_command(comando_rebuild)
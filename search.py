@@ -0,0 +1,156 @@
+# Búsqueda incremental (autocompletado) de productos y clientes
+import bisect
+import re
+from flask import current_app
+from sqlalchemy import case, func, or_, select, text
+from models import db, Client, Product
+from reference_data import CATALOGOS
+from migrations import migracion
+
+# Por debajo de esta longitud se busca por prefijo; desde aquí, por trigramas
+MIN_TRIGRAMA = 3
+_PALABRA = re.compile(r"\w+")
+
+
+def _palabras(texto):
+    return _PALABRA.findall((texto or "").lower())
+
+
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+############# PostgreSQL: índices de trigramas y de prefijo #############
+
+def _texto_cliente():
+    # La misma expresión que el índice ix_tbClients_busqueda_trgm
+    return func.lower(Client.firstName + " " + Client.lastName + " " + func.coalesce(Client.email, ""))
+
+
+def _etiqueta_cliente(fila):
+    nombre = f"{fila.firstName} {fila.lastName}"
+    return f"{nombre} <{fila.email}>" if fila.email else nombre
+
+
+def _buscar_sql(entidad, consulta, limite):
+    termino = _escapar_like(consulta.lower())
+    if entidad == "products":
+        columna = func.lower(Product.name)
+        if len(consulta) < MIN_TRIGRAMA:
+            condicion = columna.like(termino + "%", escape="\\")
+        else:
+            condicion = columna.like("%" + termino + "%", escape="\\")
+        filas = db.session.execute(
+            select(Product.PK_product, Product.name)
+            .where(condicion)
+            .order_by(case((columna.like(termino + "%", escape="\\"), 0), else_=1), Product.name)
+            .limit(limite)
+        ).all()
+        return [{"id": pk, "label": nombre} for pk, nombre in filas]
+
+    prefijos = [func.lower(c).like(termino + "%", escape="\\")
+                for c in (Client.firstName, Client.lastName, Client.email)]
+    if len(consulta) < MIN_TRIGRAMA:
+        condicion = or_(*prefijos)
+    else:
+        condicion = _texto_cliente().like("%" + termino + "%", escape="\\")
+    filas = db.session.execute(
+        select(Client.PK_client, Client.firstName, Client.lastName, Client.email)
+        .where(condicion)
+        .order_by(case((or_(*prefijos), 0), else_=1), Client.firstName, Client.lastName)
+        .limit(limite)
+    ).all()
+    return [{"id": fila.PK_client, "label": _etiqueta_cliente(fila)} for fila in filas]
+
+
+@migracion(3, "Índices de búsqueda por trigramas y por prefijo (solo PostgreSQL)")
+def _indices_busqueda(conexion):
+    # Solo PostgreSQL: en SQLite se usa el índice en memoria de este módulo.
+    # No están en los modelos porque create_all no puede crear la extensión.
+    if conexion.dialect.name != "postgresql":
+        return
+    for sentencia in (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        'CREATE INDEX IF NOT EXISTS "ix_tbProducts_name_trgm" ON "tbProducts" '
+        'USING gin (lower(name) gin_trgm_ops)',
+        'CREATE INDEX IF NOT EXISTS "ix_tbProducts_name_prefijo" ON "tbProducts" '
+        '(lower(name) text_pattern_ops)',
+        'CREATE INDEX IF NOT EXISTS "ix_tbClients_busqueda_trgm" ON "tbClients" '
+        'USING gin (lower("firstName" || \' \' || "lastName" || \' \' || coalesce(email, \'\')) gin_trgm_ops)',
+        'CREATE INDEX IF NOT EXISTS "ix_tbClients_firstName_prefijo" ON "tbClients" '
+        '(lower("firstName") text_pattern_ops)',
+        'CREATE INDEX IF NOT EXISTS "ix_tbClients_lastName_prefijo" ON "tbClients" '
+        '(lower("lastName") text_pattern_ops)',
+        'CREATE INDEX IF NOT EXISTS "ix_tbClients_email_prefijo" ON "tbClients" '
+        '(lower(email) text_pattern_ops)',
+    ):
+        conexion.execute(text(sentencia))
+
+
+############# Otros motores: índice de prefijos en memoria #############
+
+def _indice_productos():
+    filas = db.session.execute(select(Product.PK_product, Product.name))
+    return sorted((palabra, pk, nombre) for pk, nombre in filas for palabra in set(_palabras(nombre)))
+
+
+def _indice_clientes():
+    filas = db.session.execute(select(Client.PK_client, Client.firstName, Client.lastName, Client.email))
+    entradas = []
+    for fila in filas:
+        etiqueta = _etiqueta_cliente(fila)
+        palabras = set(_palabras(f"{fila.firstName} {fila.lastName}"))
+        if fila.email:
+            palabras.add(fila.email.lower())
+        entradas.extend((palabra, fila.PK_client, etiqueta) for palabra in palabras)
+    return sorted(entradas)
+
+
+# Se guardan en la caché de referencias, que los invalida al escribir productos o clientes
+CATALOGOS["search_products"] = (Product, _indice_productos)
+CATALOGOS["search_clients"] = (Client, _indice_clientes)
+
+
+def _buscar_memoria(entidad, consulta, limite):
+    """Busca por prefijo de palabra en una lista ordenada de (palabra, id, etiqueta).
+
+    La primera palabra de la consulta se localiza con bisect; el resto deben
+    ser prefijo de alguna palabra de la etiqueta.
+    """
+    palabras = _palabras(consulta)
+    if not palabras:
+        return []
+    indice = current_app.extensions["reference_data"].obtener(f"search_{entidad}", CATALOGOS[f"search_{entidad}"][1])
+    primera, resto = palabras[0], palabras[1:]
+    resultados = {}
+    posicion = bisect.bisect_left(indice, (primera,))
+    while posicion < len(indice) and len(resultados) < limite:
+        palabra, pk, etiqueta = indice[posicion]
+        if not palabra.startswith(primera):
+            break
+        posicion += 1
+        if pk in resultados:
+            continue
+        palabras_etiqueta = _palabras(etiqueta)
+        if all(any(p.startswith(r) for p in palabras_etiqueta) for r in resto):
+            resultados[pk] = etiqueta
+    return [{"id": pk, "label": etiqueta} for pk, etiqueta in resultados.items()]
+
+
+ENTIDADES = ("products", "clients")
+
+
+def buscar(entidad, consulta, limite=None):
+    """Hasta `limite` coincidencias {id, label} de `consulta` en productos o clientes."""
+    maximo = current_app.config["SEARCH_MAX_RESULTS"]
+    limite = max(1, min(limite or maximo, maximo))
+    consulta = (consulta or "").strip()[:50]
+    if not consulta:
+        return []
+    if db.session.get_bind().dialect.name == "postgresql":
+        return _buscar_sql(entidad, consulta, limite)
+    return _buscar_memoria(entidad, consulta, limite)
+
+
+def init_app(app):
+    app.config.setdefault("SEARCH_MAX_RESULTS", 20)
@@ -0,0 +1,82 @@
+# Medición del arranque en frío: importar la aplicación y crearla en un proceso nuevo
+import json
+import os
+import statistics
+import subprocess
+import sys
+import click
+from flask.cli import ScriptInfo
+
+# Se ejecuta en un intérprete nuevo con -X importtime; imprime los tiempos en JSON
+_SONDA = """
+import json, sys, time
+inicio = time.perf_counter()
+from flask.cli import ScriptInfo
+info = ScriptInfo(app_import_path=sys.argv[1] or None)
+app = info.load_app()
+creada = time.perf_counter()
+with app.test_request_context():
+    from sqlalchemy.orm import configure_mappers
+    configure_mappers()
+lista = time.perf_counter()
+print(json.dumps({"carga": creada - inicio, "mappers": lista - creada, "total": lista - inicio}))
+"""
+
+
+def _paquetes(importtime):
+    """Tiempo propio (segundos) por paquete de primer nivel a partir de -X importtime."""
+    paquetes = {}
+    for linea in importtime.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        propio, _, nombre = linea[len("import time:"):].split("|")
+        if not propio.strip().isdigit():
+            continue
+        paquete = nombre.strip().split(".")[0]
+        paquetes[paquete] = paquetes.get(paquete, 0) + int(propio) / 1e6
+    return paquetes
+
+
+def medir(ruta_app=None, repeticiones=5):
+    """Arranca la aplicación `repeticiones` veces en procesos nuevos.
+
+    Devuelve la mediana de cada fase (carga = importar y create_app,
+    mappers = configurar el ORM, total) y el tiempo de importación por
+    paquete de la última ejecución.
+    """
+    fases = {"carga": [], "mappers": [], "total": []}
+    paquetes = {}
+    for _ in range(repeticiones):
+        proceso = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _SONDA, ruta_app or ""],
+            capture_output=True, text=True, cwd=os.getcwd(),
+        )
+        if proceso.returncode != 0:
+            raise click.ClickException(proceso.stderr.strip().splitlines()[-1])
+        tiempos = json.loads(proceso.stdout.strip().splitlines()[-1])
+        for fase, segundos in tiempos.items():
+            fases[fase].append(segundos)
+        paquetes = _paquetes(proceso.stderr)
+    return {fase: statistics.median(valores) for fase, valores in fases.items()}, paquetes
+
+
+@click.command("startup-time")
+@click.option("--runs", default=5, show_default=True, help="Arranques a medir.")
+@click.option("--top", default=10, show_default=True, help="Paquetes más lentos a mostrar.")
+@click.option("--max-seconds", type=float, help="Falla si la mediana del arranque supera este valor.")
+def comando_startup_time(runs, top, max_seconds):
+    """Mide el arranque en frío de la aplicación en procesos nuevos."""
+    ruta_app = click.get_current_context().find_object(ScriptInfo).app_import_path
+    fases, paquetes = medir(ruta_app, runs)
+    click.echo(
+        f"Arranque (mediana de {runs}): {fases['total'] * 1000:.0f} ms "
+        f"(importar y create_app {fases['carga'] * 1000:.0f} ms, mappers {fases['mappers'] * 1000:.0f} ms)"
+    )
+    for paquete, segundos in sorted(paquetes.items(), key=lambda p: p[1], reverse=True)[:top]:
+        click.echo(f"  {paquete:<24}{segundos * 1000:8.1f} ms")
+    if max_seconds is not None and fases["total"] > max_seconds:
+        raise click.ClickException(f"El arranque supera {max_seconds} s")
+
+
+def init_app(app):
+    app.cli.add_command(comando_startup_time)
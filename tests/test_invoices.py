@@ -0,0 +1,23 @@
+# PDF de facturas con nombres que no caben en latin-1 (fuentes estándar de fpdf)
+import pytest
+
+from invoices import render_factura, texto_pdf
+
+
+def test_texto_pdf_sustituye_lo_que_no_es_latin1():
+    assert texto_pdf("Ana O’Brien") == "Ana O'Brien"
+    assert texto_pdf("Café — 1kg") == "Café - 1kg"
+    assert texto_pdf("Łódź") == "Lódz"
+    assert texto_pdf("Иван") == "????"
+
+
+def test_render_factura_con_nombres_unicode():
+    pytest.importorskip("fpdf")
+    datos = {
+        "PK_bill": 1,
+        "client_name": "Ana O’Brien",
+        "payment_method": "Tarjeta “débito”",
+        "date": "2024-01-01",
+        "details": [{"product_name": "Café — 1kg", "quantity": 2, "unit_price": 15}],
+    }
+    assert render_factura(datos).startswith(b"%PDF")
@@ -0,0 +1,15 @@
+# Utilidades comunes sobre los valores de las columnas de los modelos
+from datetime import date
+from sqlalchemy import inspect
+
+
+def valores_flush(obj, atributo):
+    """(valor antes del flush, valor actual) de un atributo."""
+    historia = inspect(obj).attrs[atributo].history
+    actual = getattr(obj, atributo)
+    return (historia.deleted[0] if historia.deleted else actual), actual
+
+
+def valor_json(valor):
+    """Valor de una columna listo para JSON: las fechas como texto ISO."""
+    return valor.isoformat() if isinstance(valor, date) else valor
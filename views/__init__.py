@@ -0,0 +1,17 @@
+from . import auth, main, products, clients, categories, details, bills, payment_methods, data, jobs, changes, api
+
+# Un blueprint por entidad; create_app los registra en este orden
+BLUEPRINTS = (
+    auth.bp,
+    main.bp,
+    products.bp,
+    clients.bp,
+    categories.bp,
+    details.bp,
+    bills.bp,
+    payment_methods.bp,
+    data.bp,
+    jobs.bp,
+    changes.bp,
+    api.bp,
+)
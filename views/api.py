@@ -0,0 +1,53 @@
+############# API JSON de lectura #############
+import hashlib
+import json
+from flask import Blueprint, request, session, abort, current_app
+from api import MAX_IDS, RECURSOS, Consulta
+from bulk_edit import leer_ids
+from models import db
+from pagination import aplicar_filtros, paginar
+from views.auth import login_required
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+def _json(cuerpo, codigo=200):
+    # Compacto y con ETag del contenido: el cliente que ya lo tiene recibe 304
+    respuesta = current_app.response_class(
+        json.dumps(cuerpo, ensure_ascii=False, separators=(',', ':')), status=codigo, mimetype='application/json')
+    if codigo == 200 and current_app.config['CONDITIONAL_GET']:
+        respuesta.set_etag(hashlib.sha1(respuesta.get_data()).hexdigest(), weak=True)
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        respuesta.vary.add('Cookie')
+        respuesta.make_conditional(request)
+    return respuesta
+
+# Lista paginada o lote por ids de clientes, productos, facturas o detalles
+# GET /api/products?fields=name,price&embed=category&fields[category]=cathegoryName&category=2&limit=100
+# GET /api/bills?ids=1,2,3&embed=client,payment_method
+@bp.route("/<recurso>")
+@login_required
+def read(recurso):
+    if recurso not in RECURSOS:
+        abort(404)
+    config = RECURSOS[recurso]
+    if session.get('user_role') not in config['roles']:
+        abort(403)
+    try:
+        consulta = Consulta(recurso, request.args)
+        ids = leer_ids(request.args.get('ids'), maximo=MAX_IDS)
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+
+    if ids:
+        # Todas las filas en una sola consulta; los ids que no existen se indican aparte
+        stmt = aplicar_filtros(consulta.stmt.where(consulta.pk.in_(ids)), config['modelo'], config['filtros'])
+        datos = [consulta.serializar(fila) for fila in db.session.execute(stmt.order_by(consulta.pk))]
+        encontrados = {objeto[consulta.pk.key] for objeto in datos}
+        return _json({"data": datos, "missing": [id for id in ids if id not in encontrados]})
+
+    pagina = paginar(consulta.stmt, config['modelo'], consulta.pk, config['filtros'], config['ordenes'])
+    return _json({
+        "data": [consulta.serializar(fila) for fila in pagina],
+        "next": pagina.url_siguiente(),
+        "prev": pagina.url_anterior(),
+    })
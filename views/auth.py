@@ -0,0 +1,63 @@
+# Inicio y cierre de sesión, y los decoradores de acceso por rol
+from functools import wraps
+from flask import Blueprint, render_template, request, redirect, url_for, session
+from sqlalchemy.sql import text  # Importa la función text
+from models import db
+
+bp = Blueprint("auth", __name__)
+
+# Decorador para verificar si el usuario está autenticado
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Decorador para verificar roles
+def role_required(*roles):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user_role = session.get('user_role')
+            if user_role not in roles:
+                return redirect(url_for('main.index'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+
+        # Buscar al usuario por nombre de usuario y contraseña
+        user = db.session.execute(
+            text("""
+            SELECT u."PK_User", u."name", u."lastName", r."roleName"
+            FROM "tbUsers" u
+            JOIN "tbRoles" r ON u."FK_Role" = r."PK_Role"
+            WHERE u."userName" = :username AND u."password" = :password AND u."state" = TRUE
+            """),
+            {"username": username, "password": password}
+        ).fetchone()
+
+        if user:
+            # Guardar información del usuario en la sesión
+            session['user_id'] = user.PK_User
+            session['user_name'] = f"{user.name} {user.lastName}"
+            session['user_role'] = user.roleName
+            return redirect(url_for('main.index'))
+        else:
+            # Mostrar un mensaje de error si no se encuentra al usuario
+            return render_template("login.html", error="Credenciales incorrectas")
+    return render_template("login.html")
+
+
+@bp.route('/logout')
+def logout():
+    session.clear()
+    return redirect(url_for('auth.login'))
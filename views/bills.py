@@ -0,0 +1,172 @@
+############# Rutas de Facturas #############
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for, send_file, abort, jsonify, current_app, session
+from models import db, Bill, Detail
+from pagination import paginar, leer_fecha
+from loading import cargar
+from reference_data import referencias
+from checkout import crear_factura, leer_lineas
+from invoices import pdf_factura, ids_facturas
+from inventory import StockInsuficiente
+from conditional import condicional, listado, factura
+from bulk_edit import leer_ids
+from jobs import encolar
+from views.auth import login_required, role_required
+from views.jobs import demasiados_pendientes, respuesta_encolado
+
+bp = Blueprint("bills", __name__)
+
+# Ruta para mostrar todas las facturas (Empleado, Administrador, Gerente)
+@bp.route("/bills")
+@login_required
+@role_required("Empleado", "Administrador", "Gerente")
+@condicional(listado(Bill, Bill.PK_bill, {'client': Bill.FK_client, 'payment_method': Bill.FK_paymentMethod},
+                     ('client', 'payment_method'), {'total': Bill.total}))
+def index_bills():
+    # Obtener una página de facturas (filtrable por cliente y método de pago, ordenable por total)
+    query = cargar(Bill.query, 'index_bills', Bill.client, Bill.payment_method)
+    bills = paginar(query, Bill, Bill.PK_bill,
+                    filtros={'client': Bill.FK_client, 'payment_method': Bill.FK_paymentMethod},
+                    ordenes={'total': Bill.total})
+    return render_template("bills/index_bills.html", bills=bills)
+
+# Ruta para agregar una nueva factura (Administrador, Gerente)
+@bp.route('/add_bill', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def add_bill():
+    if request.method == 'POST':
+        FK_client = request.form['FK_client']
+        FK_paymentMethod = request.form['FK_paymentMethod']
+        created_at = datetime.now()
+        updated_at = created_at
+        state = True
+
+        # Validar que los campos no estén vacíos y sean números
+        if not FK_client or not FK_paymentMethod:
+            return redirect(url_for('bills.add_bill'))
+
+        try:
+            # Convertir a enteros
+            FK_client = int(FK_client)
+            FK_paymentMethod = int(FK_paymentMethod)
+        except ValueError:
+            return redirect(url_for('bills.add_bill'))
+
+        # Crear una nueva factura
+        new_bill = Bill(
+            FK_client=FK_client,
+            FK_paymentMethod=FK_paymentMethod,
+            date=created_at,
+            createdAt=created_at,
+            updatedAt=updated_at,
+            state=state
+        )
+
+        # Agregar la factura a la base de datos
+        db.session.add(new_bill)
+        db.session.commit()
+
+        return redirect(url_for('bills.index_bills'))  # Redirige a la página de facturas
+
+    # Los métodos de pago salen de la caché de referencias; el cliente se busca con /search
+    return render_template('bills/add_bill.html', payment_methods=referencias('payment_methods'))
+
+# Ruta para crear una factura con todas sus líneas en una sola transacción (Administrador, Gerente)
+@bp.route('/checkout', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def checkout():
+    if request.method == 'POST':
+        datos = request.get_json(silent=True)
+        if datos is None:
+            datos = {
+                'FK_client': request.form.get('FK_client'),
+                'FK_paymentMethod': request.form.get('FK_paymentMethod'),
+                'lines': leer_lineas(request.form.getlist('product'), request.form.getlist('quantity')),
+            }
+        if not isinstance(datos, dict):
+            return jsonify({"error": "El cuerpo debe ser un objeto JSON"}), 400
+        try:
+            id = crear_factura(datos.get('FK_client'), datos.get('FK_paymentMethod'), datos.get('lines'))
+        except ValueError as e:
+            # Falta de stock: 409; datos inválidos: 400
+            codigo = 409 if isinstance(e, StockInsuficiente) else 400
+            if request.is_json:
+                return jsonify({"error": str(e)}), codigo
+            return render_template('bills/checkout.html', payment_methods=referencias('payment_methods'),
+                                   error=str(e)), codigo
+
+        if request.is_json:
+            return jsonify({"PK_bill": id}), 201
+        return redirect(url_for('bills.bill', id=id))
+
+    return render_template('bills/checkout.html', payment_methods=referencias('payment_methods'))
+
+# Ruta para editar una factura existente (Administrador, Gerente)
+@bp.route('/edit_bill/<int:id>', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def edit_bill(id):
+    bill = Bill.query.get_or_404(id)
+
+    if request.method == 'POST':
+        bill.FK_client = int(request.form['FK_client'])
+        bill.FK_paymentMethod = int(request.form['FK_paymentMethod'])
+        bill.updatedAt = datetime.now()  # Actualizamos la fecha de modificación
+
+        db.session.commit()
+        return redirect(url_for('bills.index_bills'))  # Redirige a la página de facturas
+
+    return render_template('bills/edit_bill.html', bill=bill, payment_methods=referencias('payment_methods'))
+
+# Ruta para ver una factura (Empleado, Administrador, Gerente)
+@bp.route("/bill/<int:id>")
+@login_required
+@role_required("Empleado", "Administrador", "Gerente")
+@condicional(factura)
+def bill(id):
+    # Obtener la factura por ID junto con su cliente y método de pago
+    bill = cargar(Bill.query, 'bill', Bill.client, Bill.payment_method).get_or_404(id)
+    # Obtener los detalles de la factura con sus productos
+    details = cargar(Detail.query, 'bill', Detail.product).filter_by(FK_bill=id).all()
+    return render_template("bills/bill.html", bill=bill, details=details)
+
+# Ruta para generar un PDF de la factura (Administrador, Gerente)
+@bp.route("/bill/<int:id>/pdf")
+@login_required
+@role_required("Administrador", "Gerente")
+def bill_pdf(id):
+    # El PDF se genera con los datos reales y se reutiliza mientras la factura no cambie
+    ruta = pdf_factura(id)
+    return send_file(
+        ruta,
+        download_name=f"factura_{id}.pdf",
+        as_attachment=True,
+    )
+
+# Ruta para generar en lote los PDFs de varias facturas en un ZIP (Administrador, Gerente)
+# El ZIP lo genera un trabajador: se devuelve 202 con la URL del trabajo
+@bp.route("/bills/pdf_batch", methods=['POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def bills_pdf_batch():
+    datos = request.get_json(silent=True)
+    if datos is None:
+        datos = request.form
+    if not isinstance(datos, dict):
+        abort(400)
+    try:
+        ids = leer_ids(datos.get('ids'))
+    except ValueError:
+        abort(400)
+    seleccion = ids_facturas(leer_fecha(datos.get('desde')), leer_fecha(datos.get('hasta')), ids)
+    if not seleccion:
+        abort(404)
+    if len(seleccion) > current_app.config['PDF_BATCH_MAX_BILLS']:
+        abort(413)
+    if demasiados_pendientes():
+        return jsonify(error="Demasiados trabajos pendientes"), 429
+
+    params = {'desde': datos.get('desde'), 'hasta': datos.get('hasta'), 'ids': ids}
+    return respuesta_encolado(encolar('pdf_batch', params, session.get('user_id')))
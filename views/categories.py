@@ -0,0 +1,60 @@
+############# Rutas de Categorías #############
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for
+from models import db, Category
+from pagination import paginar
+from conditional import condicional, listado
+from views.auth import login_required, role_required
+
+bp = Blueprint("categories", __name__)
+
+# Rutas para categorías (Administrador, Gerente)
+@bp.route("/categories")
+@login_required
+@role_required("Administrador", "Gerente")
+@condicional(listado(Category, Category.PK_category))
+def index_category():
+    categories = paginar(Category.query, Category, Category.PK_category)
+    return render_template("categorias/index_category.html", categories=categories)
+
+@bp.route('/add_category', methods=['GET', 'POST'])
+@login_required
+@role_required("Gerente")
+def add_category():
+    if request.method == 'POST':
+        category_name = request.form['categoryName']
+        description = request.form['description']
+        created_at = datetime.now().date()
+        new_category = Category(
+            cathegoryName=category_name,
+            description=description,
+            createdAt=created_at,
+            updatedAt=created_at,
+            state=True
+        )
+        db.session.add(new_category)
+        db.session.commit()
+        return redirect(url_for('categories.index_category'))
+    return render_template("categorias/add_category.html")
+
+@bp.route('/edit_category/<int:id>', methods=['GET', 'POST'])
+@login_required
+@role_required("Gerente")
+def edit_category(id):
+    category = Category.query.get_or_404(id)
+    if request.method == 'POST':
+        category.cathegoryName = request.form['categoryName']
+        category.description = request.form['description']
+        category.updatedAt = datetime.now().date()
+        db.session.commit()
+        return redirect(url_for('categories.index_category'))
+    return render_template("categorias/edit_category.html", category=category)
+
+@bp.route('/delete_category/<int:id>', methods=['POST'])
+@login_required
+@role_required("Gerente")
+def delete_category(id):
+    category = Category.query.get_or_404(id)
+    db.session.delete(category)
+    db.session.commit()
+    return redirect(url_for('categories.index_category'))
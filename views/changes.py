@@ -0,0 +1,19 @@
+############# Sincronización incremental de los terminales #############
+from flask import Blueprint, request, session, abort, jsonify
+from changes import ENTIDADES, leer
+from pagination import leer_entero
+from views.auth import login_required
+
+bp = Blueprint("changes", __name__)
+
+# Cambios de productos, clientes, métodos de pago o categorías desde una secuencia
+# GET /changes/products?since=<next de la respuesta anterior>&limit=500
+@bp.route("/changes/<entidad>")
+@login_required
+def changes_since(entidad):
+    if entidad not in ENTIDADES:
+        abort(404)
+    if session.get('user_role') not in ENTIDADES[entidad][1]:
+        abort(403)
+    desde = leer_entero(request.args.get('since')) or 0
+    return jsonify(leer(entidad, max(desde, 0), leer_entero(request.args.get('limit'))))
@@ -0,0 +1,71 @@
+############# Rutas de Clientes #############
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for
+from models import db, Client
+from pagination import paginar
+from conditional import condicional, listado
+from views.auth import login_required, role_required
+
+bp = Blueprint("clients", __name__)
+
+# Rutas para clientes (Empleado, Administrador, Gerente)
+@bp.route("/clients")
+@login_required
+@role_required("Empleado", "Administrador", "Gerente")
+@condicional(listado(Client, Client.PK_client))
+def index_client():
+    clients = paginar(Client.query, Client, Client.PK_client)
+    return render_template("clientes/index_client.html", clients=clients)
+
+@bp.route('/add_client', methods=['GET', 'POST'])
+@login_required
+@role_required("Empleado", "Administrador", "Gerente")
+def add_client():
+    if request.method == 'POST':
+        first_name = request.form['firstName']
+        last_name = request.form['lastName']
+        address = request.form['address']
+        birth_date = request.form['birthDate']
+        phone_number = request.form['phoneNumber']
+        email = request.form['email']
+        created_at = datetime.now().date()
+        new_client = Client(
+            firstName=first_name,
+            lastName=last_name,
+            address=address,
+            birthDate=birth_date,
+            phoneNumber=phone_number,
+            email=email,
+            createdAt=created_at,
+            updatedAt=created_at
+        )
+        db.session.add(new_client)
+        db.session.commit()
+        return redirect(url_for('clients.index_client'))
+    return render_template("clientes/add_client.html")
+
+@bp.route('/edit_client/<int:id>', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def edit_client(id):
+    client = Client.query.get_or_404(id)
+    if request.method == 'POST':
+        client.firstName = request.form['firstName']
+        client.lastName = request.form['lastName']
+        client.address = request.form['address']
+        client.birthDate = request.form['birthDate']
+        client.phoneNumber = request.form['phoneNumber']
+        client.email = request.form['email']
+        client.updatedAt = datetime.now().date()
+        db.session.commit()
+        return redirect(url_for('clients.index_client'))
+    return render_template("clientes/edit_client.html", client=client)
+
+@bp.route('/delete_client/<int:id>', methods=['POST'])
+@login_required
+@role_required("Gerente")
+def delete_client(id):
+    client = Client.query.get_or_404(id)
+    db.session.delete(client)
+    db.session.commit()
+    return redirect(url_for('clients.index_client'))
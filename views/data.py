@@ -0,0 +1,93 @@
+############# Importaciones, exportaciones y ediciones masivas #############
+from flask import Blueprint, render_template, request, redirect, url_for, session, Response, stream_with_context, abort, jsonify
+from export import FORMATOS, EXPORTACIONES, consulta_exportacion, generar_filas
+from bulk_import import IMPORTACIONES
+from bulk_edit import ENTIDADES, leer_ids, cambiar_precios, cambiar_estado
+from jobs import encolar
+from views.auth import login_required, role_required
+from views.jobs import demasiados_pendientes, guardar_subida
+
+bp = Blueprint("data", __name__)
+
+# Ruta para importar productos (Gerente) o clientes (Administrador, Gerente) desde un CSV
+# La importación la hace un trabajador: la página consulta el estado del trabajo
+@bp.route('/import/<entidad>', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def import_csv(entidad):
+    if entidad not in IMPORTACIONES:
+        abort(404)
+    if entidad == 'products' and session.get('user_role') != "Gerente":
+        return redirect(url_for('main.index'))
+
+    trabajo = error = None
+    if request.method == 'POST':
+        archivo = request.files.get('file')
+        if not archivo or not archivo.filename:
+            error = "Seleccione un archivo CSV"
+        elif demasiados_pendientes():
+            error = "Tiene demasiados trabajos pendientes; espere a que terminen"
+        else:
+            trabajo = encolar('import_csv', {'entidad': entidad, 'archivo': guardar_subida(archivo)},
+                              session.get('user_id'))
+    return render_template("import_csv.html", entidad=entidad, campos=IMPORTACIONES[entidad]['campos'],
+                           trabajo=trabajo, error=error)
+
+# Ruta para cambiar en bloque precios (×factor) o estado de productos (Gerente) o estado de clientes
+# (Administrador, Gerente). Formulario o JSON {"operation": "price"|"state", "factor", "state",
+# "ids", "category", "dry_run"}; con dry_run solo se cuentan las filas afectadas
+@bp.route('/bulk_edit/<entidad>', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def bulk_edit(entidad):
+    if entidad not in ENTIDADES:
+        abort(404)
+    if entidad == 'products' and session.get('user_role') != "Gerente":
+        return redirect(url_for('main.index'))
+
+    resultado = error = None
+    if request.method == 'POST':
+        if request.is_json:
+            datos = request.get_json(silent=True)
+            if not isinstance(datos, dict):
+                return jsonify(error="El cuerpo debe ser un objeto JSON"), 400
+        else:
+            datos = request.form.to_dict()
+            datos['dry_run'] = 'dry_run' in request.form
+        operacion = datos.get('operation')
+        filtros = {nombre: datos.get(nombre) for nombre in ENTIDADES[entidad][1]}
+        simular = datos.get('dry_run') in (True, 'true', '1')
+        try:
+            ids = leer_ids(datos.get('ids'))
+            if operacion == 'price' and entidad == 'products':
+                filas = cambiar_precios(datos.get('factor'), ids, filtros, simular)
+            elif operacion == 'state':
+                activo = datos.get('state') in (True, 'true', '1')
+                filas = cambiar_estado(entidad, activo, ids, filtros, simular)
+            else:
+                raise ValueError("Operación no válida")
+        except ValueError as e:
+            if request.is_json:
+                return jsonify(error=str(e)), 400
+            error = str(e)
+        else:
+            resultado = {"operation": operacion, "rows": filas, "dry_run": simular}
+            if request.is_json:
+                return jsonify(resultado)
+    return render_template("bulk_edit.html", entidad=entidad, filtros=ENTIDADES[entidad][1],
+                           resultado=resultado, error=error)
+
+# Ruta para exportar facturas o detalles de venta en CSV / NDJSON (Administrador, Gerente)
+@bp.route("/export/<entidad>.<formato>")
+@login_required
+@role_required("Administrador", "Gerente")
+def export_data(entidad, formato):
+    if entidad not in EXPORTACIONES or formato not in FORMATOS:
+        abort(404)
+    stmt = consulta_exportacion(entidad)
+    # La respuesta se envía mientras se lee la base de datos
+    return Response(
+        stream_with_context(generar_filas(stmt, formato)),
+        mimetype=FORMATOS[formato],
+        headers={"Content-Disposition": f"attachment; filename={entidad}.{formato}"},
+    )
@@ -0,0 +1,127 @@
+############# Rutas de Detalles de Venta #############
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for
+from models import db, Bill, Detail, Product
+from pagination import paginar
+from loading import cargar
+from inventory import StockInsuficiente, descontar, reponer
+from conditional import condicional, listado
+from views.auth import login_required, role_required
+
+bp = Blueprint("details", __name__)
+
+
+def _cantidad(valor):
+    # Los formularios sin cantidad (o con una no válida) venden una unidad
+    try:
+        return max(1, int(valor))
+    except (TypeError, ValueError):
+        return 1
+
+def _factura(valor):
+    # La factura se escribe por número (no hay lista de todas): se comprueba que exista
+    try:
+        id = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return id if db.session.get(Bill, id) is not None else None
+
+def _producto(valor):
+    # Igual que la factura: un id de producto vacío o inexistente no se acepta
+    try:
+        id = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return id if db.session.get(Product, id) is not None else None
+
+# Ruta para mostrar todos los detalles de ventas (Administrador, Gerente)
+@bp.route("/details")
+@login_required
+@role_required("Administrador", "Gerente")
+@condicional(listado(Detail, Detail.PK_detail, {'bill': Detail.FK_bill, 'product': Detail.FK_producto},
+                     ('bill', 'product')))
+def index_details():
+    query = cargar(Detail.query, 'index_details', Detail.bill, Detail.product)
+    details = paginar(query, Detail, Detail.PK_detail,
+                      filtros={'bill': Detail.FK_bill, 'product': Detail.FK_producto})
+    return render_template("details/index_details.html", details=details)
+
+# Ruta para agregar un nuevo detalle de venta (Administrador, Gerente)
+@bp.route('/add_detail', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def add_detail():
+    if request.method == 'POST':
+        FK_bill = _factura(request.form.get('FK_bill'))
+        if FK_bill is None:
+            return render_template('details/add_detail.html', error="La factura indicada no existe"), 400
+        FK_producto = _producto(request.form.get('FK_producto'))
+        if FK_producto is None:
+            return render_template('details/add_detail.html', error="El producto indicado no existe"), 400
+        quantity = _cantidad(request.form.get('quantity'))
+        created_at = datetime.now().date()
+        updated_at = created_at
+        state = True
+
+        new_detail = Detail(
+            FK_bill=FK_bill,
+            FK_producto=FK_producto,
+            quantity=quantity,
+            createdAt=created_at,
+            updatedAt=updated_at,
+            state=state
+        )
+
+        db.session.add(new_detail)
+        try:
+            descontar({FK_producto: quantity}, FK_bill=FK_bill)
+        except StockInsuficiente as e:
+            db.session.rollback()
+            return render_template('details/add_detail.html', error=str(e)), 409
+        db.session.commit()
+        return redirect(url_for('details.index_details'))
+    return render_template('details/add_detail.html')
+
+# Ruta para editar un detalle de venta existente (Administrador, Gerente)
+@bp.route('/edit_detail/<int:id>', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def edit_detail(id):
+    detail = Detail.query.get_or_404(id)
+    if request.method == 'POST':
+        producto_anterior, cantidad_anterior = detail.FK_producto, detail.quantity
+        FK_bill = _factura(request.form.get('FK_bill'))
+        if FK_bill is None:
+            return render_template('details/edit_detail.html', detail=detail,
+                                   error="La factura indicada no existe"), 400
+        FK_producto = _producto(request.form.get('FK_producto'))
+        if FK_producto is None:
+            return render_template('details/edit_detail.html', detail=detail,
+                                   error="El producto indicado no existe"), 400
+        detail.FK_bill = FK_bill
+        detail.FK_producto = FK_producto
+        detail.quantity = _cantidad(request.form.get('quantity', cantidad_anterior))
+        detail.updatedAt = datetime.now().date()
+        # Si cambia el producto o la cantidad se devuelven las unidades anteriores y se descuentan las nuevas
+        if (FK_producto, detail.quantity) != (producto_anterior, cantidad_anterior):
+            try:
+                reponer({producto_anterior: cantidad_anterior}, FK_bill=FK_bill)
+                descontar({FK_producto: detail.quantity}, FK_bill=FK_bill)
+            except StockInsuficiente as e:
+                db.session.rollback()
+                detail = Detail.query.get_or_404(id)
+                return render_template('details/edit_detail.html', detail=detail, error=str(e)), 409
+        db.session.commit()
+        return redirect(url_for('details.index_details'))
+    return render_template('details/edit_detail.html', detail=detail)
+
+# Ruta para eliminar un detalle de venta (Gerente)
+@bp.route('/delete_detail/<int:id>', methods=['POST'])
+@login_required
+@role_required("Gerente")
+def delete_detail(id):
+    detail = Detail.query.get_or_404(id)
+    reponer({detail.FK_producto: detail.quantity}, FK_bill=detail.FK_bill)
+    db.session.delete(detail)
+    db.session.commit()
+    return redirect(url_for('details.index_details'))
@@ -0,0 +1,97 @@
+############# Trabajos en segundo plano #############
+import os
+import tempfile
+from flask import Blueprint, request, url_for, send_file, session, abort, jsonify, current_app
+from models import db, Job
+from bulk_import import IMPORTACIONES
+from jobs import TAREAS, TERMINADO, encolar, pendientes_de, como_dict, directorio_trabajos
+from views.auth import login_required, role_required
+
+bp = Blueprint("jobs", __name__)
+
+def _trabajo_propio(id):
+    # Cada usuario ve sus trabajos; el Administrador, todos
+    trabajo = db.get_or_404(Job, id)
+    if trabajo.FK_user != session.get('user_id') and session.get('user_role') != "Administrador":
+        abort(404)
+    return trabajo
+
+def demasiados_pendientes():
+    return pendientes_de(session.get('user_id')) >= current_app.config['JOBS_MAX_PENDING_PER_USER']
+
+def guardar_subida(archivo):
+    # El CSV se guarda en disco: el trabajador lo lee desde otro proceso
+    subidas = os.path.join(directorio_trabajos(), "uploads")
+    os.makedirs(subidas, exist_ok=True)
+    fd, ruta = tempfile.mkstemp(suffix=".csv", dir=subidas)
+    with os.fdopen(fd, "wb") as destino:
+        archivo.save(destino)
+    return ruta
+
+def respuesta_encolado(id):
+    # 202 con la URL donde consultar el estado del trabajo
+    respuesta = jsonify(PK_job=id, status=url_for('jobs.job_status', id=id))
+    respuesta.status_code = 202
+    respuesta.headers['Location'] = url_for('jobs.job_status', id=id)
+    return respuesta
+
+# Ruta para encolar una exportación, PDFs o una importación (Administrador, Gerente)
+# JSON {"kind": "export", "params": {...}} o formulario con kind y el archivo CSV
+@bp.route("/jobs", methods=['POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def submit_job():
+    if request.is_json:
+        datos = request.get_json(silent=True)
+        if not isinstance(datos, dict) or not isinstance(datos.get('params') or {}, dict):
+            return jsonify(error="El cuerpo y params deben ser objetos JSON"), 400
+    else:
+        datos = {}
+    kind = datos.get('kind') or request.form.get('kind')
+    params = dict(datos.get('params') or request.form)
+    params.pop('kind', None)
+    if kind not in TAREAS or session.get('user_role') not in TAREAS[kind][1]:
+        abort(400)
+    if demasiados_pendientes():
+        return jsonify(error="Demasiados trabajos pendientes"), 429
+
+    if kind == 'import_csv':
+        if params.get('entidad') not in IMPORTACIONES:
+            abort(400)
+        if params['entidad'] == 'products' and session.get('user_role') != "Gerente":
+            abort(403)
+        archivo = request.files.get('file')
+        if not archivo or not archivo.filename:
+            abort(400)
+        params['archivo'] = guardar_subida(archivo)
+
+    return respuesta_encolado(encolar(kind, params, session.get('user_id')))
+
+# Trabajos recientes del usuario
+@bp.route("/jobs")
+@login_required
+@role_required("Administrador", "Gerente")
+def list_jobs():
+    trabajos = Job.query.filter_by(FK_user=session.get('user_id')) \
+        .order_by(Job.PK_job.desc()).limit(50).all()
+    return jsonify(jobs=[como_dict(trabajo) for trabajo in trabajos])
+
+@bp.route("/jobs/<int:id>")
+@login_required
+@role_required("Administrador", "Gerente")
+def job_status(id):
+    trabajo = _trabajo_propio(id)
+    estado = como_dict(trabajo)
+    if estado['download']:
+        estado['download'] = url_for('jobs.job_download', id=id)
+    return jsonify(estado)
+
+@bp.route("/jobs/<int:id>/download")
+@login_required
+@role_required("Administrador", "Gerente")
+def job_download(id):
+    trabajo = _trabajo_propio(id)
+    if trabajo.state != TERMINADO or not trabajo.resultPath or not os.path.exists(trabajo.resultPath):
+        abort(404)
+    return send_file(trabajo.resultPath, mimetype=trabajo.mimetype,
+                     download_name=trabajo.resultName, as_attachment=True)
@@ -0,0 +1,50 @@
+# Panel principal, estado del pool, métricas y autocompletado
+from flask import Blueprint, render_template, request, session, Response, abort, jsonify, current_app
+from pagination import leer_fecha
+from sales_summary import panel, rango_por_defecto
+from db_pool import estado_pools
+from replicas import estado_replicas
+from search import ENTIDADES as BUSQUEDAS, buscar
+from views.auth import login_required, role_required
+
+bp = Blueprint("main", __name__)
+
+@bp.route("/")
+@login_required
+def index():
+    if session.get('user_role') not in ("Administrador", "Gerente"):
+        return render_template("base.html", user_role=session.get('user_role'), user_name=session.get('user_name'))
+    # Panel de ventas leído del resumen incremental (tbSalesSummary)
+    desde, hasta = rango_por_defecto()
+    desde = leer_fecha(request.args.get('desde')) or desde
+    hasta = leer_fecha(request.args.get('hasta')) or hasta
+    return render_template("dashboard.html", panel=panel(desde, hasta),
+                           user_role=session.get('user_role'), user_name=session.get('user_name'))
+
+# Ruta para consultar el estado del pool de conexiones y de las réplicas (Administrador)
+@bp.route("/pool_status")
+@login_required
+@role_required("Administrador")
+def pool_status():
+    estado = estado_pools()
+    for bind, salud in estado_replicas().items():
+        estado.setdefault(bind, {}).update(salud)
+    return jsonify(estado)
+
+# Métricas por endpoint en formato de texto de Prometheus
+@bp.route("/metrics")
+def metrics_endpoint():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        abort(401)
+    return Response(current_app.extensions['metrics'].exponer(), mimetype="text/plain; version=0.0.4")
+
+# Autocompletado de productos y clientes: /search/products?q=...&limit=10
+@bp.route("/search/<entidad>")
+@login_required
+@role_required("Empleado", "Administrador", "Gerente")
+def search_endpoint(entidad):
+    if entidad not in BUSQUEDAS:
+        abort(404)
+    limite = request.args.get('limit', type=int)
+    return jsonify(results=buscar(entidad, request.args.get('q'), limite))
@@ -0,0 +1,76 @@
+############# Rutas de Métodos de Pago #############
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for
+from models import db, PaymentMethod
+from pagination import paginar
+from conditional import condicional, listado
+from views.auth import login_required, role_required
+
+bp = Blueprint("payment_methods", __name__)
+
+# Ruta para mostrar todos los métodos de pago (Empleado, Administrador, Gerente)
+@bp.route("/payment_methods")
+@login_required
+@role_required("Empleado", "Administrador", "Gerente")
+@condicional(listado(PaymentMethod, PaymentMethod.PK_paymentMethod))
+def index_payment_methods():
+    payment_methods = paginar(PaymentMethod.query, PaymentMethod, PaymentMethod.PK_paymentMethod)
+    return render_template("payment_methods/index_payment_methods.html", payment_methods=payment_methods)
+
+# Ruta para agregar un nuevo método de pago (Administrador, Gerente)
+@bp.route('/add_payment_method', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def add_payment_method():
+    if request.method == 'POST':
+        name = request.form['name']
+        anotherDetails = request.form['anotherDetails']
+        created_at = datetime.now().date()
+        updated_at = created_at
+        state = True
+
+        # Crear un nuevo método de pago
+        new_payment_method = PaymentMethod(
+            name=name,
+            anotherDetails=anotherDetails,
+            createdAt=created_at,
+            updatedAt=updated_at,
+            state=state
+        )
+
+        # Agregar el método de pago a la base de datos
+        db.session.add(new_payment_method)
+        db.session.commit()
+
+        return redirect(url_for('payment_methods.index_payment_methods'))  # Redirige a la página de métodos de pago
+
+    return render_template('payment_methods/add_payment_method.html')
+
+# Ruta para editar un método de pago existente (Administrador, Gerente)
+@bp.route('/edit_payment_method/<int:id>', methods=['GET', 'POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def edit_payment_method(id):
+    payment_method = PaymentMethod.query.get_or_404(id)
+
+    if request.method == 'POST':
+        payment_method.name = request.form['name']
+        payment_method.anotherDetails = request.form['anotherDetails']
+        payment_method.updatedAt = datetime.now().date()
+
+        # Actualizar el método de pago en la base de datos
+        db.session.commit()
+
+        return redirect(url_for('payment_methods.index_payment_methods'))  # Redirige a la página de métodos de pago
+
+    return render_template('payment_methods/edit_payment_method.html', payment_method=payment_method)
+
+# Ruta para eliminar un método de pago (Administrador, Gerente)
+@bp.route('/delete_payment_method/<int:id>', methods=['POST'])
+@login_required
+@role_required("Administrador", "Gerente")
+def delete_payment_method(id):
+    payment_method = PaymentMethod.query.get_or_404(id)
+    db.session.delete(payment_method)
+    db.session.commit()
+    return redirect(url_for('payment_methods.index_payment_methods'))  # Redirige a la página de métodos de pago
@@ -0,0 +1,94 @@
+############# Rutas de Productos #############
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for
+from models import db, Product
+from pagination import paginar
+from loading import cargar
+from reference_data import referencias
+from inventory import registrar_alta, ajustar
+from conditional import condicional, listado
+from views.auth import login_required, role_required
+
+bp = Blueprint("products", __name__)
+
+
+def _stock(valor):
+    # El stock es un entero no negativo; si no lo es se vuelve al formulario con el error
+    try:
+        stock = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return stock if stock >= 0 else None
+
+# Ruta para la página principal de productos (Empleado: solo lectura)
+@bp.route("/products")
+@login_required
+@role_required("Empleado", "Administrador", "Gerente")
+@condicional(listado(Product, Product.PK_product, {'category': Product.FK_category}, ('category',)))
+def index_product():
+    query = cargar(Product.query, 'index_product', Product.category)
+    products = paginar(query, Product, Product.PK_product,
+                       filtros={'category': Product.FK_category})
+    return render_template("productos/index_product.html", products=products)
+
+# Ruta para agregar un nuevo producto (solo Gerente)
+@bp.route('/add_product', methods=['GET', 'POST'])
+@login_required
+@role_required("Gerente")
+def add_product():
+    if request.method == 'POST':
+        name = request.form['name']
+        price = request.form['price']
+        stock = _stock(request.form.get('stock'))
+        if stock is None:
+            return render_template("productos/add_product.html", categories=referencias('categories'),
+                                   error="El stock debe ser un número entero no negativo"), 400
+        category_id = request.form['category']
+        created_at = datetime.now().date()
+
+        # Crear un nuevo producto
+        new_product = Product(
+            name=name,
+            price=price,
+            stock=stock,
+            FK_category=category_id,
+            createdAt=created_at,
+            updatedAt=created_at
+        )
+        db.session.add(new_product)
+        db.session.flush()
+        registrar_alta(new_product.PK_product, stock)
+        db.session.commit()
+        return redirect(url_for('products.index_product'))
+    return render_template("productos/add_product.html", categories=referencias('categories'))
+
+# Ruta para editar un producto existente (solo Gerente)
+@bp.route('/edit_product/<int:id>', methods=['GET', 'POST'])
+@login_required
+@role_required("Gerente")
+def edit_product(id):
+    product = Product.query.get_or_404(id)
+    if request.method == 'POST':
+        stock = _stock(request.form.get('stock'))
+        if stock is None:
+            return render_template("productos/edit_product.html", product=product, categories=referencias('categories'),
+                                   error="El stock debe ser un número entero no negativo"), 400
+        product.name = request.form['name']
+        product.price = request.form['price']
+        product.FK_category = request.form['category']
+        product.updatedAt = datetime.now().date()
+        # El stock se fija con bloqueo de fila y queda registrado como ajuste
+        ajustar(product.PK_product, stock)
+        db.session.commit()
+        return redirect(url_for('products.index_product'))
+    return render_template("productos/edit_product.html", product=product, categories=referencias('categories'))
+
+# Ruta para eliminar un producto (solo Gerente)
+@bp.route('/delete_product/<int:id>', methods=['POST'])
+@login_required
+@role_required("Gerente")
+def delete_product(id):
+    product = Product.query.get_or_404(id)
+    db.session.delete(product)
+    db.session.commit()
+    return redirect(url_for('products.index_product'))